@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+ Benchmarks the describe.py parsers against recorded tool output.
+ Each directory under fixtures/describe holds what the tools printed on
+ one machine, in files named after the tool (cpuinfo, dmidecode, meminfo,
+ hpacucli, megacli-adpallinfo, megacli-ldpdinfo, megacli-pdlist, lspci),
+ and expected.json with what the parsers should make of it.
+ No tools are run, so this works on any machine and needs no sudo.
+
+ Usage: python3 bench_describe.py [-n repeat] [--update] [machine ...]
+        python3 bench_describe.py --record <name>
+
+ --update rewrites expected.json from what the parsers produce now,
+ after a change to the parsers that is meant to change their output.
+ --record saves the output of the tools on this machine as a new
+ fixture, which needs the same sudo access as describe.py.
+
+ Output will look something like this:
+
+machine          parser  input KB   lines  MB/s  Klines/s  peak KB  result
+dl380-g7         cpu         19.3     624  27.9     923.5     58.5  ok
+dl380-g7         mem          8.8     414  33.5    1617.9     31.3  ok
+"""
+
+import argparse, json, os, time, tracemalloc
+
+import describe
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures", "describe")
+
+def run_lsi(out, files):
+    return describe.parse_megacli(out, files["megacli-adpallinfo"],
+                                  lambda: files["megacli-ldpdinfo"],
+                                  lambda: files.get("megacli-pdlist", ""))
+
+# Each parser, the fixture files it needs, and how to call it
+PARSERS = [("cpu", ["cpuinfo"],
+            lambda out, files: describe.parse_cpuinfo(out, files["cpuinfo"])),
+           ("mem", ["dmidecode", "meminfo"],
+            lambda out, files: describe.parse_mem(out, files["dmidecode"],
+                                                  files["meminfo"])),
+           ("hp", ["hpacucli"],
+            lambda out, files: describe.parse_hpacucli(out, files["hpacucli"])),
+           ("lsi", ["megacli-adpallinfo", "megacli-ldpdinfo"], run_lsi),
+           ("net", ["lspci"],
+            lambda out, files: describe.parse_lspci(out, files["lspci"]))]
+
+# Files a parser reads only in some cases
+OPTIONAL = {"lsi": ["megacli-pdlist"]}
+
+# How to collect each fixture file on this machine, for --record
+SOURCES = {"cpuinfo": ["cat", "/proc/cpuinfo"],
+           "meminfo": ["cat", "/proc/meminfo"],
+           "dmidecode": ["dmidecode"],
+           "hpacucli": ["/usr/sbin/hpacucli", "controller", "all", "show",
+                        "config", "detail"],
+           "megacli-adpallinfo": ["MegaCli64", "-AdpAllInfo", "-aAll", "-NoLog"],
+           "megacli-ldpdinfo": ["MegaCli64", "-LdPdInfo", "-aAll", "-NoLog"],
+           "megacli-pdlist": ["MegaCli64", "-PdList", "-aAll", "-NoLog"],
+           "lspci": ["lspci"]}
+
+def parse(parser, files):
+    """
+    Run the parser once, returning its report as plain values
+    """
+    name, needs, func = parser
+    out = describe.Report(name)
+    out.value = func(out, files)
+    return out.as_dict()
+
+def measure(parser, files, repeat):
+    """
+    Best time of repeat runs, and the peak memory of one more
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        parse(parser, files)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    tracemalloc.start()
+    parse(parser, files)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def first_difference(got, wanted):
+    """
+    Where the parser went wrong, for the report
+    """
+    if got["lines"] != wanted["lines"]:
+        for mine, theirs in zip(got["lines"] + [None] * len(wanted["lines"]),
+                                wanted["lines"] + [None] * len(got["lines"])):
+            if mine != theirs:
+                return "line %r, wanted %r" % (mine, theirs)
+    for key in sorted(set(got["data"]) | set(wanted["data"])):
+        if got["data"].get(key) != wanted["data"].get(key):
+            return "data %s" % key
+    return "value %r, wanted %r" % (got["value"], wanted["value"])
+
+def load(machine):
+    """
+    The fixture files of one machine, and the expected results
+    """
+    directory = os.path.join(FIXTURES, machine)
+    files = dict()
+    for name in os.listdir(directory):
+        if name in SOURCES:
+            with open(os.path.join(directory, name)) as f_in:
+                files[name] = f_in.read()
+    expected = dict()
+    path = os.path.join(directory, "expected.json")
+    if os.path.exists(path):
+        with open(path) as f_in:
+            expected = json.load(f_in)
+    return files, expected, path
+
+def bench(machines, repeat, update):
+    """
+    Time every parser on every machine, checking what it found.
+    Returns the number of parsers that did not find what was expected.
+    """
+    failures = 0
+    print("%-16s %-6s %9s %7s %5s %9s %8s  %s" % (
+        "machine", "parser", "input KB", "lines", "MB/s", "Klines/s",
+        "peak KB", "result"))
+    for machine in machines:
+        files, expected, path = load(machine)
+        results = dict()
+        for parser in PARSERS:
+            name, needs, func = parser
+            if not all([need in files for need in needs]):
+                continue
+            got = parse(parser, files)
+            results[name] = got
+            best, peak = measure(parser, files, repeat)
+            used = [need for need in needs + OPTIONAL.get(name, [])
+                    if need in files]
+            size = sum([len(files[need]) for need in used])
+            lines = sum([files[need].count("\n") for need in used])
+            if update:
+                result = "updated"
+            elif name not in expected:
+                result = "no expected result"
+                failures += 1
+            elif got != expected[name]:
+                result = "FAILED " + first_difference(got, expected[name])
+                failures += 1
+            else:
+                result = "ok"
+            print("%-16s %-6s %9.1f %7d %5.1f %9.1f %8.1f  %s" % (
+                machine, name, size / 1024.0, lines,
+                size / best / (1024 * 1024), lines / best / 1000,
+                peak / 1024.0, result))
+        if update:
+            with open(path, "w") as f_out:
+                json.dump(results, f_out, indent=1, sort_keys=True)
+                f_out.write("\n")
+    return failures
+
+def record(name):
+    """
+    Save the output of the tools on this machine as a new fixture
+    """
+    directory = os.path.join(FIXTURES, name)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    try:
+        for source, arglist in sorted(SOURCES.items()):
+            if arglist[0] == "cat":
+                status, output = 0, open(arglist[1]).read()
+            else:
+                status, output = describe.SUDO.run(arglist)
+            if status != 0 or not output.strip():
+                continue
+            with open(os.path.join(directory, source), "w") as f_out:
+                f_out.write(output)
+            print("Recorded", source)
+    finally:
+        describe.SUDO.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the describe.py parsers")
+    parser.add_argument("-n", "--repeat", type=int, default=20,
+                        help="runs of each parser to take the best time of")
+    parser.add_argument("--update", action="store_true",
+                        help="rewrite the expected results from the current parsers")
+    parser.add_argument("--record", metavar="NAME",
+                        help="save this machine's tool output as fixture NAME")
+    parser.add_argument("machines", nargs="*",
+                        help="fixtures to run (default all)")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.record)
+        return 0
+    machines = args.machines or sorted(os.listdir(FIXTURES))
+    return bench(machines, args.repeat, args.update)
+
+if __name__ == "__main__":
+    raise SystemExit(1 if main() else 0)
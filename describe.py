@@ -48,35 +48,222 @@ HDFS block size 128 MB data threads 4096
 
 """
 
-import os, subprocess
+from __future__ import print_function
+
+import hashlib, json, os, shutil, subprocess, sys, tempfile, threading, time
+from multiprocessing.pool import ThreadPool
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+try:
+    # Not there when describe.py is fed to a remote python by describe_cluster.py
+    import topology
+except ImportError:
+    topology = None
+
+class Report(object):
+    """
+    What one discovery module found, kept until it is time to print it.
+    The modules can then run at the same time and still be shown in order.
+    lines holds the text to display, data the values found along the way.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        self.data = dict()
+        self.value = None
+        self.partial = None
+        # False when the findings should not be kept in the cache
+        self.cacheable = True
+
+    def say(self, *words, **kwargs):
+        """
+        Add words to the report the way print does, separated by spaces.
+        Pass more=True to leave the line open, like a trailing comma.
+        """
+        text = ' '.join([str(word) for word in words])
+        if self.partial is not None:
+            if len(text):
+                text = self.partial + " " + text
+            else:
+                text = self.partial
+        if kwargs.get("more"):
+            self.partial = text
+        else:
+            self.lines.append(text)
+            self.partial = None
+
+    def text(self):
+        """
+        All the lines said so far, including any left open
+        """
+        if self.partial is None:
+            return list(self.lines)
+        return self.lines + [self.partial]
+
+    def as_dict(self):
+        """
+        Plain values only, so the report can be written out as JSON
+        """
+        return {"name": self.name, "lines": self.text(),
+                "data": self.data, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Rebuild a report from what as_dict gave
+        """
+        report = cls(values["name"])
+        report.lines = list(values["lines"])
+        report.data = values["data"]
+        report.value = values["value"]
+        return report
 
-def sudo(arglist):
+class SudoSession(object):
     """
-    The sudo command fails when run without a tty, so get one.
-    Returns the subprocess object.
-    Might use the os.openpty function instead some day
+    One privileged shell for the whole run, instead of a new sudo and
+    pseudo-terminal for every command.
+    The sudo command fails when run without a tty, so the shell gets a
+    pty of its own as its controlling terminal, but talks to us through
+    plain pipes. Each command runs in the background with its output
+    sent to a file, which is read in one go once the command is done,
+    so large outputs never pass through the pty.
     """
 
-    cmdlist = ["sudo", "-n"]
-    cmdlist.extend(arglist)
-    cmd = ' '.join(cmdlist)
-    return subprocess.Popen(["script", "-c", cmd, "-q", "/dev/null"],
-                            stdin=open("/dev/null", 'r'),
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT)
-def do_os():
+    def __init__(self, elevate=("sudo", "-n")):
+        self.elevate = list(elevate)
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.proc = None
+        self.directory = None
+        self.count = 0
+        self.status = dict()
+        self.dead = False
+
+    def start(self):
+        """
+        Start the privileged shell and the thread that listens to it
+        """
+        master, slave = os.openpty()
+        tty = os.ttyname(slave)
+
+        def own_tty():
+            # A new session takes the first tty it opens as its own
+            os.setsid()
+            os.close(os.open(tty, os.O_RDWR))
+
+        self.directory = tempfile.mkdtemp(prefix="describe.")
+        try:
+            self.proc = subprocess.Popen(self.elevate + ["/bin/sh", "-s"],
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=open(os.devnull, 'w'),
+                                         preexec_fn=own_tty,
+                                         close_fds=True,
+                                         universal_newlines=True)
+        except OSError:
+            # No sudo here, so nothing can be run as root
+            self.dead = True
+            self.proc = None
+            os.close(slave)
+            os.close(master)
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        os.close(slave)
+        # Keep our end open, closing it would hang up the shell
+        self.master = master
+        listener = threading.Thread(target=self.listen)
+        listener.daemon = True
+        listener.start()
+
+    def listen(self):
+        """
+        Note each command as the shell reports it done
+        """
+        # Not "for line in", which waits for more than a line on Python 2
+        for line in iter(self.proc.stdout.readline, ""):
+            words = line.split()
+            if len(words) == 3 and words[0] == "done":
+                with self.lock:
+                    self.status[int(words[1])] = int(words[2])
+                    self.finished.notify_all()
+        with self.lock:
+            self.dead = True
+            self.finished.notify_all()
+
+    def run(self, arglist):
+        """
+        Run a command as root, several may run at once.
+        Returns its exit status (None if sudo failed) and its output.
+        """
+        with self.lock:
+            if self.proc is None and not self.dead:
+                self.start()
+            self.count += 1
+            number = self.count
+            path = os.path.join(self.directory, "%d.out" % number)
+            if not self.dead:
+                try:
+                    self.proc.stdin.write("( %s >%s 2>&1 </dev/null; echo done %d $? ) &\n"
+                                          % (' '.join([quote(arg) for arg in arglist]),
+                                             path, number))
+                    self.proc.stdin.flush()
+                except (IOError, OSError):
+                    self.dead = True
+            while number not in self.status and not self.dead:
+                self.finished.wait()
+            status = self.status.pop(number, None)
+        if status is None:
+            return None, ""
+        with open(path) as f_in:
+            output = f_in.read()
+        os.remove(path)
+        return status, output
+
+    def close(self):
+        """
+        Let the shell finish and tidy up its files
+        """
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.proc.wait()
+        os.close(self.master)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.proc = None
+
+SUDO = SudoSession()
+
+def sudo(arglist, out=None):
+    """
+    Run a command as root through the privileged shell.
+    Returns its output, which is empty if sudo would not run it, and then
+    the Report out, if given, is not cached, as it lacks what root sees.
+    """
+    status, output = SUDO.run(arglist)
+    if status is None and out is not None:
+        out.cacheable = False
+    return output
+
+def do_os(out):
     """
     The operating system basics
     """
 
-    print "Operating system:"
+    out.say("Operating system:")
     CMD = "/usr/sbin/lsb_release"
     REDHAT = "/etc/redhat-release"
     proc = None
     if os.path.exists(CMD):
         proc = subprocess.Popen([CMD, "--description"],
                             stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT)
+                            stderr=subprocess.STDOUT,
+                            universal_newlines=True)
         f_in = proc.stdout
     elif os.path.exists(REDHAT):
         # Fall back on the old way of reading a file
@@ -94,14 +281,17 @@ def do_os():
                 # No reason for meaningless code names
                 words.remove(word)
                 if len(words):
-                    print " Linux distribution:", ' '.join(words)
+                    out.data["distribution"] = ' '.join(words)
+                    out.say(" Linux distribution:", ' '.join(words))
     if proc:
         proc.wait()
 
     proc = subprocess.Popen(["uname", "--kernel-release"],
                             stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT)
-    print " Kernel:", proc.stdout.read(),
+                            stderr=subprocess.STDOUT,
+                            universal_newlines=True)
+    out.data["kernel"] = proc.stdout.read().strip()
+    out.say(" Kernel:", out.data["kernel"])
     proc.wait()
 
     f_in = open("/proc/cmdline")
@@ -124,16 +314,35 @@ def do_os():
         if len(word):
             options.append(word)
 
+    out.data["boot_options"] = options
     if len(options):
-        print " Boot options:", ' '.join(options)
-    do_settings()
-    print
+        out.say(" Boot options:", ' '.join(options))
+    do_settings(out)
+    out.say()
 
-def do_cpu():
+def do_cpu(out):
     """
     Decode CPU number and Hyper-Threading setting
     """
     f_in = open("/proc/cpuinfo")
+    text = f_in.read()
+    f_in.close()
+    cores = parse_cpuinfo(out, text)
+    if topology is not None:
+        found = topology.read_topology()
+        partitions, parallelism, reasons = topology.recommend([found])
+        # Leave out what differs between otherwise identical nodes
+        out.data["topology"] = dict([(key, found[key]) for key in found
+                                     if key not in ["name", "numa_cpus"]])
+        out.say(" " + topology.summary(found))
+        out.say(" VectorH partitions %d per node, parallelism %d" % (
+                partitions, parallelism))
+    return cores
+
+def parse_cpuinfo(out, text):
+    """
+    Count the chips, cores and threads listed in /proc/cpuinfo
+    """
     threads = 0
     cores = 0
     physical = "0"
@@ -141,7 +350,7 @@ def do_cpu():
     packages = set()
     model = "Unknown"
     brand = "Intel"
-    for line in f_in:
+    for line in text.splitlines():
         words = line.split()
         if len(words) < 3:
             continue
@@ -175,7 +384,6 @@ def do_cpu():
             packages.add(physical)
         elif words[0:2] == ["core", "id"]:
             cpus.add("%s %s" % (physical, words[3]))
-    f_in.close()
 
     # Some kernels do not have "cpu cores"?
     # print "cores=%d cpus=%d" % (cores, len(cpus))
@@ -183,32 +391,34 @@ def do_cpu():
     if cores == 0:
         cores = len(cpus)
         if chips > 1:
-            cores /= chips
+            cores //= chips
 
+    out.data.update(model=model, brand=brand, chips=chips,
+                    cores=cores, threads=threads)
     if chips == 0:
         # Amazon and other virtual machines
-        print threads, "x", model, "(virtual)"
+        out.say(threads, "x", model, "(virtual)")
         return threads
 
     if chips > 1:
-        print chips, "x", model,
+        out.say(chips, "x", model, more=True)
     else:
-        print model,
+        out.say(model, more=True)
 
     if cores != 1:
         if chips > 1:
-            print cores, "cores each",
+            out.say(cores, "cores each", more=True)
         else:
-            print cores, "cores",
+            out.say(cores, "cores", more=True)
     else:
-        print "single-core",
+        out.say("single-core", more=True)
     if brand == "Intel":
         if threads > cores*chips:
-            print "(%d Hyperthreads)" % threads
+            out.say("(%d Hyperthreads)" % threads)
         else:
-            print "(Hyperthreading off)"
+            out.say("(Hyperthreading off)")
     else:
-        print
+        out.say()
     return cores*chips
 
 def pretty_size_kb(value):
@@ -219,23 +429,32 @@ def pretty_size_kb(value):
     if value < 1024:
         return str(value) + " KB"
     if value < 1024 * 1024:
-        return str(value/1024) + " MB"
-    return str(value/(1024*1024)) + " GB"
+        return str(value//1024) + " MB"
+    return str(value//(1024*1024)) + " GB"
 
-def do_mem():
+def do_mem(out):
     """
     Memory size and settings
     Merge this into DMI decoded info
     """
 
-    proc = sudo(["dmidecode"])
+    output = sudo(["dmidecode"], out)
+    f_in = open("/proc/meminfo")
+    meminfo = f_in.read()
+    f_in.close()
+    parse_mem(out, output, meminfo)
+
+def parse_mem(out, output, meminfo):
+    """
+    The system name and DIMMs from dmidecode, the total from /proc/meminfo
+    """
     mode = None
     system = ""
     speed = "Unknown"
     dimm = 0
     dimms = dict()
 
-    for line in proc.stdout:
+    for line in output.splitlines():
         words = line.split()
         if len(words) < 2:
             mode = None
@@ -273,37 +492,38 @@ def do_mem():
                 if words[2] == "GB":
                     dimm = int(words[1])
                 else:
-                    dimm = int(words[1])/1024
+                    dimm = int(words[1])//1024
 
-    print system
-    proc.stdout.close()
-    proc.wait()
+    out.say(system)
 
-    f_in = open("/proc/meminfo")
     # should read more, such as Hugepage info?
-    words = f_in.read().split()
-    f_in.close()
+    words = meminfo.split()
     if words[0] == "MemTotal:":
         value = int(words[1])
-        print "Memory:", pretty_size_kb(value), "used by kernel,",
+        out.data["kernel_kb"] = value
+        out.say("Memory:", pretty_size_kb(value), "used by kernel,", more=True)
     total = 0
     for size in sorted(dimms.keys()):
         if total > 0:
             plus = "+"
         else:
             plus = ""
-        print "%s%d x %d GB" % (plus, dimms[size], size),
+        out.say("%s%d x %d GB" % (plus, dimms[size], size), more=True)
         total += dimms[size] * size
+    # JSON keys have to be strings
+    out.data.update(system=system.strip(), speed=speed, total_gb=total,
+                    dimms=dict([(str(size), dimms[size]) for size in dimms]))
     if len(dimms):
-        print "= %d GB" % total,
+        out.say("= %d GB" % total, more=True)
     else:
-        print "(need sudo dmidecode for details)",
+        out.say("(need sudo dmidecode for details)", more=True)
+        out.cacheable = False
     if speed == "Unknown":
-        print
+        out.say()
     else:
-        print "@", speed
+        out.say("@", speed)
 
-def do_settings():
+def do_settings(out):
     """
     Some OS settings that might matter
     """
@@ -325,8 +545,10 @@ def do_settings():
                 defrag = "disabled"
         except Exception as e:
             pass
-        print " %s transparent huge pages %s and defrag %s" % (
-                                    variant, enabled, defrag)
+        out.data["thp"] = {"variant": variant,
+                           "enabled": enabled, "defrag": defrag}
+        out.say(" %s transparent huge pages %s and defrag %s" % (
+                                    variant, enabled, defrag))
         return True
 
     defrag = "/sys/kernel/mm/redhat_transparent_hugepage"
@@ -339,140 +561,143 @@ def do_settings():
         enabled = "maybe"
     else:
         enabled = "disabled"
-    print " Virtual memory over-commit", enabled
+    out.data["overcommit"] = enabled
+    out.say(" Virtual memory over-commit", enabled)
 
 
-def print_drives(logicals):
+def print_drives(out, logicals):
     """
     Helper to format logical drives on a given controller
     """
     for drive in sorted(logicals.keys()):
-        print " %s: %s" % (drive, logicals[drive])
-    print
+        out.data.setdefault("logicals", []).append(logicals[drive].strip())
+        out.say(" %s: %s" % (drive, logicals[drive]))
+    out.say()
 
-def do_lsi():
+def drive_speed(model):
     """
-    Do LSI controller specific reporting
+    Guess the speed of drives from certain manufacturers
     """
-
-    def speed_of(model):
-        """
-        Guess the speed of drives from certain manufacturers
-        """
-        words = model.split()
-        if words[0] in ["SEAGATE", "Seagate"]:
-            if len(words) < 2:
-                return ""
-            if words[1].startswith("0MP0", 4):
-                return "15K RPM 2.5 inch"
-            if words[1].startswith("06", 6):
-                return "7.2K RPM 2.5 inch"
-            if words[1].startswith("0NC0", 5):
-                return "7.2K RPM 3.5 inch"
-            if (words[1].startswith("0NM0", 5) or
-                words[1].startswith("ST3") or
-                words[1].startswith("ST2")):
-                return "7.2K RPM 3.5 inch"
-            if words[1].startswith("ST4000NC"):
-                return "5.9K RPM 3.5 inch"
-            if "0NS" in words[1] and words[1].startswith("ST91"):
-                return "7.2K RPM 2.5 inch SATA"
-            if (words[1].startswith("ST9") or
-                words[1].startswith("0MM0",4) or
-                words[1].startswith("0MM0",5)):
-                return "10K RPM 2.5 inch"
-
-        if words[0] == "TOSHIBA":
-            if words[1].startswith("MBF2"):
-                return "10K RPM 2.5 inch"
-            if words[1].startswith("MG03"):
-                return "7.2K RPM 3.5 inch"
-
-        if "ST910" in words[0]:
+    words = model.split()
+    if words[0] in ["SEAGATE", "Seagate"]:
+        if len(words) < 2:
+            return ""
+        if words[1].startswith("0MP0", 4):
+            return "15K RPM 2.5 inch"
+        if words[1].startswith("06", 6):
+            return "7.2K RPM 2.5 inch"
+        if words[1].startswith("0NC0", 5):
+            return "7.2K RPM 3.5 inch"
+        if (words[1].startswith("0NM0", 5) or
+            words[1].startswith("ST3") or
+            words[1].startswith("ST2")):
+            return "7.2K RPM 3.5 inch"
+        if words[1].startswith("ST4000NC"):
+            return "5.9K RPM 3.5 inch"
+        if "0NS" in words[1] and words[1].startswith("ST91"):
             return "7.2K RPM 2.5 inch SATA"
+        if (words[1].startswith("ST9") or
+            words[1].startswith("0MM0",4) or
+            words[1].startswith("0MM0",5)):
+            return "10K RPM 2.5 inch"
 
-        return ""
+    if words[0] == "TOSHIBA":
+        if words[1].startswith("MBF2"):
+            return "10K RPM 2.5 inch"
+        if words[1].startswith("MG03"):
+            return "7.2K RPM 3.5 inch"
 
-    def parse_proc(proc, adapters, physical=False):
-        """
-        Helper to parse the odd output of MegCli
-        """
+    if "ST910" in words[0]:
+        return "7.2K RPM 2.5 inch SATA"
 
-        # state of the MegaCli parser, logical or physical
-        if physical:
-            mode = "physical"
-        else:
-            mode = None
+    return ""
 
-        # map of "logical drives"
-        logicals = dict()
-        logical = 1
-        chunk = 1
-        raid = "0"
+def megacli_drives(out, output, adapters, physical=False):
+    """
+    Helper to parse the odd output of MegCli
+    """
 
-        # maps of physical drive properties
-        counts = dict()
-        sizes = dict()
-        size = ""
+    # state of the MegaCli parser, logical or physical
+    if physical:
+        mode = "physical"
+    else:
+        mode = None
 
-        for line in proc.stdout:
-            words = line.split()
-            if len(words) < 1:
-                continue
+    # map of "logical drives"
+    logicals = dict()
+    logical = 1
+    chunk = 1
+    raid = "0"
 
-            if words[0] == "Adapter":
-                if logicals:
-                    # Print virtual drives on last adapter, if any
-                    print_drives(logicals)
-                    logicals = dict()
-                if physical:
-                    continue
-                if words[1] in adapters:
-                    print "Adapter", words[1], adapters[words[1]]
+    # maps of physical drive properties
+    counts = dict()
+    sizes = dict()
+    size = ""
+
+    for line in output.splitlines():
+        words = line.split()
+        if len(words) < 1:
+            continue
+
+        if words[0] == "Adapter":
+            if logicals:
+                # Print virtual drives on last adapter, if any
+                print_drives(out, logicals)
+                logicals = dict()
+            if physical:
+                continue
+            if words[1] in adapters:
+                out.say("Adapter", words[1], adapters[words[1]])
+            else:
+                out.say("Adapter", words[1], "UNKNOWN?")
+        elif words[0:2] == ["Virtual", "Drive:"]:
+            mode = "logical"
+            logical = int(words[2])
+            logicals[logical] = ""
+        elif words[0] == "PD:":
+            mode = "physical"
+        elif mode == "logical":
+            if words[0:2] == ["Size", ":"]:
+                size = ' '.join(words[2:])
+                logicals[logical] += size + " "
+            elif words[0:2] == ["State", ":"]:
+                logicals[logical] += ' '.join(words[2:]) + " "
+            elif words[0:3] == ["Current", "Cache", "Policy:"]:
+                logicals[logical] += words[3].rstrip(',') + " "
+            # Should parse out more RAID details for these
+        elif mode == "physical":
+            if words[0:2] == ["Raw", "Size:"]:
+                size = ' '.join(words[2:4])
+            elif words[0:2] == ["Inquiry", "Data:"]:
+                model = ' '.join(words[2:4])
+                if "ST91000640NS" in model:
+                    # Special-case the odd SATA disks
+                    # They get serial number pre-pended?
+                    words = model.split()
+                    model = "Seagate " + words[0][8:]
+                if model in counts:
+                    counts[model] += 1
                 else:
-                    print "Adapter", words[1], "UNKNOWN?"
-            elif words[0:2] == ["Virtual", "Drive:"]:
-                mode = "logical"
-                logical = int(words[2])
-                logicals[logical] = ""
-            elif words[0] == "PD:":
-                mode = "physical"
-            elif mode == "logical":
-                if words[0:2] == ["Size", ":"]:
-                    size = ' '.join(words[2:])
-                    logicals[logical] += size + " "
-                elif words[0:2] == ["State", ":"]:
-                    logicals[logical] += ' '.join(words[2:]) + " "
-                elif words[0:3] == ["Current", "Cache", "Policy:"]:
-                    logicals[logical] += words[3].rstrip(',') + " "
-                # Should parse out more RAID details for these
-            elif mode == "physical":
-                if words[0:2] == ["Raw", "Size:"]:
-                    size = ' '.join(words[2:4])
-                elif words[0:2] == ["Inquiry", "Data:"]:
-                    model = ' '.join(words[2:4])
-                    if "ST91000640NS" in model:
-                        # Special-case the odd SATA disks
-                        # They get serial number pre-pended?
-                        words = model.split()
-                        model = "Seagate " + words[0][8:]
-                    if model in counts:
-                        counts[model] += 1
-                    else:
-                        counts[model] = 1
-                    sizes[model] = size
+                    counts[model] = 1
+                sizes[model] = size
 
-        proc.stdout.close()
-        proc.wait()
-        if logicals:
-            print_drives(logicals)
-        if len(counts) == 0:
-            return False
-        print "Physical drives:"
-        for model in counts:
-            print " ", counts[model], "x", model, sizes[model], speed_of(model)
-        print
-        return True
+    if logicals:
+        print_drives(out, logicals)
+    if len(counts) == 0:
+        return False
+    out.say("Physical drives:")
+    drives = out.data.setdefault("physical", dict())
+    for model in counts:
+        drives[model] = {"count": counts[model], "size": sizes[model],
+                         "speed": drive_speed(model)}
+        out.say(" ", counts[model], "x", model, sizes[model], drive_speed(model))
+    out.say()
+    return True
+
+def do_lsi(out):
+    """
+    Do LSI controller specific reporting
+    """
 
     CMD = "/opt/MegaRAID/MegaCli/MegaCli64"
     if not os.path.exists(CMD):
@@ -481,11 +706,23 @@ def do_lsi():
         if not os.path.exists(CMD):
             return False
 
+    return parse_megacli(out,
+                         sudo([CMD, "-AdpAllInfo", "-aAll", "-NoLog"], out),
+                         lambda: sudo([CMD, "-LdPdInfo", "-aAll", "-NoLog"], out),
+                         lambda: sudo([CMD, "-PdList", "-aAll", "-NoLog"], out))
+
+def parse_megacli(out, adpallinfo, ldpdinfo, pdlist):
+    """
+    Report the adapters and drives MegaCli found.
+    ldpdinfo and pdlist are functions giving the output of those
+    commands, so they only run when needed: -LdPdInfo if there are
+    adapters, -PdList if -LdPdInfo shows no physical drives.
+    """
+
     # First parse out adapters
-    proc = sudo([CMD, "-AdpAllInfo", "-aAll", "-NoLog"])
     adapters = dict()
     adapter = ""
-    for line in proc.stdout:
+    for line in adpallinfo.splitlines():
         words = line.split()
         if len(words) < 2:
             continue
@@ -497,21 +734,18 @@ def do_lsi():
         elif words[0:3] == ["Memory", "Size", ":"]:
             adapters[adapter] += ' '.join(words[2:])
 
-    proc.stdout.close()
-    proc.wait()
     if len(adapters) < 1:
         # if package installed but not LSI hardware
         return False
+    out.data["adapters"] = adapters
 
     # now parse out the drives
-    proc = sudo([CMD, "-LdPdInfo", "-aAll", "-NoLog"])
-    print "Logical drives on LSI controllers:"
-    if not parse_proc(proc, adapters):
-        proc = sudo([CMD, "-PdList", "-aAll", "-NoLog"])
-        parse_proc(proc, adapters, physical=True)
+    out.say("Logical drives on LSI controllers:")
+    if not megacli_drives(out, ldpdinfo(), adapters):
+        megacli_drives(out, pdlist(), adapters, physical=True)
     return True
 
-def do_hp():
+def do_hp(out):
     """
     Do HP platform specific reporting
     """
@@ -519,8 +753,13 @@ def do_hp():
     CMD = "/usr/sbin/hpacucli"
     if not os.path.exists(CMD):
         return False
-    proc = sudo([CMD,
-                "controller", "all", "show", "config", "detail"])
+    return parse_hpacucli(out, sudo([CMD, "controller", "all", "show",
+                                     "config", "detail"], out))
+
+def parse_hpacucli(out, output):
+    """
+    Report the controllers and drives hpacucli found
+    """
     # state of the hpacucli parser, logical or physical
     mode = None
 
@@ -529,7 +768,7 @@ def do_hp():
     logical = 1
     chunk = 1
     raid = "0"
-    print "Logical drives on HP controllers:"
+    out.say("Logical drives on HP controllers:")
 
     # maps of physical drive properties
     counts = dict()
@@ -537,16 +776,16 @@ def do_hp():
     speeds = dict()
     size = ""
     speed = ""
-    for line in proc.stdout:
+    for line in output.splitlines():
         words = line.split()
         if len(words) < 1:
             mode = None
             continue
         if words[0:2] == ["Smart", "Array"]:
             if logicals:
-                print_drives(logicals)
+                print_drives(out, logicals)
                 logicals = dict()
-            print ' '.join(words[2:])
+            out.say(' '.join(words[2:]))
         elif words[0:2] == ["Logical", "Drive:"]:
             mode = "logical"
             logical = int(words[2])
@@ -566,7 +805,7 @@ def do_hp():
             elif words[0:2] == ["Strip", "Size:"]:
                 chunk = int(words[2])
             elif words[0:3] == ["Full", "Stripe", "Size:"]:
-                width = int(words[3])/chunk
+                width = int(words[3])//chunk
                 if width > 1:
                     logicals[logical] += "%d KB X %d " % (chunk, width)
                 if raid != "0":
@@ -597,27 +836,33 @@ def do_hp():
                 sizes[model] = size
                 speeds[model] = speed
 
-    proc.stdout.close()
-    proc.wait()
     if logicals:
-        print_drives(logicals)
-    print "Physical drives:"
+        print_drives(out, logicals)
+    out.say("Physical drives:")
+    drives = out.data.setdefault("physical", dict())
     for model in counts:
-        print " ", counts[model], "x", model, sizes[model], speeds[model]
-    print
+        drives[model] = {"count": counts[model], "size": sizes[model],
+                         "speed": speeds[model]}
+        out.say(" ", counts[model], "x", model, sizes[model], speeds[model])
+    out.say()
     return True
 
-def do_net():
+def do_net(out):
     """
     For clusters (and perhaps remote loading, etc.)
     the network configuration might also be useful.
     Also find the PCIe flash devices in OnMetal.
     """
 
-    proc = sudo(["lspci"])
+    parse_lspci(out, sudo(["lspci"], out))
+
+def parse_lspci(out, output):
+    """
+    Count the network and flash adapters lspci lists
+    """
     flashes = dict()
     nets = dict()
-    for line in proc.stdout:
+    for line in output.splitlines():
         words = line.split()
         if len(words) < 2:
             continue
@@ -647,64 +892,366 @@ def do_net():
         else:
             nets[adapter] = 1
 
+    out.data.update(flashes=flashes, nets=nets)
     if len(flashes):
-        print
-        print "Storage:"
+        out.say()
+        out.say("Storage:")
         for adapter in flashes:
-            print " %d x %s" % (flashes[adapter], adapter)
+            out.say(" %d x %s" % (flashes[adapter], adapter))
 
     if len(nets) < 1:
         return
-    print "Network interface controllers:"
+    out.say("Network interface controllers:")
     for adapter in nets:
-        print " %d x %s" % (nets[adapter], adapter)
+        out.say(" %d x %s" % (nets[adapter], adapter))
 
-def do_hadoop():
+def do_hadoop(out):
     " record some Hadoop parameters that might be relevant to performance "
 
     proc = subprocess.Popen(["which", "hdfs"],
                              stdout=subprocess.PIPE,
-                             stderr=subprocess.STDOUT)
+                             stderr=subprocess.STDOUT,
+                             universal_newlines=True)
     words = proc.stdout.read().split()
     proc.wait()
-    if len(words) > 2:
+    if len(words) != 1:
         return
-    print
+    out.say()
     cmd = words[0].rstrip()
     proc = subprocess.Popen([cmd, "getconf", "-confKey", "dfs.blocksize"],
                              stdout=subprocess.PIPE,
-                             stderr=subprocess.STDOUT)
+                             stderr=subprocess.STDOUT,
+                             universal_newlines=True)
     try:
         blk = int(proc.stdout.read())
     except ValueError:
         blk = None
     proc.wait()
+    out.data["blocksize"] = blk
     if blk:
-        print "HDFS block size", blk/(1024*1024), "MB",
+        out.say("HDFS block size", blk//(1024*1024), "MB", more=True)
     else:
-        print "HDFS block size unknown?",
+        out.say("HDFS block size unknown?", more=True)
     proc = subprocess.Popen([cmd, "getconf", "-confKey", "dfs.datanode.max.transfer.threads"],
                              stdout=subprocess.PIPE,
-                             stderr=subprocess.STDOUT)
-    threads = proc.stdout.read()
+                             stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    threads = proc.stdout.read().strip()
     proc.wait()
-    print "data threads", threads
+    out.data["threads"] = threads
+    out.say("data threads", threads)
 
-def main():
+# SCSI vendors of MegaRAID logical drives, as seen in /sys/block
+MEGARAID_VENDORS = ["LSI", "AVAGO", "BROADCOM", "DELL", "IBM", "Lenovo", "FTS"]
+
+timer = getattr(time, "perf_counter", time.time)
+
+def measure_memory(seconds, size=64 * 1024 * 1024):
+    """
+    Memory copy bandwidth of one thread in GB/s, the best of as many
+    copies as fit in the time given.
+    Copying between two buffers is done by memcpy, which uses the
+    widest vector instructions the CPU has. Both the read and the write
+    are counted, as STREAM does.
+    """
+    # Filled in, so the pages are really there rather than shared zeros
+    source = memoryview(bytearray(b"\x01") * size)
+    target = memoryview(bytearray(b"\x02") * size)
+    best = None
+    deadline = timer() + seconds
+    while best is None or timer() < deadline:
+        start = timer()
+        target[:] = source
+        elapsed = timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return 2.0 * size / best / 1e9
+
+def measure_drive(device, seconds):
+    """
+    Sequential read speed of a drive in MB/s, or None if it can't be read.
+    dd reads with direct I/O into large aligned buffers, so neither the
+    page cache nor Python gets in the way, and is stopped after the time
+    given as if by ^C, which makes it report what it read so far.
+    """
+    status, output = SUDO.run(["env", "LC_ALL=C", "timeout", "-s", "INT",
+                               "%d" % max(seconds, 1), "dd", "if=" + device,
+                               "of=/dev/null", "bs=4M", "iflag=direct"])
+    for line in output.splitlines():
+        words = line.split()
+        if "copied," in words and words[0].isdigit():
+            elapsed = float(words[words.index("copied,") + 1])
+            if elapsed > 0:
+                return int(words[0]) / elapsed / 1e6
+    return None
+
+def megaraid_devices():
+    """
+    Block devices that are MegaRAID logical drives, since MegaCli does
+    not say which /dev names they have
+    """
+    devices = []
+    for name in sorted(os.listdir("/sys/block")):
+        try:
+            vendor = open("/sys/block/%s/device/vendor" % name).read().strip()
+        except IOError:
+            continue
+        if vendor in MEGARAID_VENDORS:
+            devices.append("/dev/" + name)
+    return devices
+
+def do_measure(reports, seconds):
+    """
+    Measure how fast the memory and the logical drives found really are,
+    adding the results to the reports next to what was found.
+    The memory is measured first, then all the drives at once, so the
+    whole thing takes about the time given.
+    """
+    found = dict([(report.name, report) for report in reports])
+    mem = found["mem"]
+    mem.data["measured_gbps"] = round(measure_memory(min(seconds / 5.0, 2.0)), 1)
+    mem.say("Memory copy bandwidth %.1f GB/s (one thread)" % mem.data["measured_gbps"])
+
+    devices = dict()
+    if found["hp"].value:
+        for drive in found["hp"].data.get("logicals", []):
+            for word in drive.split():
+                if word.startswith("/dev/"):
+                    devices[word] = "hp"
+    if found["lsi"].value:
+        for device in megaraid_devices():
+            devices[device] = "lsi"
+    if not devices:
+        return
+    budget = max(seconds - min(seconds / 5.0, 2.0), 1)
+    pool = ThreadPool(len(devices))
+    try:
+        speeds = dict(zip(sorted(devices), pool.map(
+            lambda device: measure_drive(device, budget), sorted(devices))))
+    finally:
+        pool.close()
+        pool.join()
+
+    # A drive well below the others on the same machine is worth a look
+    known = sorted([speed for speed in speeds.values() if speed])
+    median = known and known[len(known) // 2]
+    def speed_text(speed):
+        if speed is None:
+            return "not measured"
+        if len(known) > 2 and speed < median / 2:
+            return "%d MB/s SLOW" % speed
+        return "%d MB/s" % speed
+
+    hp = found["hp"]
+    hp.data["measured_mbps"] = dict([(device, speeds[device])
+                                     for device in speeds if devices[device] == "hp"])
+    for index, line in enumerate(hp.lines):
+        words = line.split()
+        if words and words[-1] in hp.data["measured_mbps"]:
+            hp.lines[index] = "%s %s" % (line.rstrip(),
+                                         speed_text(speeds[words[-1]]))
+    lsi = found["lsi"]
+    lsi.data["measured_mbps"] = dict([(device, speeds[device])
+                                      for device in speeds if devices[device] == "lsi"])
+    if lsi.data["measured_mbps"]:
+        lsi.say("Sequential reads of LSI logical drives:")
+        for device in sorted(lsi.data["measured_mbps"]):
+            lsi.say(" %s %s" % (device, speed_text(speeds[device])))
+        lsi.say()
+
+# The discovery modules, in the order they are reported
+PROBES = [("mem", do_mem),
+          ("cpu", do_cpu),
+          ("os", do_os),
+          ("hp", do_hp),
+          ("lsi", do_lsi),
+          ("net", do_net),
+          ("hadoop", do_hadoop)]
+
+# What the findings of the slow modules depend on, besides the boot.
+# Files count by their size and time, directories by what is in them.
+# The findings are kept in the cache until one of these changes.
+CACHED = {"mem": [],
+          "hp": ["/usr/sbin/hpacucli", "/sys/block"],
+          "lsi": ["/opt/MegaRAID/MegaCli/MegaCli64", "/usr/sbin/MegaCli64",
+                  "/sys/block"],
+          "net": ["/sys/bus/pci/devices"],
+          "hadoop": [os.environ.get("HADOOP_CONF_DIR", "/etc/hadoop/conf")]}
+
+class ProbeCache(object):
+    """
+    Findings of the slow discovery modules, kept on disk as JSON.
+    Most of what they report only changes with a reboot or new hardware,
+    so an entry is used until the boot ID or the module's inputs change,
+    or it is older than ttl seconds.
+    With refresh, entries are never used, only written.
+    With only, the slow modules are never run, only read from the cache.
+    """
+
+    def __init__(self, directory, ttl=7 * 24 * 3600, refresh=False, only=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.refresh = refresh
+        self.only = only
+        try:
+            self.boot_id = open("/proc/sys/kernel/random/boot_id").read().strip()
+        except IOError:
+            self.boot_id = ""
+
+    def key(self, name):
+        """
+        Digest of everything the module's findings depend on
+        """
+        try:
+            script = os.path.getmtime(os.path.abspath(__file__))
+        except OSError:
+            # Fed to python over stdin, as describe_cluster.py does
+            script = None
+        inputs = [self.boot_id, script]
+        for path in CACHED[name]:
+            if os.path.isdir(path):
+                for entry in sorted(os.listdir(path)):
+                    stat = os.lstat(os.path.join(path, entry))
+                    inputs.append([path, entry, stat.st_size, stat.st_mtime])
+            elif os.path.exists(path):
+                stat = os.stat(path)
+                inputs.append([path, stat.st_size, stat.st_mtime])
+        return hashlib.sha1(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, name):
+        """
+        The cached Report for the module, or None if missing or stale
+        """
+        if self.refresh or name not in CACHED:
+            return None
+        try:
+            entry = json.load(open(self.path(name)))
+        except (IOError, ValueError):
+            return None
+        if entry.get("key") != self.key(name):
+            return None
+        if time.time() - entry.get("time", 0) > self.ttl:
+            return None
+        return Report.from_dict(entry["report"])
+
+    def put(self, report):
+        """
+        Save the module's Report, replacing any older one
+        """
+        if report.name not in CACHED or not report.cacheable:
+            return
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # Another module might have just made it
+                if not os.path.isdir(self.directory):
+                    raise
+        entry = {"key": self.key(report.name), "time": time.time(),
+                 "report": report.as_dict()}
+        temp = "%s.%d" % (self.path(report.name), os.getpid())
+        with open(temp, "w") as f_out:
+            json.dump(entry, f_out, indent=1, sort_keys=True)
+        os.rename(temp, self.path(report.name))
+
+def run_probe(probe, cache=None):
+    """
+    Run one discovery module, collecting what it finds in a Report.
+    Uses the cached findings instead if there are any.
+    """
+    name, func = probe
+    if cache is not None:
+        out = cache.get(name)
+        if out is not None:
+            return out
+        if cache.only and name in CACHED:
+            out = Report(name)
+            out.say("(no cached %s details, run without --cached)" % name)
+            return out
+    out = Report(name)
+    out.value = func(out)
+    if cache is not None:
+        cache.put(out)
+    return out
+
+def run_probes(probes, jobs=None, cache=None):
+    """
+    Run the discovery modules, at most jobs of them at a time.
+    Most of the time goes on waiting for dmidecode, MegaCli and the
+    like, so threads are enough to overlap them.
+    Returns the Reports in the same order as the probes.
+    """
+    if jobs is None:
+        jobs = len(probes)
+    if jobs <= 1:
+        return [run_probe(probe, cache) for probe in probes]
+    pool = ThreadPool(min(jobs, len(probes)))
+    try:
+        return pool.map(lambda probe: run_probe(probe, cache), probes,
+                        chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def main(argv=None):
     """
     Invoke the discovery modules desired
     Some day, parse command line to subset them?
     """
-    do_mem()
-    cores = do_cpu()
-    do_os()
-    foundhp = do_hp()
-    foundlsi = do_lsi()
-    if not foundhp and not foundlsi:
-        print "Did not find HP nor LSI disk controller software"
-    do_net()
-    do_hadoop()
-    return cores
+    import argparse
+    parser = argparse.ArgumentParser(description="Describe this machine")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="discovery modules to run at once (default all)")
+    parser.add_argument("-s", "--serial", action="store_true",
+                        help="run the discovery modules one after another")
+    parser.add_argument("--json", action="store_true",
+                        help="write the reports as JSON, for describe_cluster.py")
+    parser.add_argument("--cache-dir", default=os.path.join(
+                            os.environ.get("XDG_CACHE_HOME",
+                                           os.path.expanduser("~/.cache")),
+                            "describe"),
+                        help="where to keep the findings of the slow modules")
+    parser.add_argument("--ttl", type=float, default=7 * 24,
+                        help="hours to use cached findings for (default a week)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="neither read nor write the cache")
+    parser.add_argument("--refresh", action="store_true",
+                        help="run every module again and update the cache")
+    parser.add_argument("--cached", action="store_true",
+                        help="never run the slow modules, only use the cache")
+    parser.add_argument("-m", "--measure", type=float, nargs="?", const=10,
+                        metavar="SECONDS",
+                        help="also measure memory and drive speed, "
+                             "taking about this long (default 10)")
+    args = parser.parse_args(argv)
+    if args.serial:
+        args.jobs = 1
+
+    cache = None
+    if not args.no_cache:
+        cache = ProbeCache(args.cache_dir, ttl=args.ttl * 3600,
+                           refresh=args.refresh, only=args.cached)
+    try:
+        reports = run_probes(PROBES, args.jobs, cache)
+        if args.measure:
+            do_measure(reports, args.measure)
+    finally:
+        SUDO.close()
+    found = dict([(report.name, report.value) for report in reports])
+    if args.json:
+        json.dump([report.as_dict() for report in reports], sys.stdout,
+                  indent=1, sort_keys=True)
+        print()
+        return found["cpu"]
+    for report in reports:
+        for line in report.text():
+            print(line)
+        if report.name == "lsi" and not found["hp"] and not found["lsi"]:
+            print("Did not find HP nor LSI disk controller software")
+    return found["cpu"]
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+ Describes every node of a VectorH cluster used for performance testing.
+ Runs describe.py on all the nodes listed in the slaves file at once,
+ then merges the results so that identical nodes are shown only once
+ and any node that differs from the rest stands out.
+
+ Usage: python3 describe_cluster.py [-f slaves-file] [-c connections]
+                                    [--measure [seconds]]
+                                    [--replay dir] [--record dir]
+
+ Nodes are reached with ssh by default. describe.py is fed to the remote
+ python over stdin, so it need not be installed on the nodes.
+ --record saves what each node returned into a directory, one file per
+ node, and --replay reads those files back instead of using ssh, which
+ is handy for trying out changes to the merge without a cluster.
+ --measure has describe.py measure memory and drive speed on every node,
+ and nodes or drives much slower than the rest are listed under Measured.
+
+ Output will look something like this:
+
+Cluster of 16 nodes, 1 unreachable
+
+14 x HP ProLiant DL380 G7, 274 GB, 2 x CPU X5660 @ 2.80GHz 6 cores each
+ node01 node02 node03 node04 node05 node06 node07 node08 node09 node10
+ node11 node12 node13 node14
+HP ProLiant DL380 G7
+Memory: 270 GB used by kernel, 1 x 2 GB +17 x 16 GB = 274 GB @ 1333 MHz
+...
+
+Outliers:
+1 x HP ProLiant DL380 G7, 256 GB, 2 x CPU X5660 @ 2.80GHz 6 cores each
+ node15
+ mem.dimms: {"16": 17, "2": 1} -> {"16": 16}
+ mem.total_gb: 274 -> 256
+
+Measured:
+ mem.measured_gbps: median 9.8, node07 4.1 SLOW
+ hp.measured_mbps: median 412, node03 /dev/sdk 96 SLOW
+
+Unreachable:
+ node16: ssh: connect to host node16 port 22: No route to host
+
+"""
+
+import argparse, asyncio, json, os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DESCRIBE = os.path.join(HERE, "describe.py")
+
+# Values that differ between otherwise identical nodes, so are not
+# used when deciding which nodes are the same
+VOLATILE = ["mem.kernel_kb"]
+
+# Measured speeds are never identical either, and are compared by
+# measured() instead
+MEASURED = ["mem.measured_gbps", "hp.measured_mbps", "lsi.measured_mbps"]
+
+class Transport(object):
+    """
+    How to run a command on a node. Subclasses provide run(), which
+    returns the exit status and the output of the command.
+    """
+
+    async def run(self, node, arglist, stdin=None):
+        raise NotImplementedError
+
+class SshTransport(Transport):
+    """
+    Run commands on the nodes with ssh, without asking for passwords
+    """
+
+    def __init__(self, options=None):
+        self.options = ["-o", "BatchMode=yes", "-o", "ConnectTimeout=10"]
+        if options:
+            self.options.extend(options)
+
+    async def run(self, node, arglist, stdin=None):
+        proc = await asyncio.create_subprocess_exec(
+            "ssh", *(self.options + [node, "--"] + arglist),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        output, errors = await proc.communicate(stdin)
+        if proc.returncode != 0 and not output:
+            output = errors
+        return proc.returncode, output.decode("utf-8", "replace")
+
+class ReplayTransport(Transport):
+    """
+    Play back what each node returned on an earlier --record run.
+    Nodes without a recording fail as if unreachable.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    async def run(self, node, arglist, stdin=None):
+        path = os.path.join(self.directory, node + ".json")
+        if not os.path.exists(path):
+            return 255, "no recording for %s in %s" % (node, self.directory)
+        with open(path) as f_in:
+            return 0, f_in.read()
+
+def read_slaves(path=None):
+    """
+    The nodes of the cluster, as listed in the VectorH slaves file.
+    Vector systems have no slaves file, so are just this one machine.
+    """
+    if path is None:
+        path = os.path.join(os.environ.get("II_SYSTEM", ""),
+                            "ingres", "files", "slaves")
+    if not os.path.exists(path):
+        return ["localhost"]
+    nodes = []
+    with open(path) as f_in:
+        for line in f_in:
+            words = line.split()
+            if len(words) < 1 or words[0].startswith('#'):
+                continue
+            if words[0] not in nodes:
+                nodes.append(words[0])
+    return nodes
+
+async def describe_nodes(nodes, transport, connections=8, python="python",
+                         measure=None):
+    """
+    Run describe.py on all the nodes, at most connections at a time.
+    Returns a dict of node to (reports, error), with reports a list of
+    the dicts describe.py --json writes, or None if the node failed.
+    measure is passed on to describe.py as its -m, if given.
+    """
+    with open(DESCRIBE, "rb") as f_in:
+        source = f_in.read()
+    limit = asyncio.Semaphore(connections)
+    arglist = [python, "-", "--json"]
+    if measure:
+        arglist.extend(["-m", "%g" % measure])
+
+    async def describe_node(node):
+        async with limit:
+            try:
+                status, output = await transport.run(
+                    node, arglist, stdin=source)
+            except OSError as e:
+                return node, None, str(e)
+        if status != 0:
+            return node, None, output.strip()
+        try:
+            return node, json.loads(output), None
+        except ValueError:
+            return node, None, "unexpected output: " + output.strip()[:200]
+
+    results = dict()
+    for node, reports, error in await asyncio.gather(
+            *[describe_node(node) for node in nodes]):
+        results[node] = (reports, error)
+    return results
+
+def flatten(reports):
+    """
+    One level dict of "module.key" to the value found, for comparisons
+    """
+    values = dict()
+    for report in reports:
+        for key, value in report["data"].items():
+            values[report["name"] + "." + key] = value
+    return values
+
+def fingerprint(values):
+    """
+    What makes two nodes the same, as something hashable
+    """
+    return tuple(sorted((key, json.dumps(value, sort_keys=True))
+                        for key, value in values.items()
+                        if key not in VOLATILE + MEASURED))
+
+def headline(values):
+    """
+    A one line summary of a node, such as
+    HP ProLiant DL380 G7, 274 GB, 2 x CPU X5660 @ 2.80GHz 6 cores each
+    """
+    words = []
+    if values.get("mem.system"):
+        words.append(values["mem.system"])
+    if values.get("mem.total_gb"):
+        words.append("%d GB" % values["mem.total_gb"])
+    elif values.get("mem.kernel_kb"):
+        words.append("%d GB" % (values["mem.kernel_kb"] // (1024 * 1024)))
+    chips = values.get("cpu.chips", 0)
+    model = values.get("cpu.model", "")
+    cores = values.get("cpu.cores", 0)
+    if chips == 0 and "cpu.threads" in values:
+        words.append(' '.join([str(values["cpu.threads"]), "x", model,
+                               "(virtual)"]))
+    elif chips > 0:
+        cpu = [model]
+        if chips > 1:
+            cpu = [str(chips), "x", model]
+        if cores == 1:
+            cpu.append("single-core")
+        elif chips > 1:
+            cpu.append("%d cores each" % cores)
+        else:
+            cpu.append("%d cores" % cores)
+        words.append(' '.join([word for word in cpu if word]))
+    return ', '.join(words)
+
+def merge(results):
+    """
+    Group the nodes that look the same, biggest group first.
+    Returns the groups as lists of (node, reports), and the failed
+    nodes as a list of (node, error).
+    """
+    groups = dict()
+    failed = []
+    for node in sorted(results):
+        reports, error = results[node]
+        if reports is None:
+            failed.append((node, error))
+            continue
+        key = fingerprint(flatten(reports))
+        groups.setdefault(key, []).append((node, reports))
+    ordered = sorted(groups.values(), key=lambda group: (-len(group), group[0][0]))
+    return ordered, failed
+
+def differences(values, usual):
+    """
+    Lines showing how a node differs from the usual ones
+    """
+    lines = []
+    for key in sorted(set(values) | set(usual)):
+        if key in VOLATILE + MEASURED:
+            continue
+        mine = values.get(key)
+        theirs = usual.get(key)
+        if mine != theirs:
+            lines.append(" %s: %s -> %s" % (key,
+                                            json.dumps(theirs, sort_keys=True),
+                                            json.dumps(mine, sort_keys=True)))
+    return lines
+
+def wrap_nodes(nodes, width=78):
+    """
+    List node names a line at a time
+    """
+    lines = []
+    line = ""
+    for node in nodes:
+        if len(line) + len(node) + 1 > width and line:
+            lines.append(line)
+            line = ""
+        line += " " + node
+    if line:
+        lines.append(line)
+    return lines
+
+def measured(results):
+    """
+    Lines listing the nodes, or drives, that measured at less than half
+    the median of the cluster
+    """
+    lines = []
+    speeds = dict()
+    for node in sorted(results):
+        reports, error = results[node]
+        if reports is None:
+            continue
+        for key, value in flatten(reports).items():
+            if key not in MEASURED or not value:
+                continue
+            if isinstance(value, dict):
+                for device in sorted(value):
+                    if value[device]:
+                        speeds.setdefault(key, []).append(
+                            ("%s %s" % (node, device), value[device]))
+            else:
+                speeds.setdefault(key, []).append((node, value))
+    for key in MEASURED:
+        if len(speeds.get(key, [])) < 3:
+            continue
+        known = sorted([speed for where, speed in speeds[key]])
+        median = known[len(known) // 2]
+        slow = ["%s %g SLOW" % (where, round(speed, 1))
+                for where, speed in speeds[key] if speed < median / 2.0]
+        lines.append(" %s: median %g%s" % (key, round(median, 1),
+                                           "".join([", " + item for item in slow])))
+    return lines
+
+def report(results):
+    """
+    The merged cluster report, as a list of lines
+    """
+    groups, failed = merge(results)
+    lines = ["Cluster of %d nodes" % len(results)]
+    if failed:
+        lines[0] += ", %d unreachable" % len(failed)
+    lines.append("")
+    if groups:
+        usual = groups[0]
+        values = flatten(usual[0][1])
+        lines.append("%d x %s" % (len(usual), headline(values)))
+        lines.extend(wrap_nodes([node for node, reports in usual]))
+        for item in usual[0][1]:
+            lines.extend(item["lines"])
+        lines.append("")
+    if len(groups) > 1:
+        lines.append("Outliers:")
+        for group in groups[1:]:
+            mine = flatten(group[0][1])
+            lines.append("%d x %s" % (len(group), headline(mine)))
+            lines.extend(wrap_nodes([node for node, reports in group]))
+            lines.extend(differences(mine, values))
+            lines.append("")
+    speeds = measured(results)
+    if speeds:
+        lines.append("Measured:")
+        lines.extend(speeds)
+        lines.append("")
+    if failed:
+        lines.append("Unreachable:")
+        for node, error in failed:
+            lines.append(" %s: %s" % (node, error.splitlines()[-1] if error else "failed"))
+        lines.append("")
+    return lines
+
+def record(results, directory):
+    """
+    Save what each node returned, for --replay later
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for node, (reports, error) in results.items():
+        if reports is None:
+            continue
+        with open(os.path.join(directory, node + ".json"), "w") as f_out:
+            json.dump(reports, f_out, indent=1, sort_keys=True)
+
+def main(argv=None):
+    """
+    Describe all the nodes, then print the merged report
+    """
+    parser = argparse.ArgumentParser(description="Describe all the nodes of a cluster")
+    parser.add_argument("-f", "--slaves", default=None,
+                        help="file listing the nodes (default $II_SYSTEM/ingres/files/slaves)")
+    parser.add_argument("-c", "--connections", type=int, default=8,
+                        help="nodes to describe at once (default 8)")
+    parser.add_argument("--python", default="python",
+                        help="python to run describe.py with on the nodes")
+    parser.add_argument("-m", "--measure", type=float, nargs="?", const=10,
+                        metavar="SECONDS",
+                        help="also measure memory and drive speed on every node")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="read recorded node output from DIR instead of using ssh")
+    parser.add_argument("--record", metavar="DIR",
+                        help="save each node's output into DIR")
+    parser.add_argument("nodes", nargs="*",
+                        help="nodes to describe instead of those in the slaves file")
+    args = parser.parse_args(argv)
+
+    nodes = args.nodes or read_slaves(args.slaves)
+    if args.replay:
+        transport = ReplayTransport(args.replay)
+    else:
+        transport = SshTransport()
+    results = asyncio.run(describe_nodes(nodes, transport,
+                                         connections=args.connections,
+                                         python=args.python,
+                                         measure=args.measure))
+    if args.record:
+        record(results, args.record)
+    for line in report(results):
+        print(line)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+
 # Flask web server to allow a remote user to browse files in /tmp
 # Requires that Python Flask is installed and working as a pre-req.
 # Just 'pip install Flask' if you have pip installed already.
@@ -11,15 +12,1015 @@
 # export FLASK_APP=file_browse.py;flask run --host 0.0.0.0
 # to run as an externally accessible service
 
-import os
-from flask import Flask, render_template, abort, redirect, url_for, send_file
+# Files are served with support for Range requests, so a download that
+# breaks can be resumed and a viewer can fetch just the part it wants,
+# and for conditional GETs, so a browser does not fetch an unchanged file
+# again. Add ?tail=N to a file's URL for just its last N lines, or
+# ?tail_bytes=N for its last N bytes, without the server reading the
+# rest of it.
+# Under a server that offers wsgi.file_wrapper, such as gunicorn, files
+# go from the page cache to the socket with sendfile, without passing
+# through Python. fileserver.sh uses gunicorn if it is installed.
+
+# Text files are sent compressed to browsers and tools that accept it,
+# with zstd if the zstandard module is installed, otherwise gzip. A
+# compressed copy of a file that has stopped changing is kept under
+# ~/.cache/file_browse, so it is only compressed once; the copies least
+# recently sent are removed when they take more than 2 GB.
+
+# Directory listings are cached, and only read again when the directory
+# changes, so a /tmp holding tens of thousands of files costs no more to
+# show than a small one. Listings come a page at a time, and take
+# ?sort=name|size|mtime, ?order=desc and ?glob=*.log
+
+# /view/<path> shows a page of lines from a text file, going straight to
+# any line (?line=2000000) or to the first line logged at or after a time
+# (?at=2024-03-01 10:15). It keeps the offset of every 1000th line in an
+# index under ~/.cache/file_browse, and adds to it as the file grows, so
+# only the new part of a growing log is read.
+
+# /search/<path>?pattern=E_ searches a file, or every file under a
+# directory, and streams back the matching lines as grep would, with
+# ?context=N lines around them. Add ?regex=1 for a regular expression,
+# ?case=0 to ignore case, ?glob=*.log to search only some files and
+# ?limit=N to stop after N matches. Files are searched in chunks by a
+# pool of processes, so big directories are searched on every CPU.
+
+# /follow/<path> shows the end of a file and the lines added to it as they
+# are written, streamed by file_follow.py, which must be running too.
+
+import base64, bisect, collections, fnmatch, json, mimetypes, mmap, os, re, tempfile, threading, time, zlib
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from datetime import datetime, timezone
+from flask import Flask, render_template, abort, redirect, url_for, request, Response
+from urllib.parse import quote as url_quote
+from werkzeug.http import http_date, is_resource_modified
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 app = Flask(__name__)
 
+BASE_DIR = '/tmp'
+
+# Size of the reads used to send files and to look for line ends
+BLOCK_SIZE = 1024 * 1024
+
+# Entries shown on each page of a directory listing
+PAGE_SIZE = 200
+
+# Directories whose listings are kept, the most recently used ones
+MAX_LISTINGS = 64
+
+# Files can grow without their directory changing, so listings are read
+# again after this many seconds anyway
+MAX_LISTING_AGE = 60
+
+# Listings that took longer than this to read are read again in the
+# background, showing the old one meanwhile
+INLINE_REBUILD_SECONDS = 0.2
+
+# Port file_follow.py listens on
+FOLLOW_PORT = 5001
+
+# Where line indexes are kept
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'file_browse')
+
+# Lines between the offsets kept in a line index
+INDEX_EVERY = 1000
+
+# Lines shown on each page of /view
+VIEW_LINES = 200
+
+# Line indexes kept in memory, the most recently used ones
+MAX_INDEXES = 32
+
+# Times as most logs write them, for ?at=
+TIMESTAMP = re.compile(rb'\d{4}-\d\d-\d\d[ T]\d\d:\d\d(:\d\d)?')
+
+# Compressors for each Content-Encoding offered, best first
+CODINGS = collections.OrderedDict()
+if zstandard is not None:
+    CODINGS['zstd'] = lambda: zstandard.ZstdCompressor(level=3).compressobj()
+CODINGS['gzip'] = lambda: zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+# Files smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+# Files unchanged for this many seconds have their compressed copy kept
+STABLE_SECONDS = 300
+
+# Most space the compressed copies can take
+COMPRESSED_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# Bytes of a file searched by one task of the search pool
+SEARCH_CHUNK = 64 * 1024 * 1024
+
+# Matches a search stops after, unless told otherwise
+SEARCH_LIMIT = 1000
+
+Entry = collections.namedtuple('Entry', ['name', 'is_dir', 'size', 'mtime'])
+
+SORT_KEYS = {'name': lambda entry: (entry.name,),
+             'size': lambda entry: (entry.size, entry.name),
+             'mtime': lambda entry: (entry.mtime, entry.name)}
+
+def file_etag(st):
+    """
+    ETag for a file, which changes whenever the file is replaced or written
+    """
+    return "%x-%x-%x" % (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def read_blocks(f_in, length):
+    """
+    Yield length bytes of the file from where it is now, a block at a time
+    """
+    with f_in:
+        while length > 0:
+            block = f_in.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+def tail_start(abs_path, size, lines):
+    """
+    Offset of the start of the last lines of the file, found by reading
+    back from the end a block at a time, so only the tail is read
+    """
+    if lines <= 0:
+        return size
+    with open(abs_path, 'rb') as f_in:
+        end = size
+        # A newline ending the file does not start another line
+        if end > 0:
+            f_in.seek(end - 1)
+            if f_in.read(1) == b'\n':
+                end -= 1
+        found = 0
+        while end > 0:
+            start = max(0, end - BLOCK_SIZE)
+            f_in.seek(start)
+            block = f_in.read(end - start)
+            index = len(block)
+            while True:
+                index = block.rfind(b'\n', 0, index)
+                if index < 0:
+                    break
+                found += 1
+                if found == lines:
+                    return start + index + 1
+            end = start
+    return 0
+
+def send_range(abs_path, st, start, end, status=200, mimetype=None):
+    """
+    Response with bytes start to end of the file as its body
+    """
+    f_in = open(abs_path, 'rb')
+    f_in.seek(start)
+    # The server sends the file itself if it can. It starts from where
+    # the file is now and stops at Content-Length, so this is a range too.
+    wrapper = request.environ.get('wsgi.file_wrapper')
+    if wrapper is not None:
+        body = wrapper(f_in, BLOCK_SIZE)
+    else:
+        body = read_blocks(f_in, end - start)
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(abs_path)[0] or 'application/octet-stream'
+    response = Response(body, status=status, mimetype=mimetype,
+                        direct_passthrough=True)
+    response.content_length = end - start
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = '"%s"' % file_etag(st)
+    response.vary.add('Accept-Encoding')
+    response.headers['Last-Modified'] = http_date(st.st_mtime)
+    if status == 206:
+        response.headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end - 1, st.st_size)
+    return response
+
+def choose_coding(abs_path, size):
+    """
+    The compression to send a file with, or None to send it as it is
+    """
+    if size < COMPRESS_MIN_SIZE or request.range is not None:
+        return None
+    coding = request.accept_encodings.best_match(list(CODINGS))
+    if coding is None or not is_text(abs_path):
+        return None
+    return coding
+
+def compressed_path(st, coding):
+    """
+    Where the compressed copy of this version of a file is kept
+    """
+    return os.path.join(CACHE_DIR, 'compressed', '%x-%x-%x-%x.%s' % (
+        st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, coding))
+
+def trim_compressed():
+    """
+    Remove the compressed copies sent least recently until they fit
+    in COMPRESSED_CACHE_BYTES
+    """
+    found = []
+    for item in os.scandir(os.path.join(CACHE_DIR, 'compressed')):
+        try:
+            st = item.stat()
+        except OSError:
+            continue
+        found.append((st.st_mtime, st.st_size, item.path))
+    total = sum([size for mtime, size, path in found])
+    for mtime, size, path in sorted(found):
+        if total <= COMPRESSED_CACHE_BYTES:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        total -= size
+
+def compress_blocks(abs_path, start, end, coding, keep=None):
+    """
+    Yield bytes start to end of the file compressed, a block at a time.
+    With keep, the compressed bytes are saved there too, once they have
+    all been sent and only if the file did not change meanwhile.
+    """
+    compressor = CODINGS[coding]()
+    f_out = None
+    if keep is not None:
+        directory = os.path.dirname(keep)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp = tempfile.mkstemp(dir=directory)
+        f_out = os.fdopen(fd, 'wb')
+    done = False
+    try:
+        with open(abs_path, 'rb') as f_in:
+            before = os.fstat(f_in.fileno())
+            f_in.seek(start)
+            length = end - start
+            while True:
+                block = f_in.read(min(BLOCK_SIZE, length))
+                length -= len(block)
+                data = compressor.compress(block) if block else compressor.flush()
+                if data:
+                    if f_out is not None:
+                        f_out.write(data)
+                    yield data
+                if not block:
+                    break
+            after = os.fstat(f_in.fileno())
+            done = (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns)
+    finally:
+        if f_out is not None:
+            f_out.close()
+            if done:
+                os.rename(temp, keep)
+                trim_compressed()
+            else:
+                os.unlink(temp)
+
+def send_compressed(abs_path, st, start, end, coding, etag, mimetype=None):
+    """
+    Response with bytes start to end of the file compressed, from the
+    kept copy if there is one
+    """
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(abs_path)[0] or 'application/octet-stream'
+    keep = None
+    length = None
+    if start == 0 and end == st.st_size and time.time() - st.st_mtime > STABLE_SECONDS:
+        keep = compressed_path(st, coding)
+    try:
+        f_in = open(keep, 'rb')
+    except (IOError, OSError, TypeError):
+        body = compress_blocks(abs_path, start, end, coding, keep)
+    else:
+        # Marks it as recently used
+        os.utime(keep)
+        length = os.fstat(f_in.fileno()).st_size
+        wrapper = request.environ.get('wsgi.file_wrapper')
+        if wrapper is not None:
+            body = wrapper(f_in, BLOCK_SIZE)
+        else:
+            body = read_blocks(f_in, length)
+    response = Response(body, mimetype=mimetype, direct_passthrough=True)
+    if length is not None:
+        response.content_length = length
+    response.headers['Content-Encoding'] = coding
+    response.headers['ETag'] = '"%s"' % etag
+    response.headers['Last-Modified'] = http_date(st.st_mtime)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def range_applies(st):
+    """
+    Whether a Range request should be honoured, which it is not if it
+    has an If-Range for an older version of the file
+    """
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == file_etag(st)
+    if if_range.date:
+        return int(st.st_mtime) <= if_range.date.timestamp()
+    return True
+
+def serve_file(abs_path):
+    """
+    Send a file, or the part of it that was asked for
+    """
+    st = os.stat(abs_path)
+    size = st.st_size
+    coding = choose_coding(abs_path, size)
+    etag = file_etag(st)
+    if coding:
+        etag += '-' + coding
+
+    if 'tail' in request.args or 'tail_bytes' in request.args:
+        try:
+            if 'tail_bytes' in request.args:
+                wanted = int(request.args['tail_bytes'])
+            else:
+                wanted = int(request.args['tail'])
+        except ValueError:
+            return abort(400)
+        if wanted < 0:
+            return abort(400)
+        if 'tail_bytes' in request.args:
+            start = max(0, size - wanted)
+        else:
+            start = tail_start(abs_path, size, wanted)
+        if coding and size - start >= COMPRESS_MIN_SIZE:
+            return send_compressed(abs_path, st, start, size, coding, etag,
+                                   mimetype='text/plain')
+        return send_range(abs_path, st, start, size, mimetype='text/plain')
+
+    last_modified = datetime.fromtimestamp(int(st.st_mtime), timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag,
+                                last_modified=last_modified):
+        response = Response(status=304)
+        response.headers['ETag'] = '"%s"' % etag
+        response.headers['Last-Modified'] = http_date(st.st_mtime)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    if coding:
+        return send_compressed(abs_path, st, 0, size, coding, etag)
+
+    if request.range is not None and range_applies(st):
+        wanted = request.range.range_for_length(size)
+        if wanted is not None:
+            return send_range(abs_path, st, wanted[0], wanted[1], status=206)
+        # Several ranges are allowed to get the whole file instead
+        if len(request.range.ranges) == 1:
+            response = Response(status=416)
+            response.headers['Content-Range'] = 'bytes */%d' % size
+            return response
+    return send_range(abs_path, st, 0, size)
+
+def scan_directory(abs_path):
+    """
+    Entries of a directory with their size and modification time.
+    scandir gets the type of each entry without a stat, so only files
+    that are there are looked at once more.
+    """
+    entries = []
+    for item in os.scandir(abs_path):
+        try:
+            st = item.stat()
+        except OSError:
+            # Removed since the directory was read
+            continue
+        entries.append(Entry(item.name, item.is_dir(), st.st_size, st.st_mtime))
+    return entries
+
+def directory_version(abs_path):
+    """
+    Something that changes when files are added to, removed from or
+    renamed in the directory
+    """
+    st = os.stat(abs_path)
+    return (st.st_ino, st.st_mtime_ns)
+
+class Listing(object):
+    """
+    The cached entries of one directory, and the sorted and filtered
+    views of them that have been asked for
+    """
+
+    def __init__(self, abs_path):
+        self.abs_path = abs_path
+        self.version = None
+        self.entries = []
+        self.built = 0
+        self.build_seconds = 0
+        self.building = False
+        # Set once the directory has first been read, for the requests
+        # that come while it is, as there is no older listing to show them
+        self.ready = threading.Event()
+        self.views = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def stale(self):
+        try:
+            version = directory_version(self.abs_path)
+        except OSError:
+            return True
+        return version != self.version or time.time() - self.built > MAX_LISTING_AGE
+
+    def build(self):
+        """
+        Read the directory again, replacing the entries all at once so
+        requests being answered from the old ones are not disturbed
+        """
+        try:
+            start = time.time()
+            version = directory_version(self.abs_path)
+            entries = scan_directory(self.abs_path)
+            with self.lock:
+                self.version = version
+                self.entries = entries
+                self.views = collections.OrderedDict()
+                self.built = time.time()
+                self.build_seconds = self.built - start
+        finally:
+            self.building = False
+            self.ready.set()
+
+    def refresh(self):
+        """
+        Bring the listing up to date if the directory has changed. Big
+        directories are read in a thread and the old listing is used
+        until that is done, except the first time, when there is none.
+        """
+        if self.building or not self.stale():
+            self.ready.wait()
+            return
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        if self.built and self.build_seconds > INLINE_REBUILD_SECONDS:
+            threading.Thread(target=self.build, daemon=True).start()
+        else:
+            self.build()
+
+    def view(self, sort, glob):
+        """
+        The entries matching glob in sort order, with their sort keys
+        """
+        with self.lock:
+            key = (sort, glob)
+            if key in self.views:
+                self.views.move_to_end(key)
+                return self.views[key]
+            entries = self.entries
+            if glob:
+                match = re.compile(fnmatch.translate(glob)).match
+                entries = [entry for entry in entries if match(entry.name)]
+            entries = sorted(entries, key=SORT_KEYS[sort])
+            found = (entries, [SORT_KEYS[sort](entry) for entry in entries])
+            self.views[key] = found
+            while len(self.views) > 16:
+                self.views.popitem(last=False)
+            return found
+
+    def page(self, sort='name', descending=False, glob=None, cursor=None,
+             size=PAGE_SIZE):
+        """
+        One page of the listing, the number of entries that match, and
+        the cursor for the next page, if there is one.
+        The cursor is the sort key of the last entry shown, so paging
+        carries on from the right place even if files come and go.
+        """
+        entries, keys = self.view(sort, glob)
+        count = len(entries)
+        start = 0
+        if cursor is not None:
+            if descending:
+                start = count - bisect.bisect_left(keys, cursor)
+            else:
+                start = bisect.bisect_right(keys, cursor)
+        if descending:
+            indexes = range(count - 1 - start, max(count - 1 - start - size, -1), -1)
+        else:
+            indexes = range(start, min(start + size, count))
+        shown = [entries[index] for index in indexes]
+        following = None
+        if start + size < count and shown:
+            following = encode_cursor(keys[indexes[-1]])
+        return shown, count, following
+
+LISTINGS = collections.OrderedDict()
+LISTINGS_LOCK = threading.Lock()
+
+def get_listing(abs_path):
+    """
+    The up to date listing of a directory, from the cache if it can be
+    """
+    with LISTINGS_LOCK:
+        listing = LISTINGS.get(abs_path)
+        if listing is None:
+            listing = LISTINGS[abs_path] = Listing(abs_path)
+            while len(LISTINGS) > MAX_LISTINGS:
+                LISTINGS.popitem(last=False)
+        else:
+            LISTINGS.move_to_end(abs_path)
+    listing.refresh()
+    return listing
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(text):
+    key = json.loads(base64.urlsafe_b64decode(text.encode('ascii')).decode('utf-8'))
+    if not isinstance(key, list):
+        raise ValueError('not a cursor: %r' % text)
+    return tuple(key)
+
+def show_directory(abs_path, req_path):
+    """
+    A page of a directory listing
+    """
+    sort = request.args.get('sort', 'name')
+    if sort not in SORT_KEYS:
+        return abort(400)
+    descending = request.args.get('order') == 'desc'
+    glob = request.args.get('glob') or None
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_cursor(request.args['cursor'])
+        except ValueError:
+            return abort(400)
+    try:
+        entries, count, following = get_listing(abs_path).page(sort, descending,
+                                                               glob, cursor)
+    except TypeError:
+        # A cursor from a listing sorted another way
+        return abort(400)
+    return render_template('files.html', files=entries, path='/' + req_path,
+                           count=count, sort=sort, descending=descending,
+                           glob=glob or '', following=following,
+                           timestamp=lambda mtime: time.strftime(
+                               '%Y-%m-%d %H:%M:%S', time.localtime(mtime)))
+
+class LineIndex(object):
+    """
+    Offsets of every INDEX_EVERY'th line of a file, so any line can be
+    found by reading at most INDEX_EVERY lines.
+    Only complete lines are indexed. When the file grows the index is
+    extended from where it stopped, after checking that the end of the
+    part already indexed has not changed; otherwise it starts again.
+    """
+
+    def __init__(self, abs_path):
+        self.abs_path = abs_path
+        self.lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, st):
+        self.ino = st.st_ino if st else None
+        self.dev = st.st_dev if st else None
+        self.size = 0
+        self.mtime_ns = 0
+        self.indexed = 0
+        self.lines = 0
+        self.offsets = array('Q', [0])
+        self.check = b''
+        self.saved = 1
+
+    def cache_path(self):
+        return os.path.join(CACHE_DIR, 'index', '%x-%x.idx' % (self.dev, self.ino))
+
+    def load(self, st):
+        """
+        Pick up the index saved for this inode, if it was for this file
+        """
+        self.reset(st)
+        try:
+            with open(self.cache_path(), 'rb') as f_in:
+                header = json.loads(f_in.readline().decode('utf-8'))
+                if header['path'] != self.abs_path or header['ino'] != st.st_ino:
+                    return
+                offsets = array('Q')
+                offsets.frombytes(f_in.read())
+        except (IOError, OSError, ValueError, KeyError):
+            return
+        self.size = header['size']
+        self.mtime_ns = header['mtime_ns']
+        self.indexed = header['indexed']
+        self.lines = header['lines']
+        self.check = bytes.fromhex(header['check'])
+        self.offsets = offsets
+        self.saved = len(offsets)
+
+    def save(self):
+        """
+        Write the index out, replacing the old one in one go
+        """
+        directory = os.path.dirname(self.cache_path())
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            header = {'path': self.abs_path, 'ino': self.ino, 'size': self.size,
+                      'mtime_ns': self.mtime_ns, 'indexed': self.indexed,
+                      'lines': self.lines, 'check': self.check.hex()}
+            fd, temp = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as f_out:
+                f_out.write(json.dumps(header, sort_keys=True).encode('utf-8') + b'\n')
+                f_out.write(self.offsets.tobytes())
+            os.rename(temp, self.cache_path())
+            self.saved = len(self.offsets)
+        except (IOError, OSError):
+            pass
+
+    def update(self, mm, st):
+        """
+        Bring the index up to date with the file, mapped as mm
+        """
+        if self.ino != st.st_ino:
+            self.load(st)
+        if st.st_size == self.size and st.st_mtime_ns == self.mtime_ns:
+            return
+        if (st.st_size < self.indexed or
+                mm[self.indexed - len(self.check):self.indexed] != self.check):
+            # Truncated or rewritten
+            self.reset(st)
+        end = mm.rfind(b'\n', self.indexed) + 1
+        if end > self.indexed:
+            self.scan(mm, end)
+            self.check = mm[max(0, end - 64):end]
+            self.indexed = end
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        # Saved whenever it gains an offset, so files of under
+        # INDEX_EVERY lines never are
+        if len(self.offsets) > self.saved:
+            self.save()
+
+    def scan(self, mm, end, chunk_size=16 * 1024 * 1024, segment=4096):
+        """
+        Index the lines between where the index stopped and end.
+        Newlines are counted a segment at a time, which is quick, and
+        only the segments holding the start of an indexed line are
+        searched line by line.
+        """
+        pos = self.indexed
+        while pos < end:
+            chunk = mm[pos:min(pos + chunk_size, end)]
+            start = 0
+            while start < len(chunk):
+                stop = min(start + segment, len(chunk))
+                found = chunk.count(b'\n', start, stop)
+                wanted = len(self.offsets) * INDEX_EVERY - self.lines
+                if found < wanted:
+                    self.lines += found
+                    start = stop
+                    continue
+                index = start - 1
+                for i in range(wanted):
+                    index = chunk.index(b'\n', index + 1)
+                self.lines += wanted
+                self.offsets.append(pos + index + 1)
+                start = index + 1
+            pos += len(chunk)
+
+    def total(self, mm):
+        """
+        Lines in the file, counting a last line with no newline yet
+        """
+        return self.lines + (1 if len(mm) > self.indexed else 0)
+
+    def offset(self, mm, line):
+        """
+        Where a line starts
+        """
+        pos = self.offsets[line // INDEX_EVERY]
+        for i in range(line % INDEX_EVERY):
+            pos = mm.find(b'\n', pos) + 1
+            if pos == 0:
+                return len(mm)
+        return pos
+
+    def read(self, mm, line, count):
+        """
+        Up to count lines from line on, as text
+        """
+        start = self.offset(mm, line)
+        end = start
+        for i in range(count):
+            end = mm.find(b'\n', end) + 1
+            if end == 0:
+                end = len(mm)
+                break
+        return mm[start:end].decode('utf-8', 'replace').splitlines()
+
+    def find_time(self, mm, when):
+        """
+        The first line logged at or after when, given as text such as
+        2024-03-01 10:15, by a binary search of the indexed lines and then
+        a look through the INDEX_EVERY lines before the one found
+        """
+        when = when.replace('T', ' ').encode('utf-8')
+
+        def stamp(pos):
+            # The time of the first line from pos on that has one
+            for i in range(INDEX_EVERY):
+                end = mm.find(b'\n', pos)
+                if end < 0:
+                    end = len(mm)
+                found = TIMESTAMP.search(mm[pos:end])
+                if found:
+                    return found.group(0).replace(b'T', b' ')
+                if end >= len(mm):
+                    return None
+                pos = end + 1
+            return None
+
+        low, high = 0, len(self.offsets)
+        while low < high:
+            middle = (low + high) // 2
+            found = stamp(self.offsets[middle])
+            if found is not None and found < when:
+                low = middle + 1
+            else:
+                high = middle
+        line = max(0, low - 1) * INDEX_EVERY
+        pos = self.offset(mm, line)
+        last = self.total(mm)
+        while line < last:
+            end = mm.find(b'\n', pos)
+            if end < 0:
+                end = len(mm)
+            found = TIMESTAMP.search(mm[pos:end])
+            if found and found.group(0).replace(b'T', b' ') >= when:
+                break
+            line += 1
+            pos = end + 1
+        return line
+
+LINE_INDEXES = collections.OrderedDict()
+LINE_INDEXES_LOCK = threading.Lock()
+
+def get_line_index(abs_path):
+    """
+    The line index of a file, from memory if it can be
+    """
+    with LINE_INDEXES_LOCK:
+        index = LINE_INDEXES.get(abs_path)
+        if index is None:
+            index = LINE_INDEXES[abs_path] = LineIndex(abs_path)
+            while len(LINE_INDEXES) > MAX_INDEXES:
+                LINE_INDEXES.popitem(last=False)
+        else:
+            LINE_INDEXES.move_to_end(abs_path)
+    return index
+
+@app.route('/view/<path:req_path>')
+def view_file(req_path):
+    """
+    A page of lines from a text file
+    """
+    abs_path = resolve(req_path)
+    if abs_path is None or not os.path.isfile(abs_path):
+        return abort(404)
+    try:
+        count = int(request.args.get('count') or VIEW_LINES)
+        # The Go form sends an empty line when only the time is filled in
+        line = int(request.args.get('line') or 1) - 1
+    except ValueError:
+        return abort(400)
+    count = max(1, min(count, 10 * VIEW_LINES))
+
+    index = get_line_index(abs_path)
+    lines = []
+    total = 0
+    with open(abs_path, 'rb') as f_in:
+        st = os.fstat(f_in.fileno())
+        if st.st_size > 0:
+            mm = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                with index.lock:
+                    index.update(mm, st)
+                    total = index.total(mm)
+                    if request.args.get('at'):
+                        # Show a few lines from before the time as well
+                        line = index.find_time(mm, request.args['at']) - 10
+                    elif 'end' in request.args:
+                        line = total - count
+                    line = max(0, min(line, total - 1))
+                    lines = index.read(mm, line, count)
+            finally:
+                mm.close()
+    return render_template('view.html', path='/' + req_path, lines=lines,
+                           first=line + 1, count=count, total=total)
+
+def resolve(req_path):
+    """
+    The path on disk for a request, or None if it is outside BASE_DIR
+    """
+    base = os.path.realpath(BASE_DIR)
+    abs_path = os.path.realpath(os.path.join(base, req_path))
+    if abs_path != base and not abs_path.startswith(base + os.sep):
+        return None
+    return abs_path
+
+def line_at(mm, pos):
+    """
+    Start and end of the line holding pos
+    """
+    start = mm.rfind(b'\n', 0, pos) + 1
+    end = mm.find(b'\n', pos)
+    if end < 0:
+        end = len(mm)
+    return start, end
+
+def search_chunk(abs_path, start, end, pattern, flags, context, limit):
+    """
+    Search the lines that start between start and end of a file.
+    Runs in the search pool, so takes and returns only plain values.
+    Returns the number of lines searched and up to limit matches, each
+    the line number in the chunk, its text, and the lines around it.
+    """
+    found = []
+    with open(abs_path, 'rb') as f_in:
+        mm = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # Lines are searched by the chunk they start in
+            first = 0
+            if start > 0:
+                first = mm.find(b'\n', start - 1) + 1 or len(mm)
+            last = len(mm)
+            if end < len(mm):
+                last = mm.find(b'\n', end - 1) + 1 or len(mm)
+            data = mm[first:last]
+            search = re.compile(pattern, flags | re.MULTILINE).search
+            counted = 0
+            line = 0
+            pos = 0
+            while len(found) < limit:
+                match = search(data, pos)
+                if match is None:
+                    break
+                line_start, line_end = line_at(data, match.start())
+                line += data.count(b'\n', counted, line_start)
+                counted = line_start
+                before = []
+                pos = first + line_start
+                for i in range(context):
+                    if pos == 0:
+                        break
+                    before_start, before_end = line_at(mm, pos - 1)
+                    before.insert(0, mm[before_start:before_end])
+                    pos = before_start
+                after = []
+                pos = first + line_end + 1
+                for i in range(context):
+                    if pos >= len(mm):
+                        break
+                    after_start, after_end = line_at(mm, pos)
+                    after.append(mm[after_start:after_end])
+                    pos = after_end + 1
+                found.append((line, data[line_start:line_end], before, after))
+                # One match a line, as grep
+                pos = line_end + 1
+            return data.count(b'\n'), found
+        finally:
+            mm.close()
+
+SEARCH_POOL = None
+SEARCH_POOL_LOCK = threading.Lock()
+
+def search_pool():
+    """
+    The processes that searches run in, started on the first search
+    """
+    global SEARCH_POOL
+    with SEARCH_POOL_LOCK:
+        if SEARCH_POOL is None:
+            SEARCH_POOL = ProcessPoolExecutor()
+        return SEARCH_POOL
+
+def is_text(abs_path):
+    """
+    Whether a file looks like text, as grep decides
+    """
+    try:
+        with open(abs_path, 'rb') as f_in:
+            return b'\0' not in f_in.read(8192)
+    except (IOError, OSError):
+        return False
+
+def search_files(abs_path, glob=None):
+    """
+    The files a search of a file or directory looks in, in order
+    """
+    if os.path.isfile(abs_path):
+        yield abs_path
+        return
+    for root, dirs, names in os.walk(abs_path):
+        dirs.sort()
+        for name in sorted(names):
+            if glob and not fnmatch.fnmatch(name, glob):
+                continue
+            path = os.path.join(root, name)
+            if os.path.isfile(path) and os.path.getsize(path) > 0 and is_text(path):
+                yield path
+
+def search_results(abs_path, pattern, flags, context, limit, glob=None):
+    """
+    Yield the output of a search as it is found.
+    The chunks are searched in parallel but reported in order, with a
+    few more than the pool can run at once handed out ahead, so that
+    stopping early leaves little work wasted.
+    """
+    pool = search_pool()
+    ahead = 2 * (os.cpu_count() or 1)
+    tasks = ((path, start, min(start + SEARCH_CHUNK, size))
+             for path, size in ((path, os.path.getsize(path))
+                                for path in search_files(abs_path, glob))
+             for start in range(0, size, SEARCH_CHUNK))
+    pending = collections.deque()
+    shown = 0
+    lines = dict()
+    base = os.path.realpath(BASE_DIR)
+    try:
+        while True:
+            for task in tasks:
+                pending.append((task, pool.submit(search_chunk, *task, pattern=pattern,
+                                                  flags=flags, context=context,
+                                                  limit=limit - shown)))
+                if len(pending) >= ahead:
+                    break
+            if not pending:
+                break
+            (path, start, end), future = pending.popleft()
+            counted, found = future.result()
+            name = os.path.relpath(path, base)
+            for line, text, before, after in found:
+                number = lines.get(path, 0) + line + 1
+                if context and shown:
+                    yield '--\n'
+                for i, other in enumerate(before):
+                    yield '%s-%d-%s\n' % (name, number - len(before) + i,
+                                           other.decode('utf-8', 'replace'))
+                yield '%s:%d:%s\n' % (name, number, text.decode('utf-8', 'replace'))
+                for i, other in enumerate(after):
+                    yield '%s-%d-%s\n' % (name, number + 1 + i,
+                                           other.decode('utf-8', 'replace'))
+                shown += 1
+                if shown >= limit:
+                    yield 'Stopped after %d matches\n' % shown
+                    return
+            lines[path] = lines.get(path, 0) + counted
+    finally:
+        for task, future in pending:
+            future.cancel()
+
+@app.route('/search/', defaults={'req_path': ''})
+@app.route('/search/<path:req_path>')
+def search(req_path):
+    """
+    Lines matching a pattern in a file or directory, as they are found
+    """
+    abs_path = resolve(req_path)
+    if abs_path is None or not os.path.exists(abs_path):
+        return abort(404)
+    pattern = request.args.get('pattern', '')
+    if not pattern:
+        return abort(400)
+    if request.args.get('regex') not in (None, '', '0'):
+        pattern = pattern.encode('utf-8')
+    else:
+        pattern = re.escape(pattern.encode('utf-8'))
+    flags = re.IGNORECASE if request.args.get('case') == '0' else 0
+    try:
+        re.compile(pattern, flags)
+        context = max(0, min(int(request.args.get('context', 2)), 100))
+        limit = max(1, int(request.args.get('limit', SEARCH_LIMIT)))
+    except (re.error, ValueError):
+        return abort(400)
+    return Response(search_results(abs_path, pattern, flags, context, limit,
+                                   request.args.get('glob') or None),
+                    mimetype='text/plain')
+
+@app.route('/follow/<path:req_path>')
+def follow_file(req_path):
+    """
+    A page showing the lines added to a file as they are written
+    """
+    abs_path = resolve(req_path)
+    if abs_path is None or not os.path.isfile(abs_path):
+        return abort(404)
+    stream = '//%s:%d/follow/%s' % (request.host.rsplit(':', 1)[0], FOLLOW_PORT,
+                                    url_quote(req_path))
+    return render_template('follow.html', path='/' + req_path, stream=stream)
+
 @app.route('/', defaults={'req_path': ''})
 @app.route('/<path:req_path>')
 def dir_listing(req_path):
-    BASE_DIR = '/tmp'
-
     # Joining the base and the requested path
     abs_path = os.path.join(BASE_DIR, req_path)
 
@@ -29,11 +1030,14 @@ def dir_listing(req_path):
 
     # Check if path is a file and serve
     if os.path.isfile(abs_path):
-        return send_file(abs_path)
+        return serve_file(abs_path)
+
+    # Links in the listing are relative to the directory
+    if req_path and not req_path.endswith('/'):
+        return redirect(url_for('dir_listing', req_path=req_path + '/'))
 
     # Show directory contents
-    files = os.listdir(abs_path)
-    return render_template('files.html', files=files)
+    return show_directory(abs_path, req_path)
 
 if __name__ == "__main__":
-    app.run()
+    app.run(threaded=True)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+# Live follow of files in /tmp, for people browsing them with file_browse.py.
+# Streams the lines added to a file to browsers as server-sent events, so
+# a log being written during a benchmark can be watched without reloading.
+# Uses only asyncio from the standard library, and runs beside
+# file_browse.py on its own port; fileserver.sh starts both.
+# file_browse.py's /follow/<path> page connects to it.
+
+# Each file being followed is read by one watcher, however many people are
+# watching it, which hands what it reads to all of them. Someone whose
+# connection cannot keep up is skipped ahead rather than holding up the
+# others or filling memory. A log that is rotated is followed into the
+# new file, and one that is truncated is followed from its new start.
+
+# To execute, just run 'python3 file_follow.py [--port 5001]'
+# The events sent are
+#   lines      data holds lines added to the file, one per data field
+#   rotated    the file was replaced, lines that follow are from the new one
+#   truncated  the file was cut short, lines that follow are from its start
+#   skipped    data holds the number of lines missed by a slow connection
+
+import argparse, asyncio, collections, os, urllib.parse
+
+BASE_DIR = '/tmp'
+PORT = 5001
+
+# How often the watchers look for new lines
+POLL_SECONDS = 0.5
+
+# Most read from a file in one poll, so one busy file can't hold up the rest
+READ_SIZE = 4 * 1024 * 1024
+
+# Recent lines kept by a watcher, to show someone who starts watching
+KEEP_LINES = 1000
+
+# Batches of lines waiting for a viewer before it is skipped ahead
+QUEUE_BATCHES = 64
+
+# Seconds between comments sent to idle connections, to notice ones closed
+PING_SECONDS = 15
+
+class Viewer(object):
+    """
+    One connection following a file, with the batches of lines waiting
+    to be sent to it
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue(QUEUE_BATCHES)
+
+    def offer(self, batch):
+        """
+        Queue a batch of lines. A viewer whose queue is full has the lines
+        waiting thrown away and is told how many it missed.
+        """
+        try:
+            self.queue.put_nowait(batch)
+            return
+        except asyncio.QueueFull:
+            pass
+        missed = len(batch[2])
+        while not self.queue.empty():
+            kind, event_id, lines = self.queue.get_nowait()
+            if kind == 'lines':
+                missed += len(lines)
+            elif kind == 'skipped':
+                missed += int(lines[0])
+        self.queue.put_nowait(('skipped', batch[1], [str(missed)]))
+
+class Watcher(object):
+    """
+    Reads the lines added to one file and hands them to its viewers
+    """
+
+    def __init__(self, abs_path):
+        self.abs_path = abs_path
+        self.viewers = set()
+        self.recent = collections.deque(maxlen=KEEP_LINES)
+        self.f_in = None
+        self.ino = None
+        self.pos = 0
+        self.partial = b''
+        self.task = None
+
+    def event_id(self):
+        """
+        Where the watcher has read up to, so a browser that reconnects
+        can say what it has already seen
+        """
+        return '%x-%d' % (self.ino or 0, self.pos - len(self.partial))
+
+    def open(self, from_start):
+        """
+        Open the file, reading only the last lines already in it unless
+        from_start, when it is a new file after a rotation
+        """
+        if self.f_in is not None:
+            self.f_in.close()
+            self.f_in = None
+        self.partial = b''
+        try:
+            self.f_in = open(self.abs_path, 'rb')
+        except (IOError, OSError):
+            self.ino = None
+            return
+        st = os.fstat(self.f_in.fileno())
+        self.ino = st.st_ino
+        self.pos = 0
+        if not from_start and st.st_size > READ_SIZE:
+            # Enough for KEEP_LINES lines of most logs, less the first
+            # line which is likely to be cut short
+            self.pos = st.st_size - READ_SIZE
+            self.f_in.seek(self.pos)
+            data = self.f_in.read(READ_SIZE)
+            self.pos += len(data)
+            first = data.find(b'\n') + 1
+            self.split(data[first:], publish=False)
+        elif not from_start:
+            self.split(self.read(), publish=False)
+
+    def read(self):
+        data = self.f_in.read(READ_SIZE)
+        self.pos += len(data)
+        return data
+
+    def split(self, data, publish=True):
+        """
+        Keep the complete lines in data, and hand them to the viewers
+        """
+        data = self.partial + data
+        end = data.rfind(b'\n') + 1
+        self.partial = data[end:]
+        if not end:
+            return
+        lines = data[:end].decode('utf-8', 'replace').splitlines()
+        event_id = self.event_id()
+        self.recent.extend([(event_id, line) for line in lines])
+        if publish:
+            self.publish(('lines', event_id, lines))
+
+    def publish(self, batch):
+        for viewer in self.viewers:
+            viewer.offer(batch)
+
+    def poll(self):
+        """
+        Read anything added to the file since the last poll, noticing
+        when it has been rotated or truncated
+        """
+        try:
+            st = os.stat(self.abs_path)
+        except OSError:
+            # Rotated away and not yet replaced
+            return
+        if self.f_in is None or st.st_ino != self.ino:
+            if self.f_in is not None:
+                # Whatever the old file had at the end
+                self.split(self.read())
+            self.open(from_start=True)
+            self.recent.clear()
+            self.publish(('rotated', self.event_id(), []))
+        elif st.st_size < self.pos:
+            self.f_in.seek(0)
+            self.pos = 0
+            self.partial = b''
+            self.recent.clear()
+            self.publish(('truncated', self.event_id(), []))
+        if self.f_in is not None and st.st_size > self.pos:
+            self.split(self.read())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(POLL_SECONDS)
+            self.poll()
+
+    def backlog(self, lines, last_id=None):
+        """
+        The recent lines to send someone who starts watching: the last
+        lines of them, or those after last_id for a browser reconnecting
+        """
+        recent = list(self.recent)
+        if last_id is not None:
+            ids = [event_id for event_id, line in recent]
+            if last_id in ids:
+                found = len(ids) - ids[::-1].index(last_id)
+                return [line for event_id, line in recent[found:]]
+        return [line for event_id, line in recent[-lines:]] if lines > 0 else []
+
+WATCHERS = dict()
+
+def watch(abs_path, viewer):
+    """
+    Add a viewer to the watcher of a file, starting one if need be
+    """
+    watcher = WATCHERS.get(abs_path)
+    if watcher is None:
+        watcher = WATCHERS[abs_path] = Watcher(abs_path)
+        watcher.open(from_start=False)
+        watcher.task = asyncio.ensure_future(watcher.run())
+    watcher.viewers.add(viewer)
+    return watcher
+
+def unwatch(watcher, viewer):
+    """
+    Remove a viewer, stopping the watcher when nobody is left
+    """
+    watcher.viewers.discard(viewer)
+    if not watcher.viewers:
+        watcher.task.cancel()
+        if watcher.f_in is not None:
+            watcher.f_in.close()
+        del WATCHERS[watcher.abs_path]
+
+def event(kind, event_id, lines):
+    """
+    A batch of lines as a server-sent event
+    """
+    text = 'event: %s\nid: %s\n' % (kind, event_id)
+    text += ''.join(['data: %s\n' % line.replace('\r', '') for line in lines] or ['data:\n'])
+    return (text + '\n').encode('utf-8')
+
+def resolve(req_path, base_dir):
+    """
+    The path on disk for a request, or None if it is outside base_dir
+    """
+    base = os.path.realpath(base_dir)
+    abs_path = os.path.realpath(os.path.join(base, req_path))
+    if abs_path != base and not abs_path.startswith(base + os.sep):
+        return None
+    return abs_path
+
+async def reply(writer, status, text):
+    writer.write(('HTTP/1.1 %s\r\nContent-Type: text/plain\r\n'
+                  'Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n%s\n'
+                  % (status, text)).encode('utf-8'))
+    await writer.drain()
+
+async def follow(reader, writer, base_dir):
+    """
+    Answer one connection: GET /follow/<path>[?lines=N]
+    """
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 30)
+        words = request.decode('latin-1').split('\r\n')
+        method, target = words[0].split(' ')[:2]
+        headers = dict([(name.strip().lower(), value.strip()) for name, value in
+                        [line.split(':', 1) for line in words[1:] if ':' in line]])
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            asyncio.TimeoutError, ConnectionError, ValueError):
+        writer.close()
+        return
+    url = urllib.parse.urlsplit(target)
+    query = urllib.parse.parse_qs(url.query)
+    path = urllib.parse.unquote(url.path)
+    abs_path = None
+    if method == 'GET' and path.startswith('/follow/'):
+        abs_path = resolve(path[len('/follow/'):], base_dir)
+    try:
+        if abs_path is None or not os.path.isfile(abs_path):
+            await reply(writer, '404 Not Found', 'No such file')
+            return
+        try:
+            lines = int(query.get('lines', ['50'])[0])
+        except ValueError:
+            await reply(writer, '400 Bad Request', 'lines must be a number')
+            return
+    except ConnectionError:
+        writer.close()
+        return
+
+    viewer = Viewer()
+    watcher = watch(abs_path, viewer)
+    closed = None
+    try:
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\n'
+                     b'Connection: close\r\n\r\n')
+        writer.write(b'retry: 2000\n\n')
+        backlog = watcher.backlog(lines, headers.get('last-event-id'))
+        if backlog:
+            writer.write(event('lines', watcher.event_id(), backlog))
+        await writer.drain()
+        # Browsers send nothing more, so this ends when they go away
+        closed = asyncio.ensure_future(reader.read())
+        while not closed.done():
+            getting = asyncio.ensure_future(viewer.queue.get())
+            await asyncio.wait([getting, closed], timeout=PING_SECONDS,
+                               return_when=asyncio.FIRST_COMPLETED)
+            if getting.done():
+                writer.write(event(*getting.result()))
+            else:
+                getting.cancel()
+                writer.write(b': ping\n\n')
+            # Waits while the connection is behind, so the queue fills up
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        if closed is not None:
+            closed.cancel()
+        unwatch(watcher, viewer)
+        writer.close()
+
+async def serve(host, port, base_dir):
+    server = await asyncio.start_server(
+        lambda reader, writer: follow(reader, writer, base_dir), host, port)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream lines added to files as server-sent events")
+    parser.add_argument("--host", default="0.0.0.0",
+                        help="address to listen on (default all)")
+    parser.add_argument("--port", type=int, default=PORT,
+                        help="port to listen on (default %d)" % PORT)
+    parser.add_argument("--base", default=BASE_DIR,
+                        help="directory whose files can be followed (default %s)" % BASE_DIR)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.base))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,11 @@
-export FLASK_APP=file_browse.py;flask run --host 0.0.0.0
+# gunicorn sends files with sendfile and serves several people at once,
+# so use it if it is installed, otherwise Flask's own server
+# file_follow.py streams the lines added to files for the follow pages
+cd $(dirname $0)
+python3 file_follow.py &
+trap "kill $!" EXIT
+if command -v gunicorn >/dev/null 2>&1; then
+    gunicorn --bind 0.0.0.0:5000 --workers 2 --threads 8 file_browse:app
+else
+    export FLASK_APP=file_browse.py;flask run --host 0.0.0.0 --with-threads
+fi
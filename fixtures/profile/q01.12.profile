@@ -0,0 +1,12 @@
+X100 query profile
+query: select count(*) from lineitem
+session_id: 100
+query_id: 1012
+start_time: 2016-04-26 10:56:24.444
+total_time: 462.756ms
+memory: 8256KB
+
+Aggr(0) time=107.703ms cum=453.682ms tuples=1 calls=1 mem=2048KB [count(*)]
+  XchgUnion(1) time=4.919ms cum=345.979ms tuples=16 calls=1 mem=64KB [4 streams]
+    Aggr(2) time=138.250ms cum=341.060ms tuples=4 calls=1 mem=2048KB [count(*)]
+      MScan(3) time=202.810ms cum=202.810ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 0 columns]
@@ -0,0 +1,12 @@
+X100 query profile
+query: select count(*) from lineitem
+session_id: 103
+query_id: 1003
+start_time: 2016-04-26 10:56:21.111
+total_time: 197.372ms
+memory: 8256KB
+
+Aggr(0) time=47.082ms cum=193.502ms tuples=1 calls=1 mem=2048KB [count(*)]
+  XchgUnion(1) time=3.274ms cum=146.420ms tuples=16 calls=1 mem=64KB [4 streams]
+    Aggr(2) time=39.225ms cum=143.147ms tuples=4 calls=1 mem=2048KB [count(*)]
+      MScan(3) time=103.922ms cum=103.922ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 0 columns]
@@ -0,0 +1,12 @@
+X100 query profile
+query: select count(*) from lineitem
+session_id: 102
+query_id: 1006
+start_time: 2016-04-26 10:56:42.222
+total_time: 283.283ms
+memory: 8256KB
+
+Aggr(0) time=94.770ms cum=277.728ms tuples=1 calls=1 mem=2048KB [count(*)]
+  XchgUnion(1) time=3.926ms cum=182.959ms tuples=16 calls=1 mem=64KB [4 streams]
+    Aggr(2) time=80.812ms cum=179.032ms tuples=4 calls=1 mem=2048KB [count(*)]
+      MScan(3) time=98.220ms cum=98.220ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 0 columns]
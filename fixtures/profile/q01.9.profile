@@ -0,0 +1,12 @@
+X100 query profile
+query: select count(*) from lineitem
+session_id: 101
+query_id: 1009
+start_time: 2016-04-26 10:56:03.333
+total_time: 389.472ms
+memory: 8256KB
+
+Aggr(0) time=114.656ms cum=381.836ms tuples=1 calls=1 mem=2048KB [count(*)]
+  XchgUnion(1) time=3.766ms cum=267.180ms tuples=16 calls=1 mem=64KB [4 streams]
+    Aggr(2) time=112.364ms cum=263.414ms tuples=4 calls=1 mem=2048KB [count(*)]
+      MScan(3) time=151.050ms cum=151.050ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 0 columns]
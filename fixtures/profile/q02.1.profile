@@ -0,0 +1,15 @@
+X100 query profile
+query: select l_returnflag, l_linestatus, sum(l_quantity) as sum_qty from lineitem where l_shipdate <= date '1998-12-01' - interval '90' day group by l_returnflag, l_linestatus order by l_returnflag, l_linestatus
+session_id: 101
+query_id: 1001
+start_time: 2016-04-26 10:56:07.037
+total_time: 165.589ms
+memory: 8640KB
+
+Project(0) time=0.559ms cum=162.342ms tuples=4 calls=1 mem=64KB [l_returnflag, l_linestatus, sum_qty]
+  Sort(1) time=2.452ms cum=161.783ms tuples=4 calls=1 mem=256KB [l_returnflag, l_linestatus]
+    Aggr(2) time=40.904ms cum=159.331ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+      XchgUnion(3) time=2.272ms cum=118.427ms tuples=16 calls=1 mem=64KB [4 streams]
+        Aggr(4) time=33.076ms cum=116.155ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+          Select(5) time=30.324ms cum=83.078ms tuples=5916591 calls=5777 mem=64KB [<=(l_shipdate, date '1998-09-02')]
+            MScan(6) time=52.754ms cum=52.754ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 4 columns]
@@ -0,0 +1,15 @@
+X100 query profile
+query: select l_returnflag, l_linestatus, sum(l_quantity) as sum_qty from lineitem where l_shipdate <= date '1998-12-01' - interval '90' day group by l_returnflag, l_linestatus order by l_returnflag, l_linestatus
+session_id: 102
+query_id: 1010
+start_time: 2016-04-26 10:56:10.370
+total_time: 447.414ms
+memory: 8640KB
+
+Project(0) time=1.122ms cum=438.641ms tuples=4 calls=1 mem=64KB [l_returnflag, l_linestatus, sum_qty]
+  Sort(1) time=4.917ms cum=437.519ms tuples=4 calls=1 mem=256KB [l_returnflag, l_linestatus]
+    Aggr(2) time=101.184ms cum=432.602ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+      XchgUnion(3) time=4.279ms cum=331.418ms tuples=16 calls=1 mem=64KB [4 streams]
+        Aggr(4) time=80.010ms cum=327.138ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+          Select(5) time=68.521ms cum=247.128ms tuples=5916591 calls=5777 mem=64KB [<=(l_shipdate, date '1998-09-02')]
+            MScan(6) time=178.607ms cum=178.607ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 4 columns]
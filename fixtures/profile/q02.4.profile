@@ -0,0 +1,15 @@
+X100 query profile
+query: select l_returnflag, l_linestatus, sum(l_quantity) as sum_qty from lineitem where l_shipdate <= date '1998-12-01' - interval '90' day group by l_returnflag, l_linestatus order by l_returnflag, l_linestatus
+session_id: 100
+query_id: 1004
+start_time: 2016-04-26 10:56:28.148
+total_time: 200.025ms
+memory: 8640KB
+
+Project(0) time=0.555ms cum=196.103ms tuples=4 calls=1 mem=64KB [l_returnflag, l_linestatus, sum_qty]
+  Sort(1) time=3.904ms cum=195.549ms tuples=4 calls=1 mem=256KB [l_returnflag, l_linestatus]
+    Aggr(2) time=50.405ms cum=191.644ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+      XchgUnion(3) time=1.942ms cum=141.239ms tuples=16 calls=1 mem=64KB [4 streams]
+        Aggr(4) time=57.167ms cum=139.297ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+          Select(5) time=26.582ms cum=82.130ms tuples=5916591 calls=5777 mem=64KB [<=(l_shipdate, date '1998-09-02')]
+            MScan(6) time=55.549ms cum=55.549ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 4 columns]
@@ -0,0 +1,15 @@
+X100 query profile
+query: select l_returnflag, l_linestatus, sum(l_quantity) as sum_qty from lineitem where l_shipdate <= date '1998-12-01' - interval '90' day group by l_returnflag, l_linestatus order by l_returnflag, l_linestatus
+session_id: 103
+query_id: 1007
+start_time: 2016-04-26 10:56:49.259
+total_time: 352.093ms
+memory: 8640KB
+
+Project(0) time=1.031ms cum=345.189ms tuples=4 calls=1 mem=64KB [l_returnflag, l_linestatus, sum_qty]
+  Sort(1) time=4.925ms cum=344.158ms tuples=4 calls=1 mem=256KB [l_returnflag, l_linestatus]
+    Aggr(2) time=95.812ms cum=339.233ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+      XchgUnion(3) time=3.946ms cum=243.421ms tuples=16 calls=1 mem=64KB [4 streams]
+        Aggr(4) time=63.984ms cum=239.475ms tuples=4 calls=1 mem=2048KB [l_returnflag, l_linestatus] [sum(l_quantity)]
+          Select(5) time=66.825ms cum=175.491ms tuples=5916591 calls=5777 mem=64KB [<=(l_shipdate, date '1998-09-02')]
+            MScan(6) time=108.666ms cum=108.666ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 4 columns]
@@ -0,0 +1,18 @@
+X100 query profile
+query: select o_orderpriority, count(*) as order_count from orders where o_orderdate >= date '1993-07-01' and o_orderdate < date '1993-07-01' + interval '3' month group by o_orderpriority order by o_orderpriority
+session_id: 103
+query_id: 1011
+start_time: 2016-04-26 10:56:17.407
+total_time: 536.520ms
+memory: 84480KB
+
+Project(0) time=0.905ms cum=526.000ms tuples=4 calls=1 mem=64KB [o_orderpriority, order_count]
+  Sort(1) time=5.116ms cum=525.094ms tuples=4 calls=1 mem=256KB [o_orderpriority]
+    Aggr(2) time=52.648ms cum=519.979ms tuples=4 calls=1 mem=2048KB [o_orderpriority] [count(*)]
+      XchgUnion(3) time=4.302ms cum=467.331ms tuples=16 calls=1 mem=64KB [4 streams]
+        HashJoin01(4) time=147.935ms cum=463.029ms tuples=52523 calls=51 mem=65536KB [o_orderkey = l_orderkey]
+          Select(5) time=32.334ms cum=113.618ms tuples=5916591 calls=5777 mem=64KB [>=(o_orderdate, date '1993-07-01'), <(o_orderdate, date '1993-10-01')]
+            MScan(6) time=81.284ms cum=81.284ms tuples=6001215 calls=5860 mem=4096KB [orders, 3 columns]
+          XchgHashSplit(7) time=44.774ms cum=201.477ms tuples=3793296 calls=3704 mem=8192KB [l_orderkey]
+            Select(8) time=34.191ms cum=156.703ms tuples=5916591 calls=5777 mem=64KB [<(l_commitdate, l_receiptdate)]
+              MScan(9) time=122.512ms cum=122.512ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 3 columns]
@@ -0,0 +1,18 @@
+X100 query profile
+query: select o_orderpriority, count(*) as order_count from orders where o_orderdate >= date '1993-07-01' and o_orderdate < date '1993-07-01' + interval '3' month group by o_orderpriority order by o_orderpriority
+session_id: 102
+query_id: 1002
+start_time: 2016-04-26 10:56:14.074
+total_time: 294.888ms
+memory: 84480KB
+
+Project(0) time=0.504ms cum=289.106ms tuples=4 calls=1 mem=64KB [o_orderpriority, order_count]
+  Sort(1) time=3.669ms cum=288.602ms tuples=4 calls=1 mem=256KB [o_orderpriority]
+    Aggr(2) time=41.506ms cum=284.933ms tuples=4 calls=1 mem=2048KB [o_orderpriority] [count(*)]
+      XchgUnion(3) time=1.608ms cum=243.427ms tuples=16 calls=1 mem=64KB [4 streams]
+        HashJoin01(4) time=67.173ms cum=241.819ms tuples=52523 calls=51 mem=65536KB [o_orderkey = l_orderkey]
+          Select(5) time=17.879ms cum=73.414ms tuples=5916591 calls=5777 mem=64KB [>=(o_orderdate, date '1993-07-01'), <(o_orderdate, date '1993-10-01')]
+            MScan(6) time=55.535ms cum=55.535ms tuples=6001215 calls=5860 mem=4096KB [orders, 3 columns]
+          XchgHashSplit(7) time=34.590ms cum=101.231ms tuples=3793296 calls=3704 mem=8192KB [l_orderkey]
+            Select(8) time=23.007ms cum=66.642ms tuples=5916591 calls=5777 mem=64KB [<(l_commitdate, l_receiptdate)]
+              MScan(9) time=43.634ms cum=43.634ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 3 columns]
@@ -0,0 +1,18 @@
+X100 query profile
+query: select o_orderpriority, count(*) as order_count from orders where o_orderdate >= date '1993-07-01' and o_orderdate < date '1993-07-01' + interval '3' month group by o_orderpriority order by o_orderpriority
+session_id: 101
+query_id: 1005
+start_time: 2016-04-26 10:56:35.185
+total_time: 500.431ms
+memory: 84480KB
+
+Project(0) time=0.986ms cum=490.619ms tuples=4 calls=1 mem=64KB [o_orderpriority, order_count]
+  Sort(1) time=4.425ms cum=489.633ms tuples=4 calls=1 mem=256KB [o_orderpriority]
+    Aggr(2) time=65.177ms cum=485.207ms tuples=4 calls=1 mem=2048KB [o_orderpriority] [count(*)]
+      XchgUnion(3) time=3.525ms cum=420.031ms tuples=16 calls=1 mem=64KB [4 streams]
+        HashJoin01(4) time=134.061ms cum=416.505ms tuples=52523 calls=51 mem=65536KB [o_orderkey = l_orderkey]
+          Select(5) time=30.838ms cum=105.041ms tuples=5916591 calls=5777 mem=64KB [>=(o_orderdate, date '1993-07-01'), <(o_orderdate, date '1993-10-01')]
+            MScan(6) time=74.203ms cum=74.203ms tuples=6001215 calls=5860 mem=4096KB [orders, 3 columns]
+          XchgHashSplit(7) time=48.110ms cum=177.404ms tuples=3793296 calls=3704 mem=8192KB [l_orderkey]
+            Select(8) time=46.449ms cum=129.294ms tuples=5916591 calls=5777 mem=64KB [<(l_commitdate, l_receiptdate)]
+              MScan(9) time=82.844ms cum=82.844ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 3 columns]
@@ -0,0 +1,18 @@
+X100 query profile
+query: select o_orderpriority, count(*) as order_count from orders where o_orderdate >= date '1993-07-01' and o_orderdate < date '1993-07-01' + interval '3' month group by o_orderpriority order by o_orderpriority
+session_id: 100
+query_id: 1008
+start_time: 2016-04-26 10:56:56.296
+total_time: 510.662ms
+memory: 84480KB
+
+Project(0) time=0.830ms cum=500.649ms tuples=4 calls=1 mem=64KB [o_orderpriority, order_count]
+  Sort(1) time=4.029ms cum=499.819ms tuples=4 calls=1 mem=256KB [o_orderpriority]
+    Aggr(2) time=57.807ms cum=495.791ms tuples=4 calls=1 mem=2048KB [o_orderpriority] [count(*)]
+      XchgUnion(3) time=2.914ms cum=437.983ms tuples=16 calls=1 mem=64KB [4 streams]
+        HashJoin01(4) time=138.660ms cum=435.069ms tuples=52523 calls=51 mem=65536KB [o_orderkey = l_orderkey]
+          Select(5) time=39.950ms cum=131.046ms tuples=5916591 calls=5777 mem=64KB [>=(o_orderdate, date '1993-07-01'), <(o_orderdate, date '1993-10-01')]
+            MScan(6) time=91.096ms cum=91.096ms tuples=6001215 calls=5860 mem=4096KB [orders, 3 columns]
+          XchgHashSplit(7) time=36.749ms cum=165.363ms tuples=3793296 calls=3704 mem=8192KB [l_orderkey]
+            Select(8) time=42.244ms cum=128.614ms tuples=5916591 calls=5777 mem=64KB [<(l_commitdate, l_receiptdate)]
+              MScan(9) time=86.370ms cum=86.370ms tuples=6001215 calls=5860 mem=4096KB [lineitem, 3 columns]
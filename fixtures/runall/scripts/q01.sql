@@ -0,0 +1,3 @@
+-- stub: seconds 0.2 jitter 0.05
+select count(*) from lineitem
+\p\g
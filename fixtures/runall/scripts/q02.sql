@@ -0,0 +1,7 @@
+-- stub: seconds 0.5 jitter 0.2
+select l_returnflag, l_linestatus, sum(l_quantity) as sum_qty
+from lineitem
+where l_shipdate <= date '1998-12-01' - interval '90' day
+group by l_returnflag, l_linestatus
+order by l_returnflag, l_linestatus
+\p\g
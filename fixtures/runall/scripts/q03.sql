@@ -0,0 +1,8 @@
+-- stub: seconds 1.0 jitter 0.5
+select o_orderpriority, count(*) as order_count
+from orders
+where o_orderdate >= date '1993-07-01'
+and o_orderdate < date '1993-07-01' + interval '3' month
+group by o_orderpriority
+order by o_orderpriority
+\p\g
@@ -0,0 +1,3 @@
+-- stub: seconds 0.1 errors 1
+select * from missing
+\p\g
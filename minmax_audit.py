@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+ Checks how well sorted the min/max indexes of every column of every
+ table of a database are, in one go, where vector-minmax.sh checks one
+ column of one table a run, and reports the columns that have become
+ less sorted since the last check.
+ The min/max blocks of all the tables are fetched with one x100 query,
+ split by table, column and partition, and the partitions worked out
+ in parallel as minmax_sweep.py does: the overlaps between neighbouring
+ blocks, the share of pairs that do not overlap and how deeply the
+ blocks overlap. Each check is kept as a snapshot, minmax-<database>-
+ <YYYYmmdd-HHMMSS>.json in the snapshot directory, and each column is
+ compared with the latest snapshot that holds it, so a check of only
+ some tables does not hide the others from the next full check.
+
+ Usage: python3 minmax_audit.py [-j jobs] [--owner name] [--tables pattern]
+                                [--snapshots dir] [--threshold points] [-n top]
+                                [--input raw] ... [--types file] <database>
+
+ Output looks like this, the least sorted columns first:
+
+column                                 partitions  overlaps  pairs  sortedpc  max depth
+actian.lineitem.l_partkey                       2       182    358     49.17          9
+actian.orders.o_orderdate                       2        12    142     91.55          4
+actian.lineitem.l_shipdate                      2         6    358     98.33          2
+
+Less sorted than when last checked, by more than 1.00 points:
+column                                  sortedpc   before   change  checked
+actian.orders.o_orderdate                  91.55   100.00    -8.45  2026-10-17 02:00:04
+
+ A column less sorted by more than --threshold points of sortedpc is
+ reported, and then the exit status is 1, so it can be run nightly from
+ cron to catch tables whose order is decaying before joins on them slow
+ down:
+
+ 0 2 * * * python3 ~actian/minmax_audit.py --snapshots ~actian/minmax mydb >> ~actian/minmax.log 2>&1
+
+ --input reads x100_client raw output saved before instead of running
+ the query. The type of each column is found with one query of iicolumns,
+ so character columns are compared as text, as vector-minmax.sh does;
+ with --input, --types gives the saved output of that query. To try it
+ out without a Vector installation, use the samples in fixtures/minmax,
+ the second taken after orders had more rows added out of order:
+
+    python3 minmax_audit.py --snapshots /tmp/minmax --input fixtures/minmax/audit-1.raw \\
+                            --types fixtures/minmax/audit.types test
+    python3 minmax_audit.py --snapshots /tmp/minmax --input fixtures/minmax/audit-2.raw \\
+                            --types fixtures/minmax/audit.types test
+"""
+
+import argparse, concurrent.futures, glob, json, os, re, subprocess, sys, tempfile, time
+
+import minmax_sweep
+
+# The min/max blocks of every column of the tables whose x100 names are
+# like the pattern, as row id|min|max|column|table
+QUERY = """
+HashJoin01 (
+         SysScan('minmax', [ 'table_name', 'column_nr', 'minmax_row', 'minmax_minval', 'minmax_maxval' ] )
+                ,[ table_name, column_nr ] [ minmax_row, minmax_minval, minmax_maxval ]
+        ,HashJoin01 (
+                 SysScan('columns', ['column_name', 'table_id', 'column_offset'])
+                        , [ table_id ] [ column_name, column_offset ]
+                ,Select(
+                         SysScan('tables', ['table_name', 'table_id'])
+                        ,like(table_name, '%s')
+                 )
+                        ,[ table_id ] [ table_name ]
+         )
+                ,[ table_name, column_offset ] [ table_name, column_name ]
+)
+;
+"""
+
+# The type of every column of the tables like the patterns, as
+# owner|table|column|type, so character columns are compared as text
+TYPES_QUERY = """\\silent
+select trim(table_owner) + '|' + trim(table_name) + '|' + trim(column_name) + '|' +
+       trim(column_datatype)
+  from iicolumns
+ where table_owner like '%s'
+   and table_name like '%s'
+\\g
+"""
+
+# An x100 table name: _<owner>S<table>, and @<partition> if partitioned
+X100_TABLE = re.compile(r"^_([^S]*)S(.*?)(?:@(\d+))?$")
+
+# Partitions given to each worker process at a time
+CHUNK = 16
+
+# Points of sortedpc a column must lose to be reported
+THRESHOLD = 1.0
+
+def x100_command(database):
+    """
+    x100_client for the database, found as vector-minmax.sh finds it
+    """
+    data = os.path.join(os.environ.get("II_SYSTEM", ""), "ingres", "data", "vectorwise",
+                        database)
+    lockdir = os.path.join(data, "CBM") if os.path.isdir(os.path.join(data, "CBM")) else data
+    with open(os.path.join(lockdir, "lock")) as f_in:
+        port = f_in.readline().strip()
+    return ["x100_client", "--port", port, "--passfile", os.path.join(data, "authpass"),
+            "-o", "raw"]
+
+def fetch(database, pattern):
+    """
+    Run the query, returning the lines of its output
+    """
+    output = subprocess.run(x100_command(database), input=QUERY % pattern,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True, check=True).stdout
+    return output.splitlines()
+
+def fetch_types(database, owner, tables):
+    """
+    Run the types query with sql, returning the lines of its output
+    """
+    output = subprocess.run(["sql", database], input=TYPES_QUERY % (
+                                owner.replace("'", "''"), tables.replace("'", "''")),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True, check=True).stdout
+    return output.splitlines()
+
+def read_types(lines):
+    """
+    The type of each owner.table.column in the output of the types query,
+    or a file of its lines, with or without the boxes sql draws round them
+    """
+    types = dict()
+    for line in lines:
+        fields = [field.strip() for field in line.strip().strip("│|").split("|")]
+        if len(fields) == 4 and all(fields):
+            types["%s.%s.%s" % tuple(fields[:3])] = fields[3]
+    return types
+
+def split_name(table, column):
+    """
+    owner.table.column and the partition, or None, of an x100 table and
+    column name
+    """
+    found = X100_TABLE.match(table)
+    if found is None:
+        return "%s.%s" % (table, column.lstrip("_")), None
+    return "%s.%s.%s" % (found.group(1), found.group(2), column.lstrip("_")), found.group(3)
+
+def analyse_chunk(chunk):
+    """
+    Work out the partitions in a chunk, in a worker process
+    """
+    return [minmax_sweep.analyse(*blocks, text=text).as_dict() for blocks, text in chunk]
+
+def analyse_all(blocks, types, jobs):
+    """
+    The Analysis of every partition with more than one block, by column
+    and partition. Columns whose type is in types and is a character type
+    are compared as text, as vector-minmax.sh does; the others as numbers
+    if their values all are.
+    """
+    keys = [key for key in blocks if len(blocks[key][0]) > 1]
+    texts = [minmax_sweep.is_text(types.get(split_name(*key)[0], "")) for key in keys]
+    chunks = [[(blocks[key], text) for key, text in zip(keys[i:i + CHUNK], texts[i:i + CHUNK])]
+              for i in range(0, len(keys), CHUNK)]
+    if jobs > 1 and len(chunks) > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            done = list(pool.map(analyse_chunk, chunks))
+    else:
+        done = [analyse_chunk(chunk) for chunk in chunks]
+    columns = dict()
+    for (table, column), found in zip(keys, [found for chunk in done for found in chunk]):
+        name, partition = split_name(table, column)
+        columns.setdefault(name, dict())[partition or ""] = found
+    return columns
+
+def column_totals(partitions):
+    """
+    One Analysis for all the partitions of a column
+    """
+    total = minmax_sweep.Analysis(0, 0, 0, [])
+    for found in partitions.values():
+        total.merge(minmax_sweep.Analysis.from_dict(found))
+    return total
+
+def snapshot_paths(directory, database):
+    """
+    The snapshots of the database kept, oldest first
+    """
+    return sorted(glob.glob(os.path.join(directory, "minmax-%s-*.json" % database)))
+
+def write_snapshot(directory, database, taken, columns):
+    snapshot = {"database": database, "taken": taken, "columns": columns}
+    path = os.path.join(directory, "minmax-%s-%s.json" % (
+        database, time.strftime("%Y%m%d-%H%M%S", time.localtime(taken))))
+    fd, temp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "w") as f_out:
+        json.dump(snapshot, f_out, indent=1, sort_keys=True)
+    os.rename(temp, path)
+    return path
+
+def last_checked(paths, names):
+    """
+    The partitions of each of the columns named as the latest snapshot
+    holding it found them, and when that was taken. A run limited with
+    --owner or --tables holds only some columns, so the others are found
+    in the snapshots before it.
+    """
+    found = dict()
+    for path in reversed(paths):
+        if len(found) == len(names):
+            break
+        with open(path) as f_in:
+            snapshot = json.load(f_in)
+        for name in names:
+            if name not in found and name in snapshot["columns"]:
+                found[name] = (snapshot["columns"][name], snapshot["taken"])
+    return found
+
+def decayed(before, after, threshold):
+    """
+    The columns less sorted after than before by more than threshold
+    points, as (column, sortedpc after, sortedpc before, when before),
+    worst first. before is what last_checked gives.
+    """
+    found = []
+    for name, partitions in after.items():
+        if name not in before:
+            continue
+        now = column_totals(partitions).sortedpc()
+        then = column_totals(before[name][0]).sortedpc()
+        if then - now > threshold:
+            found.append((name, now, then, before[name][1]))
+    return sorted(found, key=lambda entry: entry[1] - entry[2])
+
+def report(columns, top):
+    lines = ["%-38s %10s %9s %6s %9s %10s" % ("column", "partitions", "overlaps", "pairs",
+                                              "sortedpc", "max depth")]
+    totals = [(name, column_totals(partitions), len(partitions))
+              for name, partitions in columns.items()]
+    totals.sort(key=lambda entry: (entry[1].sortedpc(), entry[0]))
+    for name, total, partitions in totals[:top]:
+        lines.append("%-38s %10d %9d %6d %9.2f %10d" % (name, partitions, total.overlaps,
+                                                          total.pairs, total.sortedpc(),
+                                                          total.max_depth))
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the min/max indexes of a whole database")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="processes to work out the partitions in (default one per CPU)")
+    parser.add_argument("--owner", default="%",
+                        help="only the tables of this owner (default all)")
+    parser.add_argument("--tables", default="%",
+                        help="only the tables like this SQL pattern (default all)")
+    parser.add_argument("--snapshots", default=".",
+                        help="where to keep the snapshots (default here)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="points of sortedpc a column must lose to be reported "
+                             "(default %.1f)" % THRESHOLD)
+    parser.add_argument("-n", "--top", type=int, default=20,
+                        help="least sorted columns to show (default 20)")
+    parser.add_argument("--input", action="append", metavar="RAW",
+                        help="read saved x100_client raw output instead of running the "
+                             "query, and can be given more than once")
+    parser.add_argument("--types", metavar="FILE",
+                        help="with --input, saved output of the column types query, "
+                             "owner|table|column|type a line")
+    parser.add_argument("database", help="database to check")
+    args = parser.parse_args(argv)
+
+    taken = time.time()
+    if args.input:
+        lines = []
+        for path in args.input:
+            with open(path) as f_in:
+                lines.extend(f_in.readlines())
+    else:
+        try:
+            lines = fetch(args.database, "_%sS%s" % (args.owner, args.tables))
+        except (OSError, subprocess.CalledProcessError) as e:
+            print("Could not query the min/max indexes of %s: %s" % (args.database, e))
+            return 2
+    blocks = minmax_sweep.read_blocks(lines)
+    types = dict()
+    try:
+        if args.types:
+            with open(args.types) as f_in:
+                types = read_types(f_in)
+        elif not args.input:
+            types = read_types(fetch_types(args.database, args.owner, args.tables))
+    except (OSError, subprocess.CalledProcessError) as e:
+        print("Could not find the column types, so comparing values as numbers where "
+              "they all are: %s" % e)
+
+    # The pattern also matched tables whose names only start with --tables
+    pattern = re.compile("^_%sS%s(@\\d+)?$" % tuple(
+        ".*".join(".".join(re.escape(part) for part in text.split("_"))
+                  for text in sql.split("%")) for sql in (args.owner, args.tables)))
+    for key in [key for key in blocks if not pattern.match(key[0])]:
+        del blocks[key]
+    print("%d min/max blocks in %d column partitions" % (
+        sum(len(rowids) for rowids, mins, maxs in blocks.values()), len(blocks)))
+    if not blocks:
+        return 2
+
+    columns = analyse_all(blocks, types, args.jobs)
+    print("\n".join(report(columns, args.top)))
+
+    if not os.path.isdir(args.snapshots):
+        os.makedirs(args.snapshots)
+    # Read before writing this one, which may replace the last if in the same second
+    before = last_checked(snapshot_paths(args.snapshots, args.database), set(columns))
+    write_snapshot(args.snapshots, args.database, taken, columns)
+    if not before:
+        return 0
+    worse = decayed(before, columns, args.threshold)
+    print("")
+    print("Less sorted than when last checked, by more than %.2f points:" % args.threshold)
+    if not worse:
+        print("none")
+        return 0
+    print("%-38s %9s %8s %8s  %s" % ("column", "sortedpc", "before", "change", "checked"))
+    for name, now, then, when in worse:
+        print("%-38s %9.2f %8.2f %+8.2f  %s" % (name, now, then, now - then, time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(when))))
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+ Works out how well sorted a column's min/max index is from the raw
+ x100_client output of vector-minmax.sh, without loading it into the
+ database.
+ Each line of the output is an index block: its row id, the smallest and
+ largest values in it, the column and the table or partition. The blocks
+ of each partition are put in row id order, and a block whose largest
+ value is more than the smallest of the next block overlaps it. As
+ vector-minmax.sh always has, overlaps counts these, total_index_blocks
+ counts the pairs of neighbouring blocks, one fewer than the blocks, and
+ sortedpc is the share of pairs that do not overlap.
+
+ Usage: python3 minmax_sweep.py [--depth] [--type ctype] [raw x100 output ...]
+
+ Reads standard input if no file is given. --type is the column type
+ copydb gives; character columns are compared as text, as the SQL did,
+ even if their values are all digits. Without it, values are compared
+ as numbers if they all are. Output looks like this:
+
+┌──────────────────────────────┬──────────────────────┬──────────────────────┬────────┐
+│tablename                     │overlaps              │total_index_blocks    │sortedpc│
+├──────────────────────────────┼──────────────────────┼──────────────────────┼────────┤
+│_actianSlineitem@0            │                     0│                   732│  100.00│
+│_actianSlineitem@1            │                    48│                   732│   93.45│
+└──────────────────────────────┴──────────────────────┴──────────────────────┴────────┘
+(2 rows)
+
+ --depth also shows how many blocks a query for one value may have to
+ read: the most blocks any one value falls in, found by sweeping across
+ the block ranges in order, and how many blocks share their range with
+ 1, 2, 3-4, 5-8 ... blocks, themselves included:
+
+tablename                        max depth  blocks sharing with 1, 2, 3-4, 5-8 ... blocks
+_actianSlineitem@0                       1  733
+_actianSlineitem@1                       5  295 230 120 51 37
+
+ Uses NumPy for the sorting if it is installed, which is much faster for
+ tables of many blocks. The sample output in fixtures/minmax can be used
+ to try it out:
+
+    python3 minmax_sweep.py --depth fixtures/minmax/lineitem.raw
+"""
+
+import argparse, bisect, collections, re, sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Column types whose values compare as text, not as numbers, even when
+# they are all digits
+TEXT_TYPES = ["c", "char", "character", "varchar", "nchar", "nvarchar", "text"]
+
+# Widths of the columns of the table, as the sql terminal monitor shows it
+WIDTHS = [30, 22, 22, 8]
+
+def read_blocks(lines):
+    """
+    The index blocks in raw x100 output, row id|min|max|column|table, as
+    lists of row ids, smallest and largest values, by (table, column)
+    """
+    blocks = collections.OrderedDict()
+    for line in lines:
+        fields = [field.strip() for field in line.rstrip("\r\n").split("|")]
+        if len(fields) < 5 or not fields[0].isdigit():
+            continue
+        found = blocks.get((fields[4], fields[3]))
+        if found is None:
+            found = blocks[(fields[4], fields[3])] = ([], [], [])
+        found[0].append(int(fields[0]))
+        found[1].append(fields[1])
+        found[2].append(fields[2])
+    return blocks
+
+def is_text(ctype):
+    """
+    Whether a column of the type copydb gives, such as varchar(20), is
+    compared as text
+    """
+    return ctype.split("(")[0].strip().lower() in TEXT_TYPES
+
+def values(mins, maxs, text=False):
+    """
+    The smallest and largest values of the blocks, as text for a text
+    column, and otherwise as numbers if they all are, so they compare the
+    way the column does
+    """
+    if not text:
+        for kind in int, float:
+            try:
+                return [kind(value) for value in mins], [kind(value) for value in maxs]
+            except ValueError:
+                pass
+    return list(mins), list(maxs)
+
+def bucket(depth):
+    """
+    The histogram bucket of a depth: 0 for 1, 1 for 2, 2 for 3-4, 3 for 5-8 ...
+    """
+    return (depth - 1).bit_length()
+
+class Analysis(object):
+    """
+    How well sorted the blocks of one partition are
+    """
+
+    def __init__(self, overlaps, pairs, max_depth, histogram):
+        self.overlaps = overlaps
+        self.pairs = pairs
+        self.max_depth = max_depth
+        self.histogram = histogram
+
+    def sortedpc(self):
+        """
+        As vector-minmax.sh's SQL works it out, cut to two decimal places
+        """
+        if not self.pairs:
+            return 100.0
+        return 100.0 - int(self.overlaps * 10000 // self.pairs) / 100.0
+
+    def merge(self, other):
+        """
+        Add in another partition of the same column
+        """
+        self.overlaps += other.overlaps
+        self.pairs += other.pairs
+        self.max_depth = max(self.max_depth, other.max_depth)
+        for i, count in enumerate(other.histogram):
+            if i < len(self.histogram):
+                self.histogram[i] += count
+            else:
+                self.histogram.append(count)
+
+    def as_dict(self):
+        return {"overlaps": self.overlaps, "total_index_blocks": self.pairs,
+                "sortedpc": self.sortedpc(), "max_depth": self.max_depth,
+                "depth_histogram": self.histogram}
+
+    @classmethod
+    def from_dict(cls, found):
+        return cls(found["overlaps"], found["total_index_blocks"], found["max_depth"],
+                   list(found["depth_histogram"]))
+
+def analyse(rowids, mins, maxs, text=False):
+    """
+    Count the overlaps between neighbouring blocks, in row id order, and
+    the depth of overlap of the blocks. text compares the values as text.
+    """
+    mins, maxs = values(mins, maxs, text)
+    if numpy is not None:
+        return analyse_arrays(numpy.array(rowids), numpy.array(mins), numpy.array(maxs))
+    order = sorted(range(len(rowids)), key=rowids.__getitem__)
+    overlaps = sum(1 for this, following in zip(order, order[1:])
+                   if maxs[this] > mins[following])
+
+    # Sweep across the starts and ends of the ranges, starts first where
+    # they meet, as a value at the end of one block and the start of the
+    # next is in both
+    events = sorted([(low, 0) for low in mins] + [(high, 1) for high in maxs])
+    depth = max_depth = 0
+    for value, end in events:
+        depth += -1 if end else 1
+        max_depth = max(max_depth, depth)
+
+    # The blocks a block shares its range with are all of them but those
+    # wholly above it and those wholly below it
+    lows = sorted(mins)
+    highs = sorted(maxs)
+    histogram = []
+    for low, high in zip(mins, maxs):
+        shared = len(lows) - (len(lows) - bisect.bisect_right(lows, high)) - \
+                 bisect.bisect_left(highs, low)
+        while len(histogram) <= bucket(shared):
+            histogram.append(0)
+        histogram[bucket(shared)] += 1
+    return Analysis(overlaps, len(rowids) - 1, max_depth, histogram)
+
+def analyse_arrays(rowids, mins, maxs):
+    """
+    analyse, with NumPy
+    """
+    order = numpy.argsort(rowids, kind="stable")
+    overlaps = int(numpy.count_nonzero(maxs[order][:-1] > mins[order][1:]))
+
+    positions = numpy.concatenate([mins, maxs])
+    ends = numpy.concatenate([numpy.zeros(len(mins), numpy.int8),
+                              numpy.ones(len(maxs), numpy.int8)])
+    events = numpy.lexsort((ends, positions))
+    max_depth = int(numpy.cumsum(1 - 2 * ends[events].astype(numpy.int64)).max())
+
+    count = len(mins)
+    shared = count - (count - numpy.searchsorted(numpy.sort(mins), maxs, "right")) - \
+             numpy.searchsorted(numpy.sort(maxs), mins, "left")
+    buckets = numpy.ceil(numpy.log2(shared)).astype(numpy.int64)
+    histogram = [int(n) for n in numpy.bincount(buckets)]
+    return Analysis(overlaps, count - 1, max_depth, histogram)
+
+def partition_order(table):
+    """
+    Sorts partitions by number, so @2 comes before @10
+    """
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)$", table)]
+
+def report(results):
+    """
+    The table of results, as vector-minmax.sh's SQL showed them, from a
+    list of (table, Analysis)
+    """
+    def rule(left, middle, right):
+        return left + middle.join("─" * width for width in WIDTHS) + right
+
+    lines = [rule("┌", "┬", "┐"),
+             "│" + "│".join(name.ljust(width) for name, width in zip(
+                 ["tablename", "overlaps", "total_index_blocks", "sortedpc"], WIDTHS)) + "│",
+             rule("├", "┼", "┤")]
+    for table, analysis in results:
+        lines.append("│%-*s│%*d│%*d│%*.2f│" % (
+            WIDTHS[0], table, WIDTHS[1], analysis.overlaps, WIDTHS[2], analysis.pairs,
+            WIDTHS[3], analysis.sortedpc()))
+    lines += [rule("└", "┴", "┘"), "(%d row%s)" % (len(results), "" if len(results) == 1 else "s")]
+    return lines
+
+def depth_report(results):
+    lines = ["%-32s %9s  %s" % ("tablename", "max depth",
+                                "blocks sharing with 1, 2, 3-4, 5-8 ... blocks")]
+    for table, analysis in results:
+        lines.append("%-32s %9d  %s" % (table, analysis.max_depth,
+                                        " ".join(str(n) for n in analysis.histogram)))
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Work out how well sorted a min/max index is")
+    parser.add_argument("--depth", action="store_true",
+                        help="also show how deeply the blocks overlap")
+    parser.add_argument("--type", metavar="CTYPE",
+                        help="type of the column, as copydb gives it, so that character "
+                             "columns compare as text (default from the values)")
+    parser.add_argument("files", nargs="*", help="raw x100_client output (default stdin)")
+    args = parser.parse_args(argv)
+
+    blocks = collections.OrderedDict()
+    for path in args.files or ["-"]:
+        if path == "-":
+            blocks.update(read_blocks(sys.stdin))
+        else:
+            with open(path) as f_in:
+                blocks.update(read_blocks(f_in))
+    print("MinMax block count returned from x100 query was %d" % sum(
+        len(rowids) for rowids, mins, maxs in blocks.values()))
+    if not blocks:
+        print("No rows returned from x100 query: unable to continue, please fix the problem.")
+        print("This might be because you specified a non-existent table or column name - "
+              "this is not")
+        print("explicitly validated.")
+        return 1
+
+    # A partition of one block has no pairs, so is left out, as it was
+    text = args.type is not None and is_text(args.type)
+    results = [(table, analyse(*blocks[(table, column)], text=text))
+               for table, column in sorted(blocks, key=lambda key: partition_order(key[0]))
+               if len(blocks[(table, column)][0]) > 1]
+    print("\n".join(report(results)))
+    if args.depth:
+        print("")
+        print("\n".join(depth_report(results)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
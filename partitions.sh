@@ -23,6 +23,18 @@
 # Updated May 2016 to change the default to one quarter of the cores in a cluster.
 # Also increased compatibility to also work on Vector systems that have no 'slaves' file.
 
+# Updated to use topology.py, which reads the CPU and NUMA layout of every node from sysfs,
+# leaves out isolated CPUs and plans for the smallest node, so the number is worked out the
+# same way as in the Python tools. Run "python topology.py" to see how it got there.
+# The old calculation is only used if topology.py cannot be run.
+
+PARTITIONS=`python $(dirname $0)/topology.py --partitions 2>/dev/null`
+if [ -n "$PARTITIONS" ]
+then
+        echo $PARTITIONS
+        exit 0
+fi
+
 NODES=`cat $II_SYSTEM/ingres/files/slaves 2>/dev/null || echo one | wc -l`
 CORES=`cat /proc/cpuinfo|grep 'cpu cores'|sort|uniq|cut -d: -f 2`
 CPUS=`cat /proc/cpuinfo|grep 'physical id'|sort|uniq|wc -l`
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+ Turns Vector .profile files into PDFs with x100profgraph, as
+ profile_gen.sh did, but only those that are new or have changed since
+ the last run, several at once.
+ Profiles are looked for in /tmp and in the remote destination, which is
+ HDFS by default. The PDF of a profile in /tmp is written beside it and
+ copied to the destination; the PDF of a profile in the destination is
+ written back there.
+ A manifest in ~/.cache/profile_gen remembers the size, modification
+ time and SHA-1 of every profile rendered, so a profile is read again
+ only when its size or time changes, and rendered again only when its
+ contents have. A profile that x100profgraph fails on is not tried
+ again until it changes.
+ A lock file there too stops a run starting while the last is still
+ going, so it is safe to run from cron every minute, as profile_gen.sh
+ does:
+
+ * * * * * ~actian/profile_gen.sh >> ~actian/profile_gen.log 2>&1
+
+ Usage: python3 profile_gen.py [-j jobs] [--local /tmp] [--remote hdfs:///Actian/tmp]
+                               [--profgraph path] [--cache-dir dir]
+
+ --remote can also be a local directory, standing in for HDFS, or none
+ to leave out the remote copies. To try it out without a Vector
+ installation, use the stand-in x100profgraph in fixtures/profile:
+
+    cp fixtures/profile/*.profile /tmp
+    python3 profile_gen.py --profgraph fixtures/profile/x100profgraph --remote none
+"""
+
+import argparse, concurrent.futures, fcntl, fnmatch, hashlib, json, os, subprocess, sys, \
+       tempfile, time
+
+# Profiles changed more recently than this may still be being written,
+# so are left for the next run
+SETTLE_SECONDS = 5
+
+# Longest x100profgraph may take over one profile
+RENDER_SECONDS = 300
+
+class LocalBackend(object):
+    """
+    Profiles in a directory on this machine. Also stands in for HDFS.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = "file:" + directory
+
+    def list(self, pattern):
+        """
+        The files matching pattern, as (path, size, modification time),
+        or None if the directory could not be listed
+        """
+        found = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return None
+        for entry in entries:
+            if fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+                st = entry.stat()
+                found.append((entry.path, st.st_size, st.st_mtime))
+        return found
+
+    def read(self, path):
+        with open(path, "rb") as f_in:
+            return f_in.read()
+
+    def write(self, path, data):
+        """
+        Replace a file in one go, so nobody sees half a PDF
+        """
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f_out:
+            f_out.write(data)
+        os.chmod(temp, 0o644)
+        os.rename(temp, path)
+
+    def upload(self, local_path):
+        """
+        Copy a file from this machine into the backend
+        """
+        with open(local_path, "rb") as f_in:
+            self.write(os.path.join(self.directory, os.path.basename(local_path)), f_in.read())
+
+class HdfsBackend(object):
+    """
+    Profiles in an HDFS directory, reached with the hadoop command
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = "hdfs:" + directory
+
+    def hadoop(self, *arglist, **kwargs):
+        return subprocess.run(["hadoop", "fs"] + list(arglist), stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, check=True, **kwargs).stdout
+
+    def list(self, pattern):
+        try:
+            output = self.hadoop("-ls", self.directory).decode("utf-8", "replace")
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        found = []
+        for line in output.splitlines():
+            # -rw-r--r--   3 actian supergroup  123456 2016-04-26 10:56 /Actian/tmp/q.profile
+            words = line.split(None, 7)
+            if len(words) < 8 or words[0].startswith("d"):
+                continue
+            path = words[7]
+            if not fnmatch.fnmatch(os.path.basename(path), pattern):
+                continue
+            when = time.mktime(time.strptime(words[5] + " " + words[6], "%Y-%m-%d %H:%M"))
+            found.append((path, int(words[4]), when))
+        return found
+
+    def read(self, path):
+        return self.hadoop("-cat", path)
+
+    def write(self, path, data):
+        self.hadoop("-put", "-f", "-", path, input=data)
+
+    def upload(self, local_path):
+        self.hadoop("-copyFromLocal", "-f", local_path, self.directory)
+
+def backend(where):
+    """
+    The backend for --local or --remote
+    """
+    if where.startswith("hdfs://"):
+        return HdfsBackend("/" + where[len("hdfs://"):].lstrip("/"))
+    return LocalBackend(where)
+
+class Manifest(object):
+    """
+    What was found in each profile rendered, by backend and path
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f_in:
+                self.entries = json.load(f_in)
+        except (IOError, OSError, ValueError):
+            self.entries = dict()
+
+    def unchanged(self, key, size, mtime):
+        """
+        Whether the profile is the same size and age as when it was
+        rendered, so need not even be read
+        """
+        entry = self.entries.get(key)
+        return entry is not None and entry["size"] == size and entry["mtime"] == mtime
+
+    def record(self, key, size, mtime, digest, error=None):
+        self.entries[key] = {"size": size, "mtime": mtime, "sha1": digest, "error": error}
+
+    def forget(self, keys):
+        """
+        Drop the profiles that have gone
+        """
+        for key in set(self.entries) - set(keys):
+            del self.entries[key]
+
+    def save(self):
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, "w") as f_out:
+            json.dump(self.entries, f_out, indent=1, sort_keys=True)
+        os.rename(temp, self.path)
+
+def render(profgraph, source, path, destination, known):
+    """
+    Render one profile, in a worker process: read it from source, run
+    x100profgraph on it, and write the PDF to path in source and copy it
+    to destination if there is one. A profile whose SHA-1 is known, as it
+    has only been touched or copied back unchanged, is not rendered.
+    Returns the SHA-1 of the profile, whether it was rendered, and the
+    error, if x100profgraph failed on it. If x100profgraph could not be
+    run or took too long, raises the error instead, so it is tried again.
+    """
+    data = source.read(path)
+    digest = hashlib.sha1(data).hexdigest()
+    if digest == known:
+        return digest, False, None
+    try:
+        pdf = subprocess.run([profgraph], input=data, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, timeout=RENDER_SECONDS, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        return digest, True, "x100profgraph failed: %s" % e.stderr.decode(
+            "utf-8", "replace").strip()
+    source.write(path + ".pdf", pdf)
+    if destination is not None:
+        destination.upload(path + ".pdf")
+    return digest, True, None
+
+def find_work(manifest, sources, now):
+    """
+    The profiles to render, as (source, destination, path, key, size,
+    mtime), and the keys of every profile found. A source that cannot be
+    listed keeps the profiles recorded for it, rather than looking empty,
+    so they are not all rendered again once it is back.
+    """
+    work = []
+    keys = []
+    for source, destination in sources:
+        found = source.list("*.profile")
+        if found is None:
+            print("%s: cannot list the profiles, leaving them until the next run" % source.name)
+            keys.extend(key for key in manifest.entries if key.startswith(source.name + ":"))
+            continue
+        for path, size, mtime in found:
+            key = "%s:%s" % (source.name, path)
+            keys.append(key)
+            if manifest.unchanged(key, size, mtime) or now - mtime < SETTLE_SECONDS:
+                continue
+            work.append((source, destination, path, key, size, mtime))
+    return work, keys
+
+def run(args):
+    manifest = Manifest(os.path.join(args.cache_dir, "manifest.json"))
+    local = backend(args.local)
+    remote = None if args.remote == "none" else backend(args.remote)
+    sources = [(local, remote)]
+    if remote is not None:
+        sources.append((remote, None))
+    work, keys = find_work(manifest, sources, time.time())
+    rendered = failed = 0
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+        futures = dict()
+        for source, destination, path, key, size, mtime in work:
+            known = manifest.entries.get(key, {}).get("sha1")
+            futures[pool.submit(render, args.profgraph, source, path, destination, known)] = \
+                (key, path, size, mtime)
+        for future in concurrent.futures.as_completed(futures):
+            key, path, size, mtime = futures[future]
+            try:
+                digest, done, error = future.result()
+            except (OSError, subprocess.SubprocessError) as e:
+                # Could not read, render or write it this time, so try again next
+                print("%s: %s" % (path, e))
+                continue
+            if not done:
+                manifest.record(key, size, mtime, digest, manifest.entries[key]["error"])
+                continue
+            manifest.record(key, size, mtime, digest, error)
+            if error:
+                failed += 1
+                print("%s: %s" % (path, error))
+            else:
+                rendered += 1
+                print("%s: rendered" % path)
+    manifest.forget(keys)
+    manifest.save()
+    return rendered, failed
+
+def main(argv=None):
+    ii_system = os.environ.get("II_SYSTEM", "")
+    parser = argparse.ArgumentParser(description="Render new Vector profiles as PDFs")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="profiles to render at once (default one per CPU)")
+    parser.add_argument("--local", default="/tmp",
+                        help="directory of profiles on this machine (default /tmp)")
+    parser.add_argument("--remote", default="hdfs:///Actian/tmp",
+                        help="where to copy the PDFs and find more profiles: hdfs://path, "
+                             "a local directory, or none (default hdfs:///Actian/tmp)")
+    parser.add_argument("--profgraph", default=os.environ.get("PROFGRAPH_PATH", os.path.join(
+                            ii_system, "ingres", "sig", "x100profgraph", "x100profgraph")),
+                        help="x100profgraph to run (default from $II_SYSTEM)")
+    parser.add_argument("--cache-dir", default=os.path.join(
+                            os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                            "profile_gen"),
+                        help="where to keep the manifest and lock")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.cache_dir):
+        os.makedirs(args.cache_dir)
+    with open(os.path.join(args.cache_dir, "lock"), "w") as f_lock:
+        try:
+            fcntl.flock(f_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            print("%s the last run is still going" % time.strftime("%Y-%m-%d %H:%M:%S"))
+            return 0
+        start = time.monotonic()
+        rendered, failed = run(args)
+        if rendered or failed:
+            print("%s rendered %d profiles, %d failed, in %.1f seconds" % (
+                time.strftime("%Y-%m-%d %H:%M:%S"), rendered, failed,
+                time.monotonic() - start))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,18 +22,6 @@ export PROFGRAPH_PATH=$II_SYSTEM/ingres/sig/x100profgraph/x100profgraph
 export PROFILE_DESTINATION="/Actian/tmp"
 
 
-# Just take the default PDF output, into the same folder with a .pdf suffix
-# Don't try to look for only new files, meaning that you can re-use the same profile file name
-# and still have the profile re-generated. Less efficient, but simpler, and profgraph is quick anyway.
-
-for file in `ls /tmp/*.profile`
-do
-	cat $file | $PROFGRAPH_PATH > ${file}.pdf
-	hadoop fs -copyFromLocal ${file}.pdf ${PROFILE_DESTINATION} 
-done
-
-# Need to extract just the path from the 'ls -l' output that hadoop fs -ls produces
-for file in `hadoop fs -ls ${PROFILE_DESTINATION}/*profile | rev | cut -d\  -f1 |rev`
-do
-	hadoop fs -cat $file | $PROFGRAPH_PATH | hadoop fs -put - hdfs://${file}.pdf 
-done
\ No newline at end of file
+# profile_gen.py renders only the profiles that are new or have changed since the
+# last run, several at once, and skips a run if the last one is still going.
+exec python3 $(dirname $0)/profile_gen.py --profgraph ${PROFGRAPH_PATH} --remote hdfs://${PROFILE_DESTINATION}
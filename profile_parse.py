@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+ Reads x100 .profile files, as written by runall.py -g Y and by
+ print_profile for profile_gen.py, and finds where the time of a whole
+ workload goes: which operators and which shapes of query cost the most
+ across hundreds of profiles, rather than one PDF at a time.
+ Each profile is read a line at a time into a tree of operators, each
+ with its own time, the time including its inputs, the tuples it
+ produced, the calls made to it and its memory, kept in arrays rather
+ than an object for each operator.
+ The shape of a query is its tree of operators and the tables it scans,
+ so runs of the same query, or of queries differing only in their
+ constants, have the same shape. Operators are ranked by name and table,
+ and again by their place in each shape, which points at the one to
+ look at.
+
+ Usage: python3 profile_parse.py [-n top] [--json] [-j jobs] <profile, directory or glob> ...
+
+ A directory stands for the profiles in it: *.profile, and the
+ *.profilegraphtext.* files of runall.py. Output looks like this:
+
+12 profiles, 4255.4 ms of operator time
+
+Operator                  count   total ms  share   mean ms  Mtuples/s
+Aggr                         20   1474.542  34.7%    73.727      0.000
+MScan lineitem               12   1286.938  30.2%   107.245     55.958
+
+Operator in shape               count   total ms  share   mean ms  detail
+7542cf063d5d MScan(3)               4    556.002  13.1%   139.000  [lineitem, 0 columns]
+9ae82ef6788e HashJoin01(4)          4    487.829  11.5%   121.957  [o_orderkey = l_orderkey]
+
+Shape        queries   total ms  share   mean ms  example
+9ae82ef6788e       4   1806.373  42.4%   451.593  select o_orderpriority, count(*) as  ...
+7542cf063d5d       4   1306.749  30.7%   326.687  select count(*) from lineitem
+
+ Other Python tools can read profiles themselves:
+    import profile_parse
+    profile = profile_parse.read_profile(path)
+    for op in profile.operators():
+        print(op.depth, op.name, op.time_ms, op.tuples)
+"""
+
+import argparse, collections, concurrent.futures, glob, hashlib, json, os, re, sys
+from array import array
+
+# An operator line: indent, name(id), key=value pairs and a free text detail
+OPERATOR = re.compile(rb"^( *)([A-Za-z_][A-Za-z0-9_]*)\((\d+)\) ((?:[a-z_]+=\S+ ?)*)(.*?)\s*$")
+
+# The same with the usual keys in the usual order and units, which is
+# read without looking at each key in turn
+USUAL = re.compile(rb"^( *)([A-Za-z_][A-Za-z0-9_]*)\((\d+)\) time=([0-9.]+)ms cum=([0-9.]+)ms "
+                   rb"tuples=(\d+) calls=(\d+) mem=(\d+)KB ?(.*?)\s*$")
+
+# A header line before the operators, as key: value
+HEADER = re.compile(rb"^([a-z_]+):\s*(.*?)\s*$")
+
+# Units the times and sizes in a profile come in, in ms and KB
+TIME_UNITS = {"ms": 1.0, "s": 1000.0, "us": 0.001, "ns": 0.000001}
+SIZE_UNITS = {"KB": 1.0, "B": 1.0 / 1024, "MB": 1024.0, "GB": 1024.0 * 1024}
+
+# A number followed by its unit
+QUANTITY = re.compile(r"^([0-9.eE+-]+)([A-Za-z]*)$")
+
+# The columns kept for each operator, and their types
+COLUMNS = [("parent", "i"), ("depth", "i"), ("time_ms", "d"), ("cum_ms", "d"),
+           ("tuples", "q"), ("calls", "q"), ("mem_kb", "d")]
+
+# The key=value names in an operator line for each column
+KEYS = {"time": "time_ms", "cum": "cum_ms", "tuples": "tuples", "calls": "calls",
+        "mem": "mem_kb"}
+
+# Operators whose detail names the table they read
+SCANS = ("MScan", "Scan", "ColumnScan", "TableScan")
+
+Operator = collections.namedtuple(
+    "Operator", ["id", "name", "detail", "parent", "depth", "time_ms", "cum_ms",
+                 "tuples", "calls", "mem_kb"])
+
+def quantity(text, units):
+    """
+    A number with a unit, such as 12.5ms or 2048KB, in the units given
+    """
+    found = QUANTITY.match(text)
+    if found is None:
+        return 0.0
+    number, unit = found.groups()
+    return float(number) * units.get(unit, 1.0)
+
+class Profile(object):
+    """
+    The header and operators of one profile, the operators in the order
+    they appear, which puts each before its inputs
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = dict()
+        self.ids = array("i")
+        self.names = []
+        self.details = []
+        self.columns = dict([(name, array(kind)) for name, kind in COLUMNS])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def operator(self, i):
+        columns = self.columns
+        return Operator(self.ids[i], self.names[i], self.details[i], columns["parent"][i],
+                        columns["depth"][i], columns["time_ms"][i], columns["cum_ms"][i],
+                        columns["tuples"][i], columns["calls"][i], columns["mem_kb"][i])
+
+    def operators(self):
+        for i in range(len(self.ids)):
+            yield self.operator(i)
+
+    def children(self, i):
+        """
+        The positions of the inputs of the operator at position i
+        """
+        parents = self.columns["parent"]
+        return [j for j in range(i + 1, len(self.ids)) if parents[j] == i]
+
+    def total_ms(self):
+        if "total_time" in self.header:
+            return quantity(self.header["total_time"], TIME_UNITS)
+        return sum(self.columns["time_ms"])
+
+    def shape(self):
+        """
+        The tree of operators and tables scanned, as text such as
+        Aggr(XchgUnion(Aggr(MScan[lineitem])))
+        """
+        depths = self.columns["depth"]
+        words = []
+        for i in range(len(self.ids)):
+            if i:
+                if depths[i] > depths[i - 1]:
+                    words.append("(")
+                else:
+                    words.append(")" * (depths[i - 1] - depths[i]) + ",")
+            words.append(self.names[i])
+            if self.names[i] in SCANS:
+                words.append("[%s]" % table(self.details[i]))
+        if self.ids:
+            words.append(")" * depths[len(self.ids) - 1])
+        return "".join(words)
+
+    def shape_id(self):
+        return hashlib.sha1(self.shape().encode("utf-8")).hexdigest()[:12]
+
+def table(detail):
+    """
+    The table named in the detail of a scan, such as [lineitem, 4 columns]
+    """
+    return detail.strip("[]").split(",")[0].split("]")[0].strip()
+
+def read_profile(path):
+    """
+    Read a profile a line at a time
+    """
+    profile = Profile(path)
+    columns = profile.columns
+    # Position of the operator last seen at each depth, the parents of
+    # the operators that follow
+    stack = []
+    names = dict()
+    parents = columns["parent"]
+    depths = columns["depth"]
+    times = columns["time_ms"]
+    cums = columns["cum_ms"]
+    tuples = columns["tuples"]
+    calls = columns["calls"]
+    mems = columns["mem_kb"]
+    with open(path, "rb") as f_in:
+        for line in f_in:
+            usual = USUAL.match(line)
+            if usual is not None:
+                indent, name, number, time_ms, cum_ms, count, called, mem_kb, detail = \
+                    usual.groups()
+                depth = len(indent) >> 1
+                del stack[depth:]
+                parents.append(stack[-1] if stack else -1)
+                depths.append(depth)
+                times.append(float(time_ms))
+                cums.append(float(cum_ms))
+                tuples.append(int(count))
+                calls.append(int(called))
+                mems.append(float(mem_kb))
+                stack.append(len(profile.ids))
+                profile.ids.append(int(number))
+                if name not in names:
+                    names[name] = name.decode("ascii")
+                profile.names.append(names[name])
+                profile.details.append(detail.decode("utf-8", "replace"))
+                continue
+            found = OPERATOR.match(line)
+            if found is None:
+                if not profile.ids:
+                    header = HEADER.match(line)
+                    if header is not None:
+                        profile.header[header.group(1).decode("ascii")] = \
+                            header.group(2).decode("utf-8", "replace")
+                continue
+            indent, name, number, pairs, detail = found.groups()
+            depth = len(indent) // 2
+            del stack[depth:]
+            values = {"time_ms": 0.0, "cum_ms": 0.0, "tuples": 0, "calls": 0, "mem_kb": 0.0}
+            for pair in pairs.decode("ascii", "replace").split():
+                key, equals, value = pair.partition("=")
+                column = KEYS.get(key)
+                try:
+                    if column in ("time_ms", "cum_ms"):
+                        values[column] = quantity(value, TIME_UNITS)
+                    elif column == "mem_kb":
+                        values[column] = quantity(value, SIZE_UNITS)
+                    elif column is not None:
+                        values[column] = int(float(value))
+                except (ValueError, OverflowError):
+                    # Such as tuples=n/a, left as nothing
+                    pass
+            values["parent"] = stack[-1] if stack else -1
+            values["depth"] = depth
+            for column, kind in COLUMNS:
+                columns[column].append(values[column])
+            stack.append(len(profile.ids))
+            profile.ids.append(int(number))
+            profile.names.append(name.decode("ascii"))
+            profile.details.append(detail.decode("utf-8", "replace"))
+    return profile
+
+def profile_paths(names):
+    """
+    The profiles named by files, directories and globs, in order
+    """
+    paths = []
+    for name in names:
+        if os.path.isdir(name):
+            found = glob.glob(os.path.join(name, "*.profile"))
+            found += glob.glob(os.path.join(name, "*.profilegraphtext.*"))
+            paths.extend(sorted(found))
+        elif os.path.exists(name):
+            paths.append(name)
+        else:
+            paths.extend(sorted(glob.glob(name)))
+    return paths
+
+def operator_key(name, detail):
+    """
+    What operators are counted together as: their name, and the table
+    for scans
+    """
+    if name in SCANS:
+        return "%s %s" % (name, table(detail))
+    return name
+
+class Totals(object):
+    """
+    Count, time, tuples and memory of a group of operators or queries
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.tuples = 0
+        self.mem_kb = 0.0
+        self.example = None
+
+    def add(self, time_ms, tuples=0, mem_kb=0.0, example=None):
+        self.count += 1
+        self.time_ms += time_ms
+        self.tuples += tuples
+        self.mem_kb = max(self.mem_kb, mem_kb)
+        if self.example is None:
+            self.example = example
+
+    def merge(self, other):
+        self.count += other.count
+        self.time_ms += other.time_ms
+        self.tuples += other.tuples
+        self.mem_kb = max(self.mem_kb, other.mem_kb)
+        if self.example is None:
+            self.example = other.example
+
+class Workload(object):
+    """
+    The time of every profile read, by operator and by query shape
+    """
+
+    def __init__(self):
+        self.profiles = 0
+        self.time_ms = 0.0
+        self.operators = collections.defaultdict(Totals)
+        self.shapes = collections.defaultdict(Totals)
+        # Each operator of each shape, to point at the one to look at
+        self.placed = collections.defaultdict(Totals)
+
+    def add(self, profile):
+        self.profiles += 1
+        columns = profile.columns
+        shape_id = profile.shape_id()
+        for i in range(len(profile)):
+            key = operator_key(profile.names[i], profile.details[i])
+            self.operators[key].add(columns["time_ms"][i], columns["tuples"][i],
+                                    columns["mem_kb"][i])
+            self.placed["%s %s(%d)" % (shape_id, profile.names[i], profile.ids[i])].add(
+                columns["time_ms"][i], columns["tuples"][i], columns["mem_kb"][i],
+                profile.details[i])
+            self.time_ms += columns["time_ms"][i]
+        self.shapes[shape_id].add(
+            sum(columns["time_ms"]), example=(profile.header.get("query") or profile.shape()))
+
+    def merge(self, other):
+        self.profiles += other.profiles
+        self.time_ms += other.time_ms
+        for mine, theirs in [(self.operators, other.operators), (self.shapes, other.shapes),
+                             (self.placed, other.placed)]:
+            for key, totals in theirs.items():
+                mine[key].merge(totals)
+
+    def ranked(self, groups, top):
+        return sorted(groups.items(), key=lambda item: -item[1].time_ms)[:top]
+
+    def as_dict(self, top):
+        def entries(groups):
+            return [{"key": key, "count": totals.count, "time_ms": totals.time_ms,
+                     "share": totals.time_ms / self.time_ms if self.time_ms else 0.0,
+                     "tuples": totals.tuples, "max_mem_kb": totals.mem_kb,
+                     "example": totals.example}
+                    for key, totals in self.ranked(groups, top)]
+        return {"profiles": self.profiles, "time_ms": self.time_ms,
+                "operators": entries(self.operators), "shapes": entries(self.shapes),
+                "placed": entries(self.placed)}
+
+    def report(self, top):
+        share = lambda totals: totals.time_ms / self.time_ms * 100 if self.time_ms else 0.0
+        lines = ["%d profiles, %.1f ms of operator time" % (self.profiles, self.time_ms), "",
+                 "%-24s %6s %10s %6s %9s %10s" % ("Operator", "count", "total ms", "share",
+                                                  "mean ms", "Mtuples/s")]
+        for key, totals in self.ranked(self.operators, top):
+            rate = totals.tuples / totals.time_ms / 1000 if totals.time_ms else 0.0
+            lines.append("%-24s %6d %10.3f %5.1f%% %9.3f %10.3f" % (
+                key[:24], totals.count, totals.time_ms, share(totals),
+                totals.time_ms / totals.count, rate))
+        lines += ["", "%-30s %6s %10s %6s %9s  %s" % ("Operator in shape", "count",
+                                                      "total ms", "share", "mean ms",
+                                                      "detail")]
+        for key, totals in self.ranked(self.placed, top):
+            lines.append("%-30s %6d %10.3f %5.1f%% %9.3f  %s" % (
+                key[:30], totals.count, totals.time_ms, share(totals),
+                totals.time_ms / totals.count, shorten(totals.example or "")))
+        lines += ["", "%-12s %7s %10s %6s %9s  %s" % ("Shape", "queries", "total ms", "share",
+                                                      "mean ms", "example")]
+        for key, totals in self.ranked(self.shapes, top):
+            lines.append("%-12s %7d %10.3f %5.1f%% %9.3f  %s" % (
+                key, totals.count, totals.time_ms, share(totals),
+                totals.time_ms / totals.count, shorten(totals.example)))
+        return lines
+
+def shorten(text, width=40):
+    text = " ".join(text.split())
+    return text if len(text) <= width else text[:width - 4] + " ..."
+
+def read_workload(paths):
+    """
+    Add up the profiles at paths, in a worker process
+    """
+    workload = Workload()
+    for path in paths:
+        try:
+            workload.add(read_profile(path))
+        except (IOError, OSError, ValueError) as e:
+            # Leave it out, but count the rest
+            sys.stderr.write("%s: %s\n" % (path, e))
+    return workload
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find where the time goes in x100 profiles")
+    parser.add_argument("-n", "--top", type=int, default=20,
+                        help="operators and shapes to show (default 20)")
+    parser.add_argument("--json", action="store_true",
+                        help="write the rankings as JSON")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="processes to read the profiles with (default one per CPU)")
+    parser.add_argument("profiles", nargs="+",
+                        help="profiles, directories of them, or globs")
+    args = parser.parse_args(argv)
+
+    paths = profile_paths(args.profiles)
+    if not paths:
+        parser.error("no profiles found")
+    # Each process reads a share of the profiles and adds them up, and
+    # their totals are merged here
+    jobs = max(1, min(args.jobs or 1, len(paths) // 50))
+    workload = Workload()
+    if jobs == 1:
+        workload = read_workload(paths)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            for found in pool.map(read_workload, [paths[i::jobs] for i in range(jobs)]):
+                workload.merge(found)
+
+    if args.json:
+        json.dump(workload.as_dict(args.top), sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        for line in workload.report(args.top):
+            print(line)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1016 @@
+#!/usr/bin/env python3
+"""
+ Runs a directory of .sql scripts against a database to test its
+ performance, as runall.sh does, keeping up to --maxconcurrent queries
+ running until --numruns have been run. The scripts are run in
+ alphabetical order, starting again from the first when they run out.
+ Each sql process is started directly and waited for by its PID, so a
+ new query starts the moment one finishes, and each query is timed from
+ when it starts to when it ends with the monotonic clock.
+
+ Usage: python3 runall.py -d <database> -s <script directory> -m <max concurrent>
+                          -n <number of runs> [-g Y|N] [-k Y|N] [-p Y|N]
+                          [-i II_SYSTEM] [--sweep levels [--p99-limit seconds]]
+                          [--store directory [--config name=value ...]]
+                          [--rate per-second [--arrivals poisson|constant]
+                           | --trace file [--speed factor]] [--seed n]
+
+ The options mean the same as for runall.sh. Files for each run go in
+ /tmp/runall.py.<pid>.*, as runall.sh's do in /tmp/runall.sh.<pid>.*,
+ and the time taken by each run is added to /tmp/runall.py.<pid>.timings:
+
+run_no  script  started  queued  seconds  errors
+1       q01.sql 2016-04-26 10:56:23.114  0.000000  1.234567  0
+
+ Normally a new query is started whenever one finishes, so a slower
+ server is given less work and never builds up a queue. --rate instead
+ starts queries at a set rate however busy the server is, as users of a
+ dashboard would, with the time between them random (poisson, the
+ default) or fixed (constant). --trace replays the arrivals listed in a
+ file, one per line, as seconds since the first or as a timestamp,
+ optionally followed by the script to run; --speed 2 replays it twice
+ as fast. -m still limits the queries running at once, to protect the
+ machine, and queries that arrive while that many are running wait for
+ a turn. queued is how long each one waited, and seconds how long it
+ then took to run.
+
+ At the end it prints the number of runs of each script, the runs a
+ second, and the percentiles of the time they took, and writes them
+ with the histograms they came from to /tmp/runall.py.<pid>.results.json,
+ or to the file given with --results:
+
+script           runs  errors  per sec      p50      p90      p99    p99.9      max
+q01.sql            10       0    1.795    0.255    0.290    0.337    0.337    0.337
+all                40      10    7.179    0.340    1.133    1.521    1.521    1.521
+
+ --sweep runs the scripts at one number of queries at once after
+ another, instead of -m, to find how many give the most throughput.
+ The levels are given as first:last to double from first until
+ throughput stops growing and then narrow down on where it stopped, as
+ first:last:step to go up by step, or as a list such as 1,2,4,8. Each
+ level runs in windows of --window seconds until the runs a second and
+ the 99th percentile of the last few windows agree, or --level-seconds
+ have gone by. The sweep stops early once throughput has stopped growing
+ or the 99th percentile goes over --p99-limit. The table of levels is
+ printed, with the knee, the fewest queries at once that give nearly
+ the most throughput, marked, and written to /tmp/runall.py.<pid>.sweep.csv
+ or the file given with --sweep-csv:
+
+concurrency   per sec       p50       p99    runs  seconds  stable
+          1     3.210     0.301     1.102     128       40  yes
+          4    10.954     0.343     1.204     438       40  yes  knee
+          8    11.210     0.690     2.310     448       40  yes
+
+ --store adds the timings of the run to a runall_store.py store, with
+ the options it was run with, any --config and --label given, and with
+ --describe the hardware, so it can be compared with other runs later.
+
+ To try it out without a Vector installation, put the stand-in sql in
+ fixtures/runall first on PATH:
+
+    PATH=fixtures/runall:$PATH python3 runall.py -d testdb -m 4 -n 20 -s fixtures/runall/scripts
+"""
+
+import argparse, collections, glob, json, math, os, random, select, signal, subprocess, sys, time
+
+import runall_store
+
+PROG_NAME = os.path.basename(sys.argv[0])
+
+# Files of a run that are its results, so are kept even with -k N
+RESULT_FILES = [".results.json", ".sweep.csv"]
+
+# SQL added to each script to write an x100 profile for it, with -g Y
+PROFGRAPH_ON = """call vectorwise (setconf 'server, profiling, ''true''')
+\\p\\g
+call vectorwise (setconf 'server, profile_file, ''%s''')
+\\p\\g
+"""
+
+PROFGRAPH_OFF = """call vectorwise(setconf 'server, profiling, ''false''')
+\\p\\g
+"""
+
+# The columns of iivwprof_query kept for each run with -p Y
+PROFILE_COLUMNS = [("script_name", "char(20)      not null"),
+                   ("run_no", "integer       not null"),
+                   ("session_id", "integer8      not null"),
+                   ("query_id", "integer8      not null"),
+                   ("start_time", "timestamp(6)  not null"),
+                   ("execution_time", "interval day to second(6)"),
+                   ("mem", "integer8      not null"),
+                   ("mem_tot", "integer8      not null"),
+                   ("mem_vm", "integer8      not null"),
+                   ("mem_tot_vm", "integer8      not null")]
+
+def copy_columns():
+    return ",\n".join(["  %-16s = %s" % (name, "c0nl)" if i == len(PROFILE_COLUMNS) - 1 else "c0tab")
+                       for i, (name, kind) in enumerate(PROFILE_COLUMNS)])
+
+# SQL added to each script to copy out its profile data, with -p Y
+PROFILE_DATA = """declare global temporary table session.maw_iivwprof_query as
+select
+  '%%s' as script_name,
+  '%%d' as run_no,
+  %s
+from
+  iivwprof_query
+where
+  query_text not like '%%%%maw_iivwprof_query%%%%'
+on commit preserve rows with norecovery
+\\p\\g
+copy session.maw_iivwprof_query(
+%s
+into '%%s'\\p\\g
+""" % (",\n  ".join([name for name, kind in PROFILE_COLUMNS[2:]]), copy_columns())
+
+class Run(object):
+    """
+    One run of a script: the files it uses, and its sql process
+    """
+
+    def __init__(self, prefix, run_no, script_name, script_dir):
+        self.run_no = run_no
+        self.script_name = script_name
+        self.script_path = os.path.join(script_dir, script_name)
+        self.sql_path = "%s.%s.%d" % (prefix, script_name, run_no)
+        self.log_path = "%s.%d.log" % (prefix, run_no)
+        self.profgraph_path = "%s.%s.profilegraphtext.%d" % (prefix, script_name, run_no)
+        self.profile_data_path = "%s.%s.profile_data.%d" % (prefix, script_name, run_no)
+        self.process = None
+        self.arrived = None
+        self.started = None
+        self.start = None
+        self.seconds = None
+        self.queued = None
+        self.errors = 0
+
+    def write_sql(self, profgraph, profile_data):
+        """
+        The script to run: a copy of the supplied one, with SQL added
+        around it for the profiles asked for
+        """
+        with open(self.sql_path, "w") as f_out:
+            if profgraph:
+                f_out.write(PROFGRAPH_ON % self.profgraph_path)
+            with open(self.script_path) as f_in:
+                f_out.write(f_in.read())
+            if profgraph:
+                f_out.write(PROFGRAPH_OFF)
+            if profile_data:
+                f_out.write(PROFILE_DATA % (self.script_name, self.run_no,
+                                            self.profile_data_path))
+
+    def launch(self, database):
+        with open(self.sql_path) as f_in, open(self.log_path, "w") as f_log:
+            self.started = time.time()
+            self.start = time.monotonic()
+            if self.arrived is None:
+                self.arrived = self.start
+            self.process = subprocess.Popen(["sql", database], stdin=f_in, stdout=f_log,
+                                            stderr=subprocess.STDOUT)
+
+    def finish(self, status):
+        """
+        Note the time taken once the process has ended, and count the
+        errors it reported
+        """
+        self.seconds = time.monotonic() - self.start
+        self.queued = self.start - self.arrived
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        with open(self.log_path, "rb") as f_in:
+            self.errors = len([line for line in f_in if b"E_" in line])
+
+# Histogram buckets are each this much wider than the last, so
+# percentiles are within 1%, and the first holds everything up to LOWEST
+# seconds. A histogram has a few thousand buckets at most however many
+# times are added to it.
+GROWTH = 1.01
+LOWEST = 1e-6
+
+# The percentiles reported
+PERCENTILES = [50, 90, 99, 99.9]
+
+# A sweep level has settled when the runs a second and the 99th
+# percentile of its last STABLE_WINDOWS windows are within these
+# fractions of their mean
+STABLE_WINDOWS = 3
+STABLE_RATE = 0.05
+STABLE_P99 = 0.15
+
+# Throughput has stopped growing when a level adds less than this
+# fraction to the best so far, and the knee is the first level within it
+# of the best
+PLATEAU = 0.05
+
+class Histogram(object):
+    """
+    Counts of times in buckets of exponentially growing width, which
+    histograms of other scripts or runs can be added to
+    """
+
+    def __init__(self):
+        self.counts = dict()
+        self.count = 0
+        self.total = 0.0
+        self.lowest = None
+        self.highest = None
+
+    def add(self, seconds):
+        index = 0
+        if seconds > LOWEST:
+            index = int(math.ceil(math.log(seconds / LOWEST) / math.log(GROWTH)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.lowest = seconds if self.lowest is None else min(self.lowest, seconds)
+        self.highest = seconds if self.highest is None else max(self.highest, seconds)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in other.lowest, other.highest:
+            if value is not None:
+                self.lowest = value if self.lowest is None else min(self.lowest, value)
+                self.highest = value if self.highest is None else max(self.highest, value)
+
+    def percentile(self, percent):
+        """
+        The time percent of those added took at most, to within 1%
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(percent / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                break
+        return max(self.lowest, min(self.highest, LOWEST * GROWTH ** index))
+
+    def as_dict(self):
+        return {"counts": dict([(str(index), count) for index, count in self.counts.items()]),
+                "count": self.count, "total": self.total,
+                "lowest": self.lowest, "highest": self.highest,
+                "growth": GROWTH, "lowest_bucket": LOWEST}
+
+    @classmethod
+    def from_dict(cls, found):
+        histogram = cls()
+        histogram.counts = dict([(int(index), count) for index, count in found["counts"].items()])
+        histogram.count = found["count"]
+        histogram.total = found["total"]
+        histogram.lowest = found["lowest"]
+        histogram.highest = found["highest"]
+        return histogram
+
+class Results(object):
+    """
+    Histograms of the time taken by the runs of each script and all of
+    them, and of the time they waited to start
+    """
+
+    def __init__(self):
+        self.scripts = dict()
+        self.errors = collections.Counter()
+        self.all = Histogram()
+        self.queued = Histogram()
+        self.first = None
+        self.last = None
+
+    def add(self, run):
+        if run.script_name not in self.scripts:
+            self.scripts[run.script_name] = Histogram()
+        self.scripts[run.script_name].add(run.seconds)
+        self.all.add(run.seconds)
+        self.queued.add(run.queued)
+        if run.errors:
+            self.errors[run.script_name] += 1
+        end = run.start + run.seconds
+        self.first = run.arrived if self.first is None else min(self.first, run.arrived)
+        self.last = end if self.last is None else max(self.last, end)
+
+    def elapsed(self):
+        return self.last - self.first if self.count() else 0.0
+
+    def count(self):
+        return self.all.count
+
+    def summary(self, histogram, errors):
+        elapsed = self.elapsed()
+        found = {"runs": histogram.count, "errors": errors,
+                 "per_second": histogram.count / elapsed if elapsed else None,
+                 "mean": histogram.total / histogram.count if histogram.count else None,
+                 "max": histogram.highest,
+                 "histogram": histogram.as_dict()}
+        for percent in PERCENTILES:
+            found["p%g" % percent] = histogram.percentile(percent)
+        return found
+
+    def as_dict(self):
+        return {"elapsed": self.elapsed(),
+                "scripts": dict([(name, self.summary(histogram, self.errors[name]))
+                                 for name, histogram in self.scripts.items()]),
+                "all": self.summary(self.all, sum(self.errors.values())),
+                "queued": self.summary(self.queued, 0)}
+
+    def report(self, queued=False):
+        """
+        A table of the runs a second and percentiles of each script, and
+        of the waits to start if queued
+        """
+        def row(name, found):
+            values = [found["per_second"]] + [found["p%g" % percent] for percent in PERCENTILES]
+            values.append(found["max"])
+            return "%-14s %6d %7d %s" % (name, found["runs"], found["errors"], " ".join(
+                ["%8s" % ("-" if value is None else "%.3f" % value) for value in values]))
+
+        found = self.as_dict()
+        lines = ["%-14s %6s %7s %s" % ("script", "runs", "errors", " ".join(
+            ["%8s" % heading for heading in
+             ["per sec"] + ["p%g" % percent for percent in PERCENTILES] + ["max"]]))]
+        for name in sorted(found["scripts"]):
+            lines.append(row(name, found["scripts"][name]))
+        lines.append(row("all", found["all"]))
+        if queued:
+            lines.append(row("waited", found["queued"]))
+        return lines
+
+def spread(values):
+    """
+    How far apart values are, as a fraction of their mean
+    """
+    mean = sum(values) / len(values)
+    if not mean:
+        return 0.0 if max(values) == min(values) else float("inf")
+    return (max(values) - min(values)) / mean
+
+class Level(object):
+    """
+    One level of a sweep: the runs of each window of it, and the time
+    each window took
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.windows = []
+        self.runs = 0
+        self.seconds = 0.0
+        self.stable = False
+
+    def add_window(self, histogram, seconds):
+        self.windows.append((histogram, seconds))
+        self.runs += histogram.count
+        self.seconds += seconds
+        last = self.windows[-STABLE_WINDOWS:]
+        if len(last) == STABLE_WINDOWS:
+            rates = [found.count / taken for found, taken in last]
+            p99s = [found.percentile(99) or 0.0 for found, taken in last]
+            self.stable = spread(rates) <= STABLE_RATE and spread(p99s) <= STABLE_P99
+        return self.stable
+
+    def settled(self):
+        """
+        The runs of the last windows, which the level is measured by
+        """
+        histogram = Histogram()
+        seconds = 0.0
+        for found, taken in self.windows[-STABLE_WINDOWS:]:
+            histogram.merge(found)
+            seconds += taken
+        return histogram, seconds
+
+    def per_second(self):
+        histogram, seconds = self.settled()
+        return histogram.count / seconds if seconds else 0.0
+
+    def percentile(self, percent):
+        return self.settled()[0].percentile(percent)
+
+def sweep_levels(text):
+    """
+    The levels of a sweep given as first:last, first:last:step or a
+    list. Returns the levels, and whether to search between first and
+    last rather than try them all.
+    """
+    if ":" in text:
+        words = [int(word) for word in text.split(":")]
+        if len(words) == 2:
+            return words, True
+        first, last, step = words
+        return list(range(first, last + 1, step)), False
+    return [int(word) for word in text.split(",") if word], False
+
+class Pool(object):
+    """
+    The sql processes running, by PID.
+    SIGCHLD wakes up a pipe when one ends, so the pool can wait for a
+    process to end and for the time of the next arrival at once.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.running = dict()
+        self.wakeup, wakeup_out = os.pipe()
+        os.set_blocking(self.wakeup, False)
+        os.set_blocking(wakeup_out, False)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.set_wakeup_fd(wakeup_out)
+
+    def __len__(self):
+        return len(self.running)
+
+    def start(self, run):
+        run.launch(self.database)
+        self.running[run.process.pid] = run
+
+    def wait(self, timeout=None):
+        """
+        Wait for any of the processes to end, and return its run, or
+        None if none has ended within timeout seconds
+        """
+        if timeout is None and not self.running:
+            return None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            run = self.running.pop(pid, None)
+            if run is not None:
+                run.finish(status)
+                return run
+            if pid:
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            select.select([self.wakeup], [], [], remaining)
+            try:
+                while os.read(self.wakeup, 512):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def stop(self):
+        """
+        Stop the processes still running, as when interrupted
+        """
+        for run in self.running.values():
+            try:
+                run.process.terminate()
+            except OSError:
+                pass
+        while self.running:
+            self.wait()
+
+class Runner(object):
+    """
+    Runs the scripts, writing the log and timings as it goes
+    """
+
+    def __init__(self, args, pid):
+        self.args = args
+        self.prefix = "/tmp/%s.%d" % (PROG_NAME, pid)
+        self.table = "runall_%d_prof_query" % pid
+        self.log = open(self.prefix + ".log", "a")
+        self.timings = open(self.prefix + ".timings", "w")
+        self.timings.write("run_no\tscript\tstarted\tqueued\tseconds\terrors\n")
+        self.error_path = self.prefix + ".script_error"
+        self.profile_data_path = self.prefix + ".profile_data"
+        self.errors = 0
+        self.runs = 0
+        self.results = Results()
+        self.started = 0
+        self.levels = []
+        self.scripts = []
+
+    def message(self, text):
+        line = "%s %s" % (time.strftime("%d/%m/%Y %H:%M:%S"), text)
+        self.log.write(line + "\n")
+        self.log.flush()
+        print(line)
+        sys.stdout.flush()
+
+    def get_script_list(self):
+        self.message("Getting a list of SQL scripts from %s" % self.args.scriptdir)
+        self.scripts = sorted([os.path.basename(path) for path in
+                               glob.glob(os.path.join(self.args.scriptdir, "*.sql"))])
+        self.message("Number of SQL scripts found: %d" % len(self.scripts))
+        for script_idx, script_name in enumerate(self.scripts, 1):
+            self.message("Script %d : %s" % (script_idx, script_name))
+
+    def next_run(self, run_no, script_name=None):
+        """
+        The next run, taking the scripts in turn unless one is given
+        """
+        if script_name is None:
+            script_name = self.scripts[(run_no - 1) % len(self.scripts)]
+        run = Run(self.prefix, run_no, script_name, self.args.scriptdir)
+        run.write_sql(self.args.profgraph == "Y", self.args.profiledata == "Y")
+        return run
+
+    def finished(self, run):
+        """
+        Record a run that has ended
+        """
+        self.timings.write("%d\t%s\t%s.%03d\t%.6f\t%.6f\t%d\n" % (
+            run.run_no, run.script_name,
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run.started)),
+            int(run.started * 1000) % 1000, run.queued, run.seconds, run.errors))
+        self.timings.flush()
+        self.runs += 1
+        self.results.add(run)
+        self.message("Finished Run No: %d - %s in %.3f seconds" % (
+            run.run_no, run.script_name, run.seconds))
+        if self.args.profiledata == "Y" and os.path.exists(run.profile_data_path):
+            with open(run.profile_data_path) as f_in, \
+                 open(self.profile_data_path, "a") as f_out:
+                f_out.write(f_in.read())
+        if run.errors:
+            with open(self.error_path, "a") as f_out:
+                f_out.write("Run No %d has reported %d errors\n" % (run.run_no, run.errors))
+            self.errors += 1
+            self.message("========================================")
+            self.message("NOTE: Errors are being reported %d!!!!!" % self.errors)
+            self.message("========================================")
+
+    def run_all(self):
+        self.message("Starting to run all scripts")
+        pool = Pool(self.args.database)
+        try:
+            run_no = 0
+            while run_no < self.args.numruns:
+                if len(pool) >= self.args.maxconcurrent:
+                    self.message("Number of scripts running has reached the max concurrent "
+                                 "allowed of %d" % self.args.maxconcurrent)
+                    self.finished(pool.wait())
+                    continue
+                self.message("Number of scripts running: %d of %d" % (
+                    len(pool), self.args.maxconcurrent))
+                run_no += 1
+                run = self.next_run(run_no)
+                self.message("Starting to run Script No: %d - %s as Run No: %d" % (
+                    self.scripts.index(run.script_name) + 1, run.script_name, run_no))
+                pool.start(run)
+            self.message("Waiting until all remaining scripts have finished running")
+            while len(pool):
+                self.finished(pool.wait())
+        except KeyboardInterrupt:
+            self.message("Interrupted, stopping the %d scripts running" % len(pool))
+            pool.stop()
+            raise
+        except OSError:
+            # Could not start a script, so stop the others too
+            pool.stop()
+            raise
+
+    def start_next(self, pool):
+        self.started += 1
+        pool.start(self.next_run(self.started))
+
+    def run_level(self, pool, concurrency):
+        """
+        Keep concurrency queries running until the level has settled, or
+        for --level-seconds at most, then let those running finish
+        """
+        level = Level(concurrency)
+        self.message("Running %d at once" % concurrency)
+        start = window_start = time.monotonic()
+        histogram = Histogram()
+        while True:
+            while len(pool) < concurrency:
+                self.start_next(pool)
+            now = time.monotonic()
+            window_end = window_start + self.args.window
+            over = now - start >= self.args.level_seconds
+            # Each window has at least one run per query running at once,
+            # so windows of long queries still measure something
+            if now >= window_end and (histogram.count >= concurrency or over):
+                if level.add_window(histogram, now - window_start) or over:
+                    break
+                histogram = Histogram()
+                window_start = now
+                continue
+            run = pool.wait(window_end - now if now < window_end else None)
+            if run is not None:
+                self.finished(run)
+                histogram.add(run.seconds)
+        while len(pool):
+            self.finished(pool.wait())
+        self.message("Running %d at once: %.3f a second, p99 %.3f seconds, %s after %d "
+                     "seconds" % (concurrency, level.per_second(), level.percentile(99) or 0,
+                                  "stable" if level.stable else "not stable", level.seconds))
+        return level
+
+    def run_sweep(self, levels, search):
+        """
+        Run each level in turn, or search between the first and last for
+        the knee, stopping once throughput stops growing or the 99th
+        percentile goes over the limit
+        """
+        self.message("Starting a sweep of %s" % self.args.sweep)
+        pool = Pool(self.args.database)
+        done = dict()
+        limit = self.args.p99_limit
+
+        def measure(concurrency):
+            done[concurrency] = self.run_level(pool, concurrency)
+            return done[concurrency]
+
+        def over_limit(level):
+            return limit is not None and (level.percentile(99) or 0) > limit
+
+        def grew(level, than):
+            return level.per_second() > than.per_second() * (1 + PLATEAU)
+
+        try:
+            if search:
+                first, last = levels
+                best = measure(first)
+                concurrency = first
+                while concurrency < last and not over_limit(best):
+                    concurrency = min(concurrency * 2, last)
+                    level = measure(concurrency)
+                    if over_limit(level) or not grew(level, best):
+                        # The knee is between best and here, so halve the gap
+                        low, high = best.concurrency, concurrency
+                        while high - low > max(1, low // 8):
+                            middle = (low + high) // 2
+                            level = measure(middle)
+                            if not over_limit(level) and grew(level, done[low]):
+                                low = middle
+                            else:
+                                high = middle
+                        break
+                    best = level
+            else:
+                best = None
+                flat = 0
+                for concurrency in levels:
+                    level = measure(concurrency)
+                    if over_limit(level):
+                        break
+                    if best is not None and not grew(level, best):
+                        flat += 1
+                        if flat == 2:
+                            break
+                    else:
+                        flat = 0
+                    if best is None or level.per_second() > best.per_second():
+                        best = level
+        except KeyboardInterrupt:
+            self.message("Interrupted, stopping the %d scripts running" % len(pool))
+            pool.stop()
+            raise
+        except OSError:
+            # Could not start a script, so stop the others too
+            pool.stop()
+            raise
+        self.levels = [done[concurrency] for concurrency in sorted(done)]
+        if limit is not None and self.levels and over_limit(self.levels[-1]):
+            self.message("The 99th percentile went over %.3f seconds" % limit)
+
+    def knee(self):
+        """
+        The fewest queries at once within PLATEAU of the most throughput,
+        not counting levels over the 99th percentile limit
+        """
+        limit = self.args.p99_limit
+        levels = [level for level in self.levels
+                  if limit is None or (level.percentile(99) or 0) <= limit]
+        if not levels:
+            return None
+        most = max([level.per_second() for level in levels])
+        for level in levels:
+            if level.per_second() >= most * (1 - PLATEAU):
+                return level.concurrency
+
+    def write_sweep(self, path):
+        """
+        Print the table of levels, and write it to path as CSV
+        """
+        knee = self.knee()
+        self.message("%11s %9s %9s %9s %7s %8s  %s" % (
+            "concurrency", "per sec", "p50", "p99", "runs", "seconds", "stable"))
+        with open(path, "w") as f_out:
+            f_out.write("concurrency,per_second,p50,p99,runs,seconds,stable,knee\n")
+            for level in self.levels:
+                p50 = level.percentile(50) or 0.0
+                p99 = level.percentile(99) or 0.0
+                self.message("%11d %9.3f %9.3f %9.3f %7d %8d  %s%s" % (
+                    level.concurrency, level.per_second(), p50, p99, level.runs,
+                    level.seconds, "yes" if level.stable else "no",
+                    "  knee" if level.concurrency == knee else ""))
+                f_out.write("%d,%.6f,%.6f,%.6f,%d,%.3f,%d,%d\n" % (
+                    level.concurrency, level.per_second(), p50, p99, level.runs,
+                    level.seconds, level.stable, level.concurrency == knee))
+
+    def run_open(self, arrivals):
+        """
+        Start each run when it arrives, rather than when another ends,
+        queueing those that arrive while -m are running
+        """
+        limit = self.args.maxconcurrent
+        self.message("Starting to run scripts as they arrive, at most %d at once" % limit)
+        pool = Pool(self.args.database)
+        waiting = collections.deque()
+        longest_queue = 0
+        total_queued = 0.0
+        run_no = 0
+        first = time.monotonic()
+        arrivals = iter(arrivals)
+        arrival = next(arrivals, None)
+        try:
+            while arrival is not None or waiting or len(pool):
+                now = time.monotonic()
+                while arrival is not None and first + arrival[0] <= now:
+                    run_no += 1
+                    run = self.next_run(run_no, arrival[1])
+                    # When it was due, so time lost by this loop counts as queueing
+                    run.arrived = first + arrival[0]
+                    waiting.append(run)
+                    arrival = next(arrivals, None)
+                while waiting and len(pool) < limit:
+                    run = waiting.popleft()
+                    self.message("Starting to run %s as Run No: %d, %d running" % (
+                        run.script_name, run.run_no, len(pool) + 1))
+                    pool.start(run)
+                if len(waiting) > longest_queue:
+                    if not longest_queue:
+                        self.message("Queries are waiting, %d are running" % len(pool))
+                    longest_queue = len(waiting)
+                timeout = None
+                if arrival is not None:
+                    timeout = max(0, first + arrival[0] - time.monotonic())
+                run = pool.wait(timeout)
+                if run is not None:
+                    self.finished(run)
+                    total_queued += run.queued
+        except KeyboardInterrupt:
+            self.message("Interrupted, stopping the %d scripts running and %d waiting" % (
+                len(pool), len(waiting)))
+            pool.stop()
+            raise
+        except OSError:
+            pool.stop()
+            raise
+        elapsed = time.monotonic() - first
+        if self.runs:
+            self.message("%d runs in %.1f seconds, %.2f a second, waited %.3f seconds on "
+                         "average, at most %d waiting" % (
+                             self.runs, elapsed, self.runs / elapsed,
+                             total_queued / self.runs, longest_queue))
+
+    def write_load_profile_data(self):
+        """
+        SQL to load the profile data of every run into a table of its own
+        """
+        with open(self.prefix + ".load_profile_data.sql", "w") as f_out:
+            f_out.write("create table %s (\n" % self.table)
+            f_out.write(",\n".join(["  %-19s %s" % column for column in PROFILE_COLUMNS]))
+            f_out.write(") \\p\\g\n")
+            f_out.write("copy %s (\n%s\nfrom '%s'      \\p\\g\n" % (
+                self.table, copy_columns(), self.profile_data_path))
+
+    def write_results(self, path):
+        """
+        Print the percentiles, and write them and the histograms to path
+        """
+        for line in self.results.report(queued=self.args.rate is not None or self.args.trace):
+            self.message(line)
+        found = self.results.as_dict()
+        found.update({"database": self.args.database, "scriptdir": self.args.scriptdir,
+                      "maxconcurrent": self.args.maxconcurrent, "rate": self.args.rate,
+                      "arrivals": self.args.arrivals if self.args.rate else None,
+                      "trace": self.args.trace})
+        with open(path, "w") as f_out:
+            json.dump(found, f_out, indent=1, sort_keys=True)
+            f_out.write("\n")
+        return found
+
+    def store(self, directory, results):
+        """
+        Add the timings of this run to a runall_store.py store
+        """
+        self.timings.flush()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        number = runall_store.add_timings(
+            runall_store.Store(directory), self.prefix + ".timings", args=self.args,
+            results=results, config=runall_store.config_pairs(self.args.config),
+            label=self.args.label, describe=self.args.describe)
+        self.message("Stored as run %d in %s" % (number, directory))
+
+    def tidy_up(self):
+        """
+        Remove the files of this run, unless asked to keep them
+        """
+        self.log.close()
+        self.timings.close()
+        if self.args.keeplog == "N":
+            for path in glob.glob(self.prefix + ".*"):
+                if not any(path.endswith(suffix) for suffix in RESULT_FILES):
+                    os.remove(path)
+
+def poisson_arrivals(rate, count, rng):
+    """
+    Times of count arrivals at rate a second on average, each
+    independent of the last
+    """
+    when = 0.0
+    for i in range(count):
+        yield when, None
+        when += rng.expovariate(rate)
+
+def constant_arrivals(rate, count):
+    for i in range(count):
+        yield i / rate, None
+
+def parse_arrival(text):
+    """
+    Seconds from a line of a trace, either a number or a timestamp
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    date, dot, fraction = text.partition(".")
+    when = time.mktime(time.strptime(date, "%Y-%m-%d %H:%M:%S"))
+    return when + (float("0." + fraction) if fraction else 0.0)
+
+def trace_arrivals(path, speed, count, scripts):
+    """
+    Arrivals replayed from a trace, in seconds since its first, sped up
+    by speed
+    """
+    first = None
+    found = 0
+    with open(path) as f_in:
+        for line in f_in:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            words = line.rsplit(None, 1)
+            script_name = None
+            if len(words) == 2 and words[1].endswith(".sql"):
+                line, script_name = words
+                if script_name not in scripts:
+                    raise ValueError("%s is not in the script directory" % script_name)
+            when = parse_arrival(line.strip().replace("T", " "))
+            if first is None:
+                first = when
+            yield (when - first) / speed, script_name
+            found += 1
+            if count and found >= count:
+                break
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run SQL scripts against a database, "
+                                                 "a number at a time")
+    parser.add_argument("-d", "--database", required=True, help="database name")
+    parser.add_argument("-g", "--profgraph", choices=["Y", "N"], default="N",
+                        help="Y to create x100 profile graphs")
+    parser.add_argument("-i", "--iisystem", default=os.environ.get("II_SYSTEM"),
+                        help="II_SYSTEM (default from the environment)")
+    parser.add_argument("-k", "--keeplog", choices=["Y", "N"], default="N",
+                        help="Y to keep the files in /tmp")
+    parser.add_argument("-m", "--maxconcurrent", type=int,
+                        help="most queries to run at once")
+    parser.add_argument("-n", "--numruns", type=int,
+                        help="number of runs (with --trace, default all of it)")
+    parser.add_argument("-p", "--profiledata", choices=["Y", "N"], default="N",
+                        help="Y to save profile data from the system catalogs")
+    parser.add_argument("-s", "--scriptdir", required=True,
+                        help="directory of .sql scripts")
+    parser.add_argument("--rate", type=float,
+                        help="start queries at this many a second, however many are running")
+    parser.add_argument("--arrivals", choices=["poisson", "constant"], default="poisson",
+                        help="time between queries with --rate (default poisson)")
+    parser.add_argument("--trace",
+                        help="start queries at the times listed in this file")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay --trace this many times as fast (default 1)")
+    parser.add_argument("--seed", type=int,
+                        help="seed for the random times between queries")
+    parser.add_argument("--sweep",
+                        help="numbers of queries at once to try instead of -m: "
+                             "first:last to search, first:last:step or a list")
+    parser.add_argument("--p99-limit", type=float,
+                        help="stop the sweep when the 99th percentile goes over this "
+                             "many seconds")
+    parser.add_argument("--window", type=float, default=10.0,
+                        help="seconds in each window of a sweep level (default 10)")
+    parser.add_argument("--level-seconds", type=float, default=300.0,
+                        help="most seconds to run a sweep level for (default 300)")
+    parser.add_argument("--sweep-csv",
+                        help="file to write the sweep table to "
+                             "(default /tmp/%s.<pid>.sweep.csv)" % PROG_NAME)
+    parser.add_argument("--store",
+                        help="add the timings to the runall_store.py store in this directory")
+    parser.add_argument("--config", action="append", metavar="NAME=VALUE",
+                        help="with --store, something about how the run was set up, "
+                             "such as vector=6.0")
+    parser.add_argument("--label", help="with --store, a note about the run")
+    parser.add_argument("--describe", action="store_true",
+                        help="with --store, record the hardware as describe.py finds it")
+    parser.add_argument("--results",
+                        help="file to write the percentiles and histograms to as JSON "
+                             "(default /tmp/%s.<pid>.results.json)" % PROG_NAME)
+    args = parser.parse_args(argv)
+    if args.sweep:
+        if args.rate is not None or args.trace:
+            parser.error("--sweep keeps a number of queries running, so cannot have "
+                         "--rate or --trace")
+        try:
+            levels, search = sweep_levels(args.sweep)
+        except ValueError:
+            parser.error("--sweep takes first:last, first:last:step or a list of numbers")
+        if not levels or min(levels) < 1 or (search and levels[0] > levels[1]):
+            parser.error("--sweep needs numbers of at least 1, going up")
+        args.numruns = 0
+        args.maxconcurrent = max(levels)
+    elif args.maxconcurrent is None:
+        parser.error("the max concurrent is required")
+    if args.maxconcurrent < 1:
+        parser.error("--maxconcurrent must be at least 1")
+    try:
+        runall_store.config_pairs(args.config)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.rate is not None and args.trace:
+        parser.error("give either --rate or --trace")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be more than 0")
+    if args.speed <= 0:
+        parser.error("--speed must be more than 0")
+    if args.numruns is None and not args.trace:
+        parser.error("the number of runs is required")
+    return args
+
+def set_environment(iisystem):
+    if not iisystem:
+        return
+    ingres = os.path.join(iisystem, "ingres")
+    os.environ["II_SYSTEM"] = iisystem
+    os.environ["PATH"] = "%s/bin:%s/utility:%s" % (ingres, ingres, os.environ.get("PATH", ""))
+    libs = "/usr/local/lib:%s/lib:%s/lib/lp32" % (ingres, ingres)
+    if os.environ.get("LD_LIBRARY_PATH"):
+        os.environ["LD_LIBRARY_PATH"] = libs + ":" + os.environ["LD_LIBRARY_PATH"]
+    else:
+        os.environ["LD_LIBRARY_PATH"] = "/lib:/usr/lib:" + libs
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_environment(args.iisystem)
+    runner = Runner(args, os.getpid())
+    runner.get_script_list()
+    if not runner.scripts:
+        runner.message("CRITICAL no .sql scripts in %s" % args.scriptdir)
+        runner.tidy_up()
+        return 1
+    if args.trace:
+        # All of it, so a bad line stops the run before any query starts
+        try:
+            trace = list(trace_arrivals(args.trace, args.speed, args.numruns, runner.scripts))
+        except (IOError, OSError, ValueError) as e:
+            runner.message("CRITICAL cannot read the trace: %s" % e)
+            runner.tidy_up()
+            return 1
+    # Stop cleanly on kill as well as ^C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if args.sweep:
+            runner.run_sweep(*sweep_levels(args.sweep))
+        elif args.trace:
+            runner.run_open(trace)
+        elif args.rate is not None and args.arrivals == "constant":
+            runner.run_open(constant_arrivals(args.rate, args.numruns))
+        elif args.rate is not None:
+            runner.run_open(poisson_arrivals(args.rate, args.numruns,
+                                             random.Random(args.seed)))
+        else:
+            runner.run_all()
+    except KeyboardInterrupt:
+        runner.tidy_up()
+        return 1
+    except (IOError, OSError) as e:
+        runner.message("CRITICAL cannot start a script: %s" % e)
+        runner.tidy_up()
+        return 1
+    if args.profiledata == "Y":
+        runner.write_load_profile_data()
+    runner.message("All %d runs finished, %d with errors" % (runner.runs, runner.errors))
+    if args.sweep:
+        runner.write_sweep(args.sweep_csv or runner.prefix + ".sweep.csv")
+    results = runner.write_results(args.results or runner.prefix + ".results.json")
+    if args.store:
+        runner.store(args.store, results)
+    runner.tidy_up()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+ Keeps the timings of runall.py runs, so that one run can be compared
+ with another, such as before and after a Vector upgrade or a change to
+ its configuration.
+ Every query run is a row, kept in columns of binary numbers in their
+ own files: the run, the script, when it started in seconds from the
+ start of the run, how long it waited to start, how long it took and its
+ errors. The store is only ever appended to. runs.jsonl has a line for
+ each run, with where its rows are, the rows of each of its scripts, the
+ host and hardware it ran on, and its configuration: runall.py's options
+ and any --config given. scripts.json names the scripts.
+
+ Usage: python3 runall_store.py add <store> <timings file> [--results file]
+                                   [--config name=value ...] [--label text]
+                                   [--describe]
+        python3 runall_store.py list <store> [--host name] [--config name=value ...]
+        python3 runall_store.py compare <store> <baseline run> <candidate run>
+                                   [--script name ...] [--resamples n]
+
+ runall.py --store <store> adds each run itself as it finishes. add
+ stores the timings file of a run kept with -k Y, and the results file
+ it wrote gives the options it was run with. --describe records the
+ hardware as describe.py finds it, from its cache where it can.
+
+ compare lines up the scripts of two runs, given by the numbers list
+ shows or as "last" and "last-1", and works out how much their 50th and
+ 99th percentile times and their runs a second changed, with a 95%
+ bootstrap interval: the range the change falls in when the runs of each
+ script are resampled again and again. A change whose interval is wholly
+ worse than --threshold is marked REGRESSION, and then compare exits
+ with status 1, so it can stop an upgrade going ahead:
+
+script    measure    baseline  candidate   change        95% interval
+q01.sql   p50           0.245      0.301   +22.9%   +18.1% .. +27.0%  REGRESSION
+q01.sql   p99           0.337      0.344    +2.1%    -3.4% ..  +9.8%
+q01.sql   per sec       1.795      1.502   -16.3%   -21.0% .. -11.2%  REGRESSION
+
+ Uses NumPy for the resampling if it is installed, which is much faster
+ for runs of many queries.
+"""
+
+import argparse, hashlib, json, os, random, socket, subprocess, sys, tempfile, time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import describe_cluster
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# The columns of each row, and the type of number each holds
+COLUMNS = [("run", "i"), ("script", "i"), ("offset", "d"), ("queued", "d"),
+           ("seconds", "d"), ("errors", "i")]
+
+# Options of runall.py recorded as the configuration of a run
+OPTIONS = ["database", "scriptdir", "maxconcurrent", "rate", "arrivals", "trace",
+           "sweep", "profgraph", "profiledata"]
+
+# The runs a second of a run are worked out in this many blocks of its
+# time, which are resampled as the times of its queries are
+BLOCKS = 20
+
+# Most numbers drawn at once when resampling with NumPy, to bound memory
+DRAW_AT_ONCE = 4 * 1024 * 1024
+
+def write_json(path, found):
+    """
+    Replace a JSON file in one go
+    """
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, "w") as f_out:
+        json.dump(found, f_out, indent=1, sort_keys=True)
+    os.rename(temp, path)
+
+def read_json(path, default):
+    try:
+        with open(path) as f_in:
+            return json.load(f_in)
+    except (IOError, OSError, ValueError):
+        return default
+
+class Store(object):
+    """
+    A directory of columns, runs.jsonl and scripts.json.
+    A run's line is added to runs.jsonl after its rows, so rows past the
+    last run are left from one that failed part way, and are cut off.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.runs_path = os.path.join(directory, "runs.jsonl")
+        self.scripts_path = os.path.join(directory, "scripts.json")
+        self.scripts = read_json(self.scripts_path, [])
+        self.runs = self.read_runs()
+
+    def read_runs(self):
+        runs = []
+        try:
+            with open(self.runs_path) as f_in:
+                for line in f_in:
+                    if line.endswith("\n"):
+                        runs.append(json.loads(line))
+        except (IOError, OSError):
+            pass
+        return runs
+
+    def rows(self):
+        if not self.runs:
+            return 0
+        return self.runs[-1]["first_row"] + self.runs[-1]["rows"]
+
+    def column_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def script_id(self, name):
+        if name not in self.scripts:
+            self.scripts.append(name)
+            write_json(self.scripts_path, self.scripts)
+        return self.scripts.index(name)
+
+    def run(self, text):
+        """
+        A run by its number, or "last", or "last-N" for the one N before
+        """
+        try:
+            if text == "last" or text.startswith("last-"):
+                back = int(text[5:] or 0)
+                if back >= len(self.runs):
+                    raise ValueError("only %d runs are stored" % len(self.runs))
+                return self.runs[-1 - back]
+            number = int(text)
+        except ValueError as e:
+            raise ValueError("no run %s: %s" % (text, e))
+        for run in self.runs:
+            if run["run"] == number:
+                return run
+        raise ValueError("no run %s" % text)
+
+    def add(self, rows, meta):
+        """
+        Add a run: rows of (script name, offset, queued, seconds, errors),
+        and meta, a dict describing it. Returns the run's number.
+        """
+        first_row = self.rows()
+        number = self.runs[-1]["run"] + 1 if self.runs else 1
+        rows = sorted(rows, key=lambda row: (row[0], row[1]))
+        columns = dict([(name, array(kind)) for name, kind in COLUMNS])
+        scripts = dict()
+        for i, (script_name, offset, queued, seconds, errors) in enumerate(rows):
+            script = self.script_id(script_name)
+            if script_name not in scripts:
+                scripts[script_name] = [first_row + i, 0]
+            scripts[script_name][1] += 1
+            for name, value in [("run", number), ("script", script), ("offset", offset),
+                                ("queued", queued), ("seconds", seconds),
+                                ("errors", errors)]:
+                columns[name].append(value)
+        for name, kind in COLUMNS:
+            with open(self.column_path(name), "ab") as f_out:
+                f_out.truncate(first_row * columns[name].itemsize)
+                columns[name].tofile(f_out)
+        run = dict(meta)
+        run.update({"run": number, "first_row": first_row, "rows": len(rows),
+                    "scripts": scripts})
+        with open(self.runs_path, "a+") as f_out:
+            # A line cut short when a run was being added
+            f_out.seek(0)
+            data = f_out.read()
+            if data and not data.endswith("\n"):
+                f_out.truncate(data.rfind("\n") + 1)
+            f_out.write(json.dumps(run, sort_keys=True) + "\n")
+        self.runs.append(run)
+        return number
+
+    def column(self, name, first_row, count):
+        """
+        count numbers of a column from first_row on
+        """
+        kind = dict(COLUMNS)[name]
+        found = array(kind)
+        with open(self.column_path(name), "rb") as f_in:
+            f_in.seek(first_row * found.itemsize)
+            found.fromfile(f_in, count)
+        return found
+
+    def script_rows(self, run, script_name, name):
+        """
+        A column of the rows of one script of a run
+        """
+        first_row, count = run["scripts"][script_name]
+        return self.column(name, first_row, count)
+
+def read_timings(path):
+    """
+    The rows of a runall.py timings file, with offsets from the first
+    start, and the time of that start
+    """
+    rows = []
+    with open(path) as f_in:
+        header = f_in.readline().rstrip("\n").split("\t")
+        for line in f_in:
+            found = dict(zip(header, line.rstrip("\n").split("\t")))
+            if "seconds" not in found:
+                continue
+            date, dot, fraction = found["started"].partition(".")
+            started = time.mktime(time.strptime(date, "%Y-%m-%d %H:%M:%S"))
+            started += float("0." + fraction) if fraction else 0.0
+            rows.append([found["script"], started, float(found.get("queued", 0)),
+                         float(found["seconds"]), int(found["errors"])])
+    first = min([row[1] for row in rows]) if rows else time.time()
+    for row in rows:
+        row[1] -= first
+    return rows, first
+
+def describe_host():
+    """
+    A line describing the hardware, and an id that is the same for
+    machines that describe.py finds the same, or Nones if it fails
+    """
+    try:
+        output = subprocess.run([sys.executable, os.path.join(HERE, "describe.py"),
+                                 "--json", "--cached"], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL,
+                                timeout=300).stdout
+        values = describe_cluster.flatten(json.loads(output))
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None, None
+    key = json.dumps(describe_cluster.fingerprint(values)).encode("utf-8")
+    return describe_cluster.headline(values), hashlib.sha1(key).hexdigest()[:12]
+
+def run_meta(started, args=None, results=None, config=None, label=None, describe=False):
+    """
+    What to record about a run: when, where, and how it was run
+    """
+    meta = {"time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+            "host": socket.gethostname(), "label": label, "config": dict(config or {})}
+    for name in OPTIONS:
+        if name == "arrivals" and not ((args is not None and getattr(args, "rate", None)) or
+                                       (results is not None and results.get("rate"))):
+            continue
+        if args is not None and getattr(args, name, None) is not None:
+            meta["config"][name] = getattr(args, name)
+        elif results is not None and results.get(name) is not None:
+            meta["config"][name] = results[name]
+    if describe:
+        meta["hardware"], meta["hardware_id"] = describe_host()
+    return meta
+
+def add_timings(store, path, args=None, results=None, config=None, label=None,
+                describe=False):
+    """
+    Store the timings file of a run. Returns the run's number.
+    """
+    rows, started = read_timings(path)
+    meta = run_meta(started, args, results, config, label, describe)
+    # From the first start to the last end, as the offsets are
+    meta["elapsed"] = max([row[1] + row[3] for row in rows] or [0])
+    return store.add(rows, meta)
+
+def percentile(values, percent):
+    """
+    The value percent of sorted values are at most
+    """
+    rank = max(1, int(-(-percent * len(values) // 100)))
+    return values[min(rank, len(values)) - 1]
+
+def block_rates(offsets, seconds, elapsed):
+    """
+    Runs a second finished in each of BLOCKS blocks of a run, from when
+    each started and how long it took
+    """
+    counts = [0] * BLOCKS
+    width = elapsed / BLOCKS if elapsed else 1.0
+    for offset, taken in zip(offsets, seconds):
+        counts[min(BLOCKS - 1, int((offset + taken) / width))] += 1
+    return [count / width for count in counts]
+
+def statistics(times, rates):
+    """
+    The measures compared, from the times of a script's runs and its
+    runs a second in each block
+    """
+    times = sorted(times)
+    return {"p50": percentile(times, 50), "p99": percentile(times, 99),
+            "per sec": sum(rates) / len(rates)}
+
+def resample(times, rates, resamples, rng):
+    """
+    The measures of resamples of the times and rates, each drawn from
+    them with replacement, as a dict of measure to list
+    """
+    found = {"p50": [], "p99": [], "per sec": []}
+    if numpy is not None:
+        gen = numpy.random.default_rng(rng.randrange(2 ** 32))
+        times = numpy.asarray(times)
+        rates = numpy.asarray(rates)
+        at_once = max(1, DRAW_AT_ONCE // len(times))
+        for done in range(0, resamples, at_once):
+            drawn = numpy.sort(times[gen.integers(
+                0, len(times), (min(at_once, resamples - done), len(times)))], axis=1)
+            for name, percent in ("p50", 50), ("p99", 99):
+                rank = max(1, int(-(-percent * len(times) // 100)))
+                found[name].extend(drawn[:, min(rank, len(times)) - 1])
+        found["per sec"] = list(rates[gen.integers(0, len(rates),
+                                                   (resamples, len(rates)))].mean(axis=1))
+        return found
+    for i in range(resamples):
+        drawn = statistics(rng.choices(times, k=len(times)), rng.choices(rates, k=len(rates)))
+        for name in found:
+            found[name].append(drawn[name])
+    return found
+
+def compare_script(store, baseline, candidate, script_name, resamples, rng):
+    """
+    For each measure: the baseline and candidate values, the change as a
+    fraction, and the low and high ends of its 95% interval
+    """
+    measured = []
+    for run in baseline, candidate:
+        times = list(store.script_rows(run, script_name, "seconds"))
+        offsets = store.script_rows(run, script_name, "offset")
+        rates = block_rates(offsets, times, run["elapsed"])
+        measured.append((statistics(times, rates), resample(times, rates, resamples, rng)))
+    (base, base_drawn), (cand, cand_drawn) = measured
+    lines = []
+    for name in "p50", "p99", "per sec":
+        changes = sorted([c / b - 1 if b else 0.0
+                          for b, c in zip(base_drawn[name], cand_drawn[name])])
+        change = cand[name] / base[name] - 1 if base[name] else 0.0
+        lines.append((name, base[name], cand[name], change,
+                      percentile(changes, 2.5), percentile(changes, 97.5)))
+    return lines
+
+def compare(store, baseline, candidate, scripts=None, resamples=1000, threshold=0.0,
+            seed=None):
+    """
+    Print the comparison of two runs, script by script. Returns the
+    number of regressions.
+    """
+    rng = random.Random(seed)
+    names = [name for name in sorted(baseline["scripts"]) if name in candidate["scripts"]]
+    if scripts:
+        names = [name for name in names if name in scripts]
+    for run, other in (baseline, candidate), (candidate, baseline):
+        missing = sorted(set(run["scripts"]) - set(other["scripts"]))
+        if missing and not scripts:
+            print("Only in run %d: %s" % (run["run"], " ".join(missing)))
+    print("%-9s %-9s %9s %10s %8s %19s" % ("script", "measure", "baseline", "candidate",
+                                            "change", "95% interval"))
+    regressions = 0
+    for name in names:
+        for measure, base, cand, change, low, high in compare_script(
+                store, baseline, candidate, name, resamples, rng):
+            # Longer times are worse, but fewer runs a second
+            worse = low > threshold if measure != "per sec" else high < -threshold
+            better = high < -threshold if measure != "per sec" else low > threshold
+            note = "REGRESSION" if worse else "better" if better else ""
+            regressions += worse
+            print("%-9s %-9s %9.3f %10.3f %+7.1f%% %+7.1f%% .. %+6.1f%%  %s" % (
+                name, measure, base, cand, change * 100, low * 100, high * 100, note))
+    return regressions
+
+def config_pairs(pairs):
+    config = dict()
+    for pair in pairs or []:
+        name, equals, value = pair.partition("=")
+        if not equals:
+            raise argparse.ArgumentTypeError("--config takes name=value, not %s" % pair)
+        config[name] = value
+    return config
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store and compare runall.py timings")
+    actions = parser.add_subparsers(dest="action")
+    add = actions.add_parser("add", help="store the timings file of a run")
+    add.add_argument("store", help="directory of the store")
+    add.add_argument("timings", help="runall.py timings file")
+    add.add_argument("--results", help="runall.py results file of the same run")
+    add.add_argument("--config", action="append", metavar="NAME=VALUE",
+                     help="something about how the run was set up, such as vector=6.0")
+    add.add_argument("--label", help="a note about the run")
+    add.add_argument("--describe", action="store_true",
+                     help="record the hardware as describe.py finds it")
+    listing = actions.add_parser("list", help="list the runs stored")
+    listing.add_argument("store", help="directory of the store")
+    listing.add_argument("--host", help="only runs on this host")
+    listing.add_argument("--script", help="only runs of this script")
+    listing.add_argument("--config", action="append", metavar="NAME=VALUE",
+                         help="only runs with this configuration")
+    comparing = actions.add_parser("compare", help="compare two runs")
+    comparing.add_argument("store", help="directory of the store")
+    comparing.add_argument("baseline", help="run to compare with, a number or last-N")
+    comparing.add_argument("candidate", help="run to compare, a number or last")
+    comparing.add_argument("--script", action="append",
+                           help="only compare this script")
+    comparing.add_argument("--resamples", type=int, default=1000,
+                           help="bootstrap resamples (default 1000)")
+    comparing.add_argument("--threshold", type=float, default=0.0,
+                           help="fraction of change that does not count as a "
+                                "regression, such as 0.05 (default 0)")
+    comparing.add_argument("--seed", type=int, help="seed for the resampling")
+    args = parser.parse_args(argv)
+    if args.action is None:
+        parser.error("give add, list or compare")
+    try:
+        config = config_pairs(args.config) if args.action != "compare" else None
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    if args.action == "add":
+        if not os.path.isdir(args.store):
+            os.makedirs(args.store)
+        store = Store(args.store)
+        results = read_json(args.results, None) if args.results else None
+        number = add_timings(store, args.timings, results=results, config=config,
+                             label=args.label, describe=args.describe)
+        print("Stored as run %d" % number)
+        return 0
+
+    store = Store(args.store)
+    if args.action == "list":
+        print("%5s  %-19s  %-12s  %6s  %s" % ("run", "time", "host", "rows", "config"))
+        for run in store.runs:
+            if args.host and run.get("host") != args.host:
+                continue
+            if args.script and args.script not in run["scripts"]:
+                continue
+            if any([str(run["config"].get(name)) != value for name, value in config.items()]):
+                continue
+            print("%5d  %-19s  %-12s  %6d  %s%s" % (
+                run["run"], run["time"], run.get("host", ""), run["rows"],
+                " ".join(["%s=%s" % item for item in sorted(run["config"].items())]),
+                "  " + run["label"] if run.get("label") else ""))
+        return 0
+
+    try:
+        baseline = store.run(args.baseline)
+        candidate = store.run(args.candidate)
+    except ValueError as e:
+        parser.error(str(e))
+    for run in baseline, candidate:
+        print("Run %d: %s on %s%s" % (run["run"], run["time"], run.get("host"),
+                                       ", " + run["hardware"] if run.get("hardware") else ""))
+    if None not in (baseline.get("hardware_id"), candidate.get("hardware_id")) and \
+       baseline["hardware_id"] != candidate["hardware_id"]:
+        print("The runs were on different hardware")
+    regressions = compare(store, baseline, candidate, args.script, args.resamples,
+                          args.threshold, args.seed)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+ Checks that a vwinfo_store.Store left open beside a writer, as
+ vwinfo_sampler.py --store has one, keeps reading what is added.
+
+ Usage: python3 -m unittest test_vwinfo_store
+"""
+
+import shutil, tempfile, unittest
+
+import vwinfo_store
+
+STAT = "memory.memcontext_allocated"
+
+class ReadAppendRead(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="vwinfo_store.")
+        self.writer = vwinfo_store.Store(self.directory)
+        self.reader = vwinfo_store.Store(self.directory)
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.directory)
+
+    def add(self, first, count, stats=(STAT,)):
+        for i in range(first, first + count):
+            self.writer.append(1000000 + i, dict((stat, float(i)) for stat in stats))
+
+    def test_read_append_read(self):
+        self.add(0, 10)
+        reader = vwinfo_store.Store(self.directory)
+        times, values = reader.read(STAT)
+        self.assertEqual(len(times), 10)
+        # Well past the size of the files when they were mapped
+        self.add(10, 5000)
+        later_times, later_values = reader.read(STAT)
+        self.assertEqual(len(later_times), 5010)
+        self.assertEqual(later_values[-1], 5009.0)
+        # What was read first is still there to use
+        self.assertEqual(list(values), [float(i) for i in range(10)])
+
+    def test_new_stat(self):
+        self.add(0, 3)
+        self.assertEqual(self.reader.stats(), [STAT])
+        self.add(3, 2, stats=(STAT, "%log"))
+        self.assertEqual(self.reader.stats(), ["%log", STAT])
+        times, values = self.reader.read("%log")
+        self.assertEqual(len(times), 5)
+        self.assertEqual(list(values)[3:], [3.0, 4.0])
+
+    def test_new_segment(self):
+        rows = vwinfo_store.SEGMENT_ROWS
+        vwinfo_store.SEGMENT_ROWS = 4
+        try:
+            self.add(0, 3)
+            self.assertEqual(len(self.reader.read(STAT)[0]), 3)
+            self.add(3, 6)
+            times, values = self.reader.read(STAT)
+            self.assertEqual(len(self.reader.index["segments"]), 3)
+            self.assertEqual(list(values), [float(i) for i in range(9)])
+            self.assertEqual(self.reader.last_time(), 1000008)
+        finally:
+            vwinfo_store.SEGMENT_ROWS = rows
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""
+ Works out the CPU topology of the nodes of a Vector or VectorH cluster,
+ and from it the number of partitions to use for large tables and the
+ parallelism each node can sustain.
+ Reads /sys/devices/system/cpu and /sys/devices/system/node rather than
+ /proc/cpuinfo, so it sees NUMA nodes, hyperthread siblings, CPUs that
+ are offline or isolated from the scheduler, and nodes that differ.
+
+ Usage: python topology.py [-f slaves-file] [--partitions] [--json]
+
+ Without --partitions it explains how it got its numbers, like this:
+
+Node node01: 2 sockets, 2 NUMA nodes, 24 cores, 48 threads (2 per core)
+Node node02: 2 sockets, 2 NUMA nodes, 20 cores, 40 threads (2 per core), 4 cores isolated
+Usable cores are physical cores with at least one online thread that is not isolated
+Hyperthreads are not counted, x100 gains little from them
+Smallest node has 20 usable cores, so every node is planned with 20
+20 cores / 4 = 5 partitions per node
+Rounded down to 4 so each of the 2 NUMA nodes gets the same number
+4 partitions per node x 2 nodes = 8 partitions
+Recommended partitions: 8
+Parallelism per node: 20
+
+ With --partitions it prints just the number, for partitions.sh.
+
+ Other Python tools can import it:
+    import topology
+    found = topology.read_topology()
+    partitions, parallelism, reasons = topology.recommend([found])
+"""
+
+from __future__ import print_function
+
+import json, os, socket, subprocess, sys
+
+# Share of the cores in the cluster to use as partitions, as partitions.sh
+CORES_PER_PARTITION = 4
+
+def read_file(path, default=""):
+    """
+    Contents of a small sysfs file, or the default if it is not there
+    """
+    try:
+        with open(path) as f_in:
+            return f_in.read().strip()
+    except (IOError, OSError):
+        return default
+
+def parse_cpulist(text):
+    """
+    The CPU numbers in a kernel CPU list such as 0-3,8-11
+    """
+    cpus = set()
+    for part in text.replace("\n", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def read_topology(root="/sys/devices/system", name=None):
+    """
+    The CPU and NUMA layout of this machine, as a dict of plain values
+    so it can be passed around as JSON. root is there to read a copy
+    of sysfs saved from another machine.
+    """
+    cpu_dir = os.path.join(root, "cpu")
+    node_dir = os.path.join(root, "node")
+    online = parse_cpulist(read_file(os.path.join(cpu_dir, "online"), "0"))
+    isolated = parse_cpulist(read_file(os.path.join(cpu_dir, "isolated")))
+
+    cores = dict()
+    packages = set()
+    for cpu in sorted(online):
+        topo = os.path.join(cpu_dir, "cpu%d" % cpu, "topology")
+        package = read_file(os.path.join(topo, "physical_package_id"), "0")
+        core = read_file(os.path.join(topo, "core_id"), str(cpu))
+        packages.add(package)
+        cores.setdefault("%s:%s" % (package, core), []).append(cpu)
+
+    numa = dict()
+    if os.path.isdir(node_dir):
+        for entry in sorted(os.listdir(node_dir)):
+            if not entry.startswith("node") or not entry[4:].isdigit():
+                continue
+            cpus = parse_cpulist(read_file(os.path.join(node_dir, entry, "cpulist")))
+            if cpus & online:
+                numa[entry[4:]] = sorted(cpus & online)
+    if not numa:
+        numa["0"] = sorted(online)
+
+    usable = [key for key, cpus in cores.items() if set(cpus) - isolated]
+    threads = max([len(cpus) for cpus in cores.values()] or [1])
+    return {"name": name or socket.gethostname(),
+            "sockets": len(packages),
+            "numa_nodes": len(numa),
+            "numa_cpus": numa,
+            "cores": len(cores),
+            "threads": len(online),
+            "threads_per_core": threads,
+            "isolated_cores": len(cores) - len(usable),
+            "usable_cores": len(usable)}
+
+def summary(found):
+    """
+    One line description of a node's topology
+    """
+    line = "%d sockets, %d NUMA nodes, %d cores, %d threads (%d per core)" % (
+        found["sockets"], found["numa_nodes"], found["cores"],
+        found["threads"], found["threads_per_core"])
+    if found["isolated_cores"]:
+        line += ", %d cores isolated" % found["isolated_cores"]
+    return line
+
+def recommend(nodes):
+    """
+    Partitions for large tables and parallelism per node, for a cluster
+    whose nodes have the topologies given.
+    Returns the two numbers and the reasons for them, as a list of lines.
+    """
+    reasons = ["Node %s: %s" % (found["name"], summary(found)) for found in nodes]
+    reasons.append("Usable cores are physical cores with at least one online "
+                   "thread that is not isolated")
+    if max([found["threads_per_core"] for found in nodes]) > 1:
+        reasons.append("Hyperthreads are not counted, x100 gains little from them")
+
+    # Partitions are spread evenly over the nodes, so the smallest node
+    # sets the pace and planning for more cores only adds skew
+    smallest = min(nodes, key=lambda found: found["usable_cores"])
+    cores = max(smallest["usable_cores"], 1)
+    if len(nodes) > 1:
+        if any([found["usable_cores"] != cores for found in nodes]):
+            reasons.append("Smallest node has %d usable cores, so every node is "
+                           "planned with %d" % (cores, cores))
+        else:
+            reasons.append("Every node has %d usable cores" % cores)
+
+    per_node = cores // CORES_PER_PARTITION
+    if per_node < 1:
+        per_node = 1
+        reasons.append("Fewer than %d cores, so 1 partition per node" %
+                       CORES_PER_PARTITION)
+    else:
+        reasons.append("%d cores / %d = %d partitions per node" % (
+            cores, CORES_PER_PARTITION, per_node))
+    numa = smallest["numa_nodes"]
+    if numa > 1 and per_node >= numa and per_node % numa:
+        per_node -= per_node % numa
+        reasons.append("Rounded down to %d so each of the %d NUMA nodes gets "
+                       "the same number" % (per_node, numa))
+    partitions = per_node * len(nodes)
+    if len(nodes) > 1:
+        reasons.append("%d partitions per node x %d nodes = %d partitions" % (
+            per_node, len(nodes), partitions))
+    return partitions, cores, reasons
+
+def read_slaves(path):
+    """
+    The nodes listed in a VectorH slaves file
+    """
+    nodes = []
+    for line in read_file(path).splitlines():
+        words = line.split()
+        if len(words) and not words[0].startswith('#') and words[0] not in nodes:
+            nodes.append(words[0])
+    return nodes
+
+def read_cluster(nodes, python="python"):
+    """
+    Topologies of all the nodes, reading the remote ones with ssh at
+    once by feeding this script to their python.
+    Nodes that cannot be reached are assumed to match this one.
+    """
+    local = read_topology()
+    with open(os.path.abspath(__file__), "rb") as f_in:
+        source = f_in.read()
+    procs = dict()
+    for node in nodes:
+        if node in ["localhost", local["name"], local["name"].split('.')[0]]:
+            continue
+        procs[node] = subprocess.Popen(["ssh", "-o", "BatchMode=yes",
+                                        "-o", "ConnectTimeout=10",
+                                        node, python, "-", "--json"],
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE,
+                                       stderr=open(os.devnull, 'w'))
+        procs[node].stdin.write(source)
+        procs[node].stdin.close()
+    found = []
+    unreachable = []
+    for node in nodes:
+        if node not in procs:
+            local["name"] = node
+            found.append(dict(local))
+            continue
+        output = procs[node].stdout.read()
+        procs[node].wait()
+        try:
+            remote = json.loads(output.decode("utf-8"))
+            remote["name"] = node
+            found.append(remote)
+        except ValueError:
+            unreachable.append(node)
+            copy = dict(local)
+            copy["name"] = node
+            found.append(copy)
+    return found, unreachable
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Recommend VectorH partitions from the CPU topology")
+    parser.add_argument("-f", "--slaves", default=os.path.join(
+                            os.environ.get("II_SYSTEM", ""), "ingres", "files", "slaves"),
+                        help="file listing the nodes (default $II_SYSTEM/ingres/files/slaves)")
+    parser.add_argument("--partitions", action="store_true",
+                        help="print just the recommended number of partitions")
+    parser.add_argument("--json", action="store_true",
+                        help="print this machine's topology as JSON")
+    parser.add_argument("--sysfs", default="/sys/devices/system",
+                        help="where to read the topology from")
+    args = parser.parse_args(argv)
+
+    if args.json:
+        json.dump(read_topology(args.sysfs), sys.stdout, sort_keys=True)
+        print()
+        return 0
+
+    nodes = read_slaves(args.slaves)
+    unreachable = []
+    if len(nodes) > 1:
+        found, unreachable = read_cluster(nodes)
+    else:
+        # Vector, or VectorH on a single node
+        found = [read_topology(args.sysfs, name=(nodes or [None])[0])]
+    partitions, parallelism, reasons = recommend(found)
+    if args.partitions:
+        print(partitions)
+        return 0
+    for node in unreachable:
+        reasons.insert(0, "Could not reach %s, assuming it matches this node" % node)
+    for line in reasons:
+        print(line)
+    print("Recommended partitions:", partitions)
+    print("Parallelism per node:", parallelism)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
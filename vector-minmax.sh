@@ -63,7 +63,7 @@ then
 fi
 
 # Move getting the DDL higher up so that we can test if table is partitioned.
-# Get the datatype for the column, so we can store the values later in the temp table
+# Get the datatype for the column, to show with the results
 # Dumps the table schema to a file in /tmp then grabs the column datatype from that
 
 copydb -u${TOWNER} ${DBNAME} ${TNAME} >copydb.log 2>&1
@@ -106,10 +106,6 @@ rm copy.out copy.in copydb.log
 
 # Include the partition spec in the x100 table name
 CNAMEX100="_${CNAME}"
-DATAFILE="/tmp/${3}${4}.dat"
-DATATABLE="minmax_deleteme"
-DATATABLE2="minmax2_deleteme"
-DATATABLE3="minmax3_deleteme"
 
 #  Include partition spec
 echo "Database: ${DBNAME}, Owner: ${TOWNER}, Table/Partition: ${TNAME}/${PTN} [ ${TNAMEX100} ], Column: ${CNAME} [ ${CNAMEX100} Datatype: ${CTYPE} ]"
@@ -123,9 +119,11 @@ else
         LOCKDIR="$II_SYSTEM/ingres/data/vectorwise/$DBNAME"
 fi
 
-# Call the x100 client to run some x100 algebra directly, to get data from internal data structs
+# Call the x100 client to run some x100 algebra directly, to get data from internal data structs,
+# and look for data range overlaps in its output with minmax_sweep.py, which counts the blocks
+# returned and stops if there were none. Nothing is written to the database.
 
-x100_client --port `cat ${LOCKDIR}/lock | head -1` --passfile $II_SYSTEM/ingres/data/vectorwise/$DBNAME/authpass -o raw << EOF > ${DATAFILE} 2>/dev/null
+x100_client --port `cat ${LOCKDIR}/lock | head -1` --passfile $II_SYSTEM/ingres/data/vectorwise/$DBNAME/authpass -o raw << EOF 2>/dev/null | python3 $(dirname $0)/minmax_sweep.py --type "${CTYPE}" || exit
 
 # Join to the minmax table (restrict to 1 column)
 HashJoin01 (
@@ -153,150 +151,6 @@ HashJoin01 (
 
 EOF
 
-#  Debug the x100 output, if needed
-ROWS=`cat ${DATAFILE} | wc -l `
-echo MinMax block count returned from x100 query was ${ROWS}
-
-if [ ${ROWS} = 0 ]
-then
-    echo No rows returned from x100 query: unable to continue, please fix the problem.
-    echo This might be because you specified a non-existent table or column name - this is not
-    echo explicitly validated.
-
-    exit
-fi
-
-
-# Now to work with the output from x100 data and look for data range overlaps
-# Using SQL to do this, with a few temp table steps as below.
-# If debug output is needed, switch the variable below.
-
-GO='\p\g'       # Produces debug level output if needed. Also need to remove \silent below.
-GO='\g'         # Default to no Debug output
-
-sql ${DBNAME} << EOF
-\silent
-
-drop table if exists ${DATATABLE}; ${GO}
-
-
-create table ${DATATABLE} (
-         RowId          integer8        not null
-        ,MinValue       ${CTYPE}        not null
-        ,MaxValue       ${CTYPE}        not null
-        ,TableName      varchar(30)     not null
-        ,ColName        varchar(30)     not null
-)
-;${GO}
-
---  Fix order of table name and column name
-copy table ${DATATABLE} (
-         RowId          = 'c0|'
-        ,MinValue       = 'c0|'
-        ,MaxValue       = 'c0|'
-        ,ColName        = 'c0|'
-        ,TableName      = 'c0nl'
-)
-from '${DATAFILE}'
-;${GO}
-
---  No longer applies for partitioned tables
---select top 1
---       TableName
---      ,ColName
---  from ${DATATABLE}
---;${GO}
-
--- Debug level output
---  Include basic output
--- select
---          row_number() over (partition by TableName order by RowId) as LineNum
---         ,RowId
---         ,MinValue
---         ,MaxValue
---         ,TableName
---   from
---          ${DATATABLE}
--- order by
---       TableName
---      ,LineNum
--- ;${GO}
-
-drop table if exists ${DATATABLE2};
-drop table if exists ${DATATABLE3};
-;${GO}
-
-
-create table ${DATATABLE2} as
-        select
-                 row_number() over (partition by TableName order by RowId) as LineNum
-                ,RowId
-                ,MinValue
-                ,MaxValue
-                ,TableName
-          from
-                 ${DATATABLE}
-;${GO}
-
-create table ${DATATABLE3} as
-select
-         mm1.TableName
-        ,mm1.LineNum
-        ,mm1.MinValue as mm1_MinValue
-        ,mm1.MaxValue as mm1_MaxValue
-        ,mm2.MinValue as mm2_MinValue
-        ,mm2.MaxValue as mm2_MaxValue
-        ,mm2.RowId - mm1.RowId as rows
-        ,case
-                when mm1.MaxValue > mm2.MinValue then 1
-                else 0
-         end as OverLap
-  from
-         ${DATATABLE2} mm1
-        ,${DATATABLE2} mm2
- where
-        mm1.TableName = mm2.TableName
-   and  mm1.LineNum = mm2.LineNum - 1
-;${GO}
-
-
--- Debug level output only
-
--- SELECT * from ${DATATABLE3}
--- ORDER BY
---       TableName
---      ,LineNum
--- ;${GO}
-commit;
-;${GO}
-
-EOF
-
-sql ${DBNAME} << EOF
-
--- Final output.
--- If SortedPct is not 100, then the Min Max index is not fully sorted.
--- If SortedPct is 0, then the data in the index is not sorted at all.
-
-SELECT
-         TableName
-        ,sum(OverLap) as OverLaps
-        ,count(*) as Total_index_blocks
-        ,100.0 - decimal((decimal(sum(OverLap))/decimal(count(*)))*100.0,5,2) as SortedPct
-FROM
-         ${DATATABLE3}
-GROUP BY
-         TableName
-;${GO}
-
-drop table ${DATATABLE};
-drop table ${DATATABLE2};
-drop table ${DATATABLE3};
-commit;
-${GO}
-
-EOF
-
 echo
 echo
 echo In the table above, the values to pay attention to are in the sortedpct column.
@@ -313,5 +167,3 @@ echo
 echo 'To sort data, create an index on the column to be sorted (check the manual for syntax).'
 echo
 
-#cat ${DATAFILE}
-rm -f ${DATAFILE}
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+ Turns the log written by monitor-vwinfo.sh into CSV, one row for each
+ snapshot, as vwinfo-pivot.awk does, but without reading the whole log
+ every time.
+ With -o it appends to the CSV file only the snapshots logged since it
+ last ran, remembering how far it got in <csv file>.checkpoint, so it can
+ be run from cron after every monitor-vwinfo.sh.
+ Columns come in the order the fields are given, which is the order of
+ the header.
+
+ Usage: python3 vwinfo_pivot.py [-f field,field...] [-o vwinfo-out.csv] monitor-vwinfo.log
+
+ Output looks like this:
+
+timestamp,committed_transactions,memcontext_allocated,memcontext_maximum,active_sessions,log_file_size,threshold_log_condense,%memcontext,%log
+2016-04-26 10:56:23,51811414,7626673992,287037194240,21,9839545026,11694901940,2,84
+
+ Other Python tools can read the snapshots themselves:
+    import vwinfo_pivot
+    for timestamp, stats, offset in vwinfo_pivot.read_blocks(f_in):
+        ...
+"""
+
+import argparse, json, os, re, sys, tempfile
+
+# The fields pulled out of each snapshot. A field matches any stat whose
+# name contains it, so names need not be spelled out in full.
+FIELDS = ["committed_transactions", "memcontext_allocated", "memcontext_maximum",
+          "active_sessions", "log_file_size", "threshold_log_condense",
+          "%memcontext", "%log"]
+
+# Fields worked out from others, as a percentage of one field by another
+DERIVED = {"%log": ("log_file_size", "threshold_log_condense"),
+           "%memcontext": ("memcontext_allocated", "memcontext_maximum")}
+
+# Lines with a stat in them look like |memory.memcontext_allocated |7626673992 |
+STAT_LINE = re.compile(rb"^\|[A-Za-z0-9]*\.")
+
+# What comes after the time on the line starting a snapshot
+START = re.compile(rb":\s*Start Processing")
+
+class FieldMatcher(object):
+    """
+    Which fields a stat's value goes into. Each stat name is only
+    compared with the fields the first time it is seen.
+    """
+
+    def __init__(self, fields):
+        self.fields = [field for field in fields if field not in DERIVED]
+        self.found = dict()
+
+    def match(self, stat):
+        fields = self.found.get(stat)
+        if fields is None:
+            fields = self.found[stat] = tuple(
+                [field for field in self.fields if field in stat])
+        return fields
+
+def number(text):
+    """
+    A stat's value as a number, or 0 if it is not one, as awk would
+    """
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return 0
+
+def read_stat(line):
+    """
+    The name and value on a line of a vwinfo table, as text
+    """
+    words = line.split(b"|")
+    return (words[1].strip().decode("utf-8", "replace"),
+            words[2].strip().decode("utf-8", "replace"))
+
+def read_table(data):
+    """
+    The stats in the output of one run of vwinfo, as a dict of stat
+    name to value as text
+    """
+    return dict([read_stat(line) for line in data.splitlines()
+                 if STAT_LINE.match(line)])
+
+def read_blocks(f_in, offset=0):
+    """
+    Yield each complete snapshot in a monitor-vwinfo.sh log, read in
+    binary from offset on: its timestamp, a dict of stat name to value
+    as text, and the offset just after it.
+    A snapshot still being written, with no End line yet, is left for
+    the next time.
+    """
+    f_in.seek(offset)
+    timestamp = None
+    stats = dict()
+    for line in iter(f_in.readline, b""):
+        offset += len(line)
+        if not line.endswith(b"\n"):
+            break
+        if b"Start Processing" in line:
+            timestamp = START.split(line, 1)[0].decode("utf-8", "replace").strip()
+            stats = dict()
+        elif STAT_LINE.match(line):
+            stat, value = read_stat(line)
+            stats[stat] = value
+        elif b"End Processing" in line and timestamp is not None:
+            yield timestamp, stats, offset
+            timestamp = None
+
+def field_values(stats, fields, matcher):
+    """
+    The value of each field in a snapshot, 0 for those not found
+    """
+    values = dict([(field, 0) for field in fields])
+    for stat, value in stats.items():
+        for field in matcher.match(stat):
+            values[field] = number(value)
+    for field, (part, whole) in DERIVED.items():
+        if field in values and values.get(whole):
+            values[field] = values.get(part, 0) * 100.0 / values[whole]
+    return values
+
+def pivot(timestamp, stats, fields, matcher):
+    """
+    The CSV row for a snapshot, or None if it has no real data in it
+    """
+    values = field_values(stats, fields, matcher)
+    # The log condense threshold is never really 1, so snapshots without
+    # it are ones where vwinfo failed
+    if "threshold_log_condense" in values and values["threshold_log_condense"] <= 1:
+        return None
+    return ",".join([timestamp] + ["%d" % values[field] for field in fields])
+
+def read_checkpoint(path, f_in):
+    """
+    Where the last run got to in the log, or 0 if the log has been
+    rotated or truncated since
+    """
+    try:
+        with open(path) as f_check:
+            checkpoint = json.load(f_check)
+    except (IOError, OSError, ValueError):
+        return 0
+    st = os.fstat(f_in.fileno())
+    offset = checkpoint.get("offset", 0)
+    if checkpoint.get("ino") != st.st_ino or st.st_size < offset:
+        return 0
+    check = bytes.fromhex(checkpoint.get("check", ""))
+    f_in.seek(offset - len(check))
+    if f_in.read(len(check)) != check:
+        return 0
+    return offset
+
+def write_checkpoint(path, f_in, offset):
+    """
+    Remember how far the log has been read, replacing the old
+    checkpoint in one go
+    """
+    f_in.seek(max(0, offset - 64))
+    check = f_in.read(offset - max(0, offset - 64))
+    checkpoint = {"ino": os.fstat(f_in.fileno()).st_ino, "offset": offset,
+                  "check": check.hex()}
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, "w") as f_out:
+        json.dump(checkpoint, f_out)
+    os.rename(temp, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Turn monitor-vwinfo.sh output into CSV")
+    parser.add_argument("-f", "--fields", default=",".join(FIELDS),
+                        help="comma separated fields to pull out (default %(default)s)")
+    parser.add_argument("-o", "--output",
+                        help="CSV file to add the new snapshots to, instead of "
+                             "writing them all to standard output")
+    parser.add_argument("log", help="log written by monitor-vwinfo.sh")
+    args = parser.parse_args(argv)
+
+    fields = [field for field in args.fields.split(",") if field]
+    matcher = FieldMatcher(fields)
+    header = ",".join(["timestamp"] + fields)
+    checkpoint = args.output and args.output + ".checkpoint"
+
+    with open(args.log, "rb") as f_in:
+        offset = 0
+        if args.output and os.path.exists(args.output) and os.path.getsize(args.output):
+            with open(args.output, newline="") as f_old:
+                found = f_old.readline().rstrip("\r\n")
+            if found != header:
+                sys.stderr.write("%s has columns %s, not %s\n" % (args.output, found, header))
+                return 1
+            offset = read_checkpoint(checkpoint, f_in)
+            f_out = open(args.output, "a", newline="")
+        elif args.output:
+            f_out = open(args.output, "w", newline="")
+            f_out.write(header + "\r\n")
+        else:
+            f_out = sys.stdout
+            f_out.write(header + "\r\n")
+
+        end = offset
+        for timestamp, stats, end in read_blocks(f_in, offset):
+            row = pivot(timestamp, stats, fields, matcher)
+            if row is not None:
+                f_out.write(row + "\r\n")
+        if args.output:
+            f_out.close()
+            write_checkpoint(checkpoint, f_in, end)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
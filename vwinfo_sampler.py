@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+ Samples the vwinfo stats of a database every few seconds for as long as
+ it runs, to catch the short memory spikes that the half-hourly
+ monitor-vwinfo.sh misses between its snapshots.
+ The latest samples of each stat are kept in memory, and rolled up into
+ the minimum, maximum and mean of each minute, hour and day, which are
+ added to CSV files in the output directory once a minute:
+
+   vwinfo-1m.csv, vwinfo-1h.csv, vwinfo-1d.csv
+       timestamp,stat,min,max,mean,samples
+   vwinfo-recent.csv
+       timestamp and every stat of each sample still in memory, rewritten
+       each time
+
+ With --store, every sample is also added to a vwinfo_store.py store.
+
+ Stats are as vwinfo names them, such as memory.memcontext_allocated,
+ plus %log and %memcontext as vwinfo_pivot.py works them out.
+
+ Usage: python3 vwinfo_sampler.py [-i seconds] [-d directory] <database>
+
+ Leave it running with nohup, and stop it with kill or ^C, which adds
+ what it has so far to the files first. To try it out without a Vector
+ installation, put the recorded vwinfo in fixtures/vwinfo first on PATH:
+
+    PATH=fixtures/vwinfo:$PATH python3 vwinfo_sampler.py -i 1 testdb
+"""
+
+import argparse, math, os, shlex, signal, subprocess, sys, tempfile, threading, time
+from array import array
+
+import vwinfo_pivot, vwinfo_store
+
+# Samples kept in memory, of each stat: 5 hours at the default interval
+RECENT_SAMPLES = 3600
+
+# Seconds between samples
+INTERVAL = 5
+
+# Seconds between additions to the files
+FLUSH_SECONDS = 60
+
+# The rollups, and the seconds each one covers
+ROLLUPS = [("1m", 60), ("1h", 3600), ("1d", 86400)]
+
+class Ring(object):
+    """
+    The last capacity values added, in a fixed array that is written
+    round and round, so memory use never grows
+    """
+
+    def __init__(self, capacity):
+        self.values = array("d", [math.nan]) * capacity
+        self.capacity = capacity
+        self.next = 0
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def __len__(self):
+        return self.count
+
+    def newest(self):
+        """
+        The values, newest first
+        """
+        for i in range(self.count):
+            yield self.values[(self.next - 1 - i) % self.capacity]
+
+class Rollup(object):
+    """
+    The minimum, maximum and mean of each stat over periods of a given
+    number of seconds, which start on the minute, hour or local midnight
+    """
+
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.start = None
+        self.current = dict()
+        self.finished = []
+
+    def period(self, when):
+        offset = time.localtime(when).tm_gmtoff
+        return (int(when) + offset) // self.seconds * self.seconds - offset
+
+    def add(self, when, values):
+        start = self.period(when)
+        if self.start is not None and start != self.start:
+            self.finish()
+        self.start = start
+        for stat, value in values.items():
+            found = self.current.get(stat)
+            if found is None:
+                self.current[stat] = [value, value, value, 1]
+            else:
+                found[0] = min(found[0], value)
+                found[1] = max(found[1], value)
+                found[2] += value
+                found[3] += 1
+
+    def resume(self, path, when):
+        """
+        Carry on with the period when falls in, if a sampler stopped
+        during it wrote it to path unfinished: its rows are taken off the
+        end of the file and added back in, so the period is written once
+        """
+        try:
+            with open(path, "rb") as f_in:
+                lines = f_in.readlines()
+        except (IOError, OSError):
+            return
+        start = self.period(when)
+        prefix = (timestamp(start) + ",").encode("ascii")
+        kept = len(lines)
+        while kept > 1 and lines[kept - 1].startswith(prefix):
+            kept -= 1
+        if kept == len(lines):
+            return
+        for line in lines[kept:]:
+            fields = line.decode("utf-8", "replace").rstrip("\n").split(",")
+            try:
+                low, high, mean, count = [float(field) for field in fields[2:6]]
+            except ValueError:
+                continue
+            self.current[fields[1]] = [low, high, mean * count, int(count)]
+        self.start = start
+        with open(path, "r+b") as f_out:
+            f_out.truncate(sum(len(line) for line in lines[:kept]))
+
+    def finish(self):
+        """
+        Close the current period, keeping it until the next flush
+        """
+        for stat in sorted(self.current):
+            low, high, total, count = self.current[stat]
+            self.finished.append((self.start, stat, low, high, total / count, count))
+        self.current = dict()
+
+class Sampler(object):
+    """
+    Runs vwinfo, keeping its stats in rings and rollups
+    """
+
+    def __init__(self, command, capacity=RECENT_SAMPLES, store=None):
+        self.command = command
+        self.store = store
+        self.capacity = capacity
+        self.times = Ring(capacity)
+        self.rings = dict()
+        self.rollups = [Rollup(name, seconds) for name, seconds in ROLLUPS]
+        self.matcher = vwinfo_pivot.FieldMatcher(vwinfo_pivot.FIELDS)
+
+    def sample(self):
+        """
+        Take one sample. Returns False if vwinfo did not give one.
+        """
+        when = time.time()
+        try:
+            output = subprocess.run(self.command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, timeout=60).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        values = dict()
+        for stat, value in vwinfo_pivot.read_table(output).items():
+            try:
+                values[stat] = float(value)
+            except ValueError:
+                pass
+        if not values:
+            return False
+        found = vwinfo_pivot.field_values(values, vwinfo_pivot.FIELDS, self.matcher)
+        for field in vwinfo_pivot.DERIVED:
+            values[field] = found[field]
+        self.record(when, values)
+        return True
+
+    def record(self, when, values):
+        self.times.append(when)
+        for stat, value in values.items():
+            if stat not in self.rings:
+                # A stat seen for the first time was missing before
+                self.rings[stat] = Ring(self.capacity)
+                for i in range(len(self.times) - 1):
+                    self.rings[stat].append(math.nan)
+            self.rings[stat].append(value)
+        for stat in self.rings:
+            if stat not in values:
+                self.rings[stat].append(math.nan)
+        for rollup in self.rollups:
+            rollup.add(when, values)
+        if self.store is not None:
+            self.store.append(when, values)
+
+    def resume(self, directory):
+        """
+        Take back the unfinished periods the last sampler wrote on stopping
+        """
+        for rollup in self.rollups:
+            rollup.resume(os.path.join(directory, "vwinfo-%s.csv" % rollup.name), time.time())
+
+    def flush(self, directory, final=False):
+        """
+        Add the finished periods of each rollup to its file, and write out
+        the samples in memory. final adds the periods not yet finished too,
+        which resume takes back if sampling starts again before they end.
+        """
+        for rollup in self.rollups:
+            if final and rollup.current:
+                rollup.finish()
+            if not rollup.finished:
+                continue
+            path = os.path.join(directory, "vwinfo-%s.csv" % rollup.name)
+            new = not os.path.exists(path)
+            with open(path, "a") as f_out:
+                if new:
+                    f_out.write("timestamp,stat,min,max,mean,samples\n")
+                for start, stat, low, high, mean, count in rollup.finished:
+                    f_out.write("%s,%s,%s,%s,%s,%d\n" % (
+                        timestamp(start), stat, number(low), number(high),
+                        number(mean), count))
+            rollup.finished = []
+
+        stats = sorted(self.rings)
+        fd, temp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as f_out:
+            f_out.write(",".join(["timestamp"] + stats) + "\n")
+            columns = [self.rings[stat].newest() for stat in stats]
+            rows = []
+            for when in self.times.newest():
+                rows.append(",".join([timestamp(when)] +
+                                     [number(next(column)) for column in columns]))
+            for row in reversed(rows):
+                f_out.write(row + "\n")
+        os.rename(temp, os.path.join(directory, "vwinfo-recent.csv"))
+
+def timestamp(when):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when))
+
+def number(value):
+    """
+    A value as CSV, without a decimal point for whole numbers
+    """
+    if math.isnan(value):
+        return ""
+    if value == int(value):
+        return "%d" % value
+    return "%.2f" % value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sample vwinfo stats every few seconds")
+    parser.add_argument("-i", "--interval", type=float, default=INTERVAL,
+                        help="seconds between samples (default %d)" % INTERVAL)
+    parser.add_argument("-d", "--directory", default=".",
+                        help="where to write the CSV files (default here)")
+    parser.add_argument("-n", "--count", type=int,
+                        help="stop after this many samples")
+    parser.add_argument("--store", metavar="DIR",
+                        help="also add every sample to the vwinfo_store.py store in DIR")
+    parser.add_argument("--command",
+                        help="command giving the stats (default vwinfo <database>)")
+    parser.add_argument("database", nargs="?", help="database to sample")
+    args = parser.parse_args(argv)
+    if args.command:
+        command = shlex.split(args.command)
+    elif args.database:
+        command = ["vwinfo", args.database]
+    else:
+        parser.error("give a database or a --command")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    store = None
+    if args.store:
+        if not os.path.isdir(args.store):
+            os.makedirs(args.store)
+        store = vwinfo_store.Store(args.store)
+    sampler = Sampler(command, store=store)
+    sampler.resume(args.directory)
+    taken = 0
+    next_sample = time.monotonic()
+    next_flush = next_sample + FLUSH_SECONDS
+    while not stop.is_set():
+        if sampler.sample():
+            taken += 1
+        if args.count and taken >= args.count:
+            break
+        if time.monotonic() >= next_flush:
+            sampler.flush(args.directory)
+            next_flush += FLUSH_SECONDS
+        # Keep to the interval, skipping samples if vwinfo was slow
+        next_sample += args.interval
+        now = time.monotonic()
+        if next_sample < now:
+            next_sample = now
+        stop.wait(next_sample - now)
+    sampler.flush(args.directory, final=True)
+    if store is not None:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+ Keeps vwinfo stats in a compact binary store that can be read back a
+ time range at a time without parsing any text, so a year of one stat
+ loads in milliseconds rather than as minutes of CSV.
+ Each stat is a column of 8 byte numbers in its own file, beside a
+ column of timestamps in milliseconds, so reading one stat reads nothing
+ else. Columns are split into segments of SEGMENT_ROWS samples, which
+ are only ever appended to, and index.json records when each segment
+ starts. Numbers are in the machine's own byte order.
+
+ Usage: python3 vwinfo_store.py add <store> <monitor-vwinfo.log>
+        python3 vwinfo_store.py show <store> [stat] [--from time] [--to time]
+
+ add stores the snapshots in a monitor-vwinfo.sh log that are newer
+ than those already stored, so can be run on the same log again and
+ again. vwinfo_sampler.py --store adds each of its samples as it goes.
+ show lists the stats stored, or prints one of them as CSV.
+
+ Other Python tools read the store with
+    import vwinfo_store
+    times, values = vwinfo_store.Store(directory).read(
+        "memory.memcontext_allocated", start, end)
+ which gives NumPy arrays of milliseconds and values if NumPy is
+ installed, and memoryviews of the stored numbers otherwise. Times are
+ in seconds, as time.time() gives them.
+"""
+
+import argparse, bisect, json, mmap, os, sys, tempfile, time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import vwinfo_pivot
+
+# Samples in a segment: 2 months at one every 5 seconds
+SEGMENT_ROWS = 1024 * 1024
+
+def write_json(path, found):
+    """
+    Replace a JSON file in one go
+    """
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as f_out:
+        json.dump(found, f_out, indent=1, sort_keys=True)
+    os.rename(temp, path)
+
+def read_json(path, default):
+    try:
+        with open(path) as f_in:
+            return json.load(f_in)
+    except (IOError, OSError, ValueError):
+        return default
+
+class JsonFile(object):
+    """
+    A JSON file that another process may replace, read again whenever
+    it has been
+    """
+
+    def __init__(self, path, default):
+        self.path = path
+        self.default = default
+        self.stamp = None
+        self.value = default
+
+    def get(self):
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp != self.stamp:
+            self.value = read_json(self.path, self.value)
+            self.stamp = stamp
+        return self.value
+
+class Segment(object):
+    """
+    One segment of the store: the timestamp column and a column for
+    each stat, in files named in meta.json.
+    Timestamps are written last, so a sample only counts once they are
+    there, and columns longer than the timestamps are ignored.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_file = JsonFile(os.path.join(directory, "meta.json"), {"columns": {}})
+        self.maps = dict()
+
+    @property
+    def meta(self):
+        return self.meta_file.get()
+
+    def rows(self):
+        try:
+            return os.path.getsize(os.path.join(self.directory, "timestamp")) // 8
+        except OSError:
+            return 0
+
+    def column(self, name, typecode, rows):
+        """
+        The numbers in a column file, as a NumPy array or memoryview
+        """
+        path = os.path.join(self.directory, name)
+        found = self.maps.get(name)
+        if found is not None and len(found) < rows * 8:
+            # Grown since it was mapped. Earlier results may still point
+            # into the old map, so it is left for them to let go of.
+            del self.maps[name]
+            found = None
+        if found is None:
+            with open(path, "rb") as f_in:
+                if os.fstat(f_in.fileno()).st_size == 0:
+                    if numpy is not None:
+                        return numpy.zeros(0, dtype=numpy.dtype(typecode))
+                    return array(typecode)
+                found = self.maps[name] = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+        # A stat just added may not be filled in up to rows yet
+        rows = min(rows, len(found) // 8)
+        if numpy is not None:
+            return numpy.frombuffer(found, dtype=numpy.dtype(typecode), count=rows)
+        return memoryview(found)[:rows * 8].cast(typecode)
+
+    def read(self, stat, start_ms, end_ms):
+        """
+        The timestamps and values of a stat between start_ms and end_ms
+        """
+        rows = self.rows()
+        times = self.column("timestamp", "q", rows)
+        low = bisect.bisect_left(times, start_ms) if start_ms is not None else 0
+        high = bisect.bisect_right(times, end_ms) if end_ms is not None else rows
+        info = self.meta["columns"].get(stat)
+        values = None
+        if info is not None:
+            found = self.column(info["file"], info["type"], rows)
+            if len(found) >= high:
+                values = found[low:high]
+        if values is None:
+            values = array("d", [float("nan")]) * (high - low)
+            if numpy is not None:
+                values = numpy.frombuffer(values, dtype=numpy.float64)
+        return times[low:high], values
+
+    def last_time(self):
+        times = self.column("timestamp", "q", self.rows())
+        return times[-1] if len(times) else None
+
+class Store(object):
+    """
+    A directory of segments, and index.json listing them with the time
+    each starts at
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.index_file = JsonFile(self.index_path, {"segments": []})
+        self.segments = dict()
+        self.writer = None
+
+    @property
+    def index(self):
+        """
+        index.json, read again when a writer elsewhere has added a segment
+        """
+        return self.index_file.get()
+
+    def segment(self, name):
+        if name not in self.segments:
+            self.segments[name] = Segment(os.path.join(self.directory, name))
+        return self.segments[name]
+
+    def stats(self):
+        found = set()
+        for entry in self.index["segments"]:
+            found.update(self.segment(entry["name"]).meta["columns"])
+        return sorted(found)
+
+    def last_time(self):
+        """
+        Time of the newest sample, in seconds, or None for an empty store
+        """
+        for entry in reversed(self.index["segments"]):
+            found = self.segment(entry["name"]).last_time()
+            if found is not None:
+                return found / 1000.0
+        return None
+
+    def read(self, stat, start=None, end=None):
+        """
+        Timestamps in milliseconds and values of a stat from start to end
+        seconds, both included. Only the segments that overlap the range
+        are read, and within them only the rows in it.
+        """
+        start_ms = int(start * 1000) if start is not None else None
+        end_ms = int(end * 1000) if end is not None else None
+        segments = self.index["segments"]
+        firsts = [entry["first"] for entry in segments]
+        low = 0
+        if start_ms is not None:
+            low = max(0, bisect.bisect_right(firsts, start_ms) - 1)
+        high = len(segments)
+        if end_ms is not None:
+            high = bisect.bisect_right(firsts, end_ms)
+        times = []
+        values = []
+        for entry in segments[low:high]:
+            found_times, found_values = self.segment(entry["name"]).read(stat, start_ms, end_ms)
+            times.append(found_times)
+            values.append(found_values)
+        if len(times) == 1:
+            return times[0], values[0]
+        if numpy is not None:
+            if not times:
+                return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0)
+            return numpy.concatenate(times), numpy.concatenate(values)
+        all_times = array("q")
+        all_values = array("d")
+        for found_times, found_values in zip(times, values):
+            all_times.frombytes(memoryview(found_times).cast("B"))
+            all_values.frombytes(memoryview(found_values).cast("B"))
+        return memoryview(all_times), memoryview(all_values)
+
+    def append(self, when, values):
+        """
+        Add a sample taken at when, in seconds, with values a dict of stat
+        to number. Samples must be added in time order.
+        """
+        if self.writer is None or self.writer.rows >= SEGMENT_ROWS:
+            self.start_writer(when)
+        self.writer.append(int(when * 1000), values)
+
+    def start_writer(self, when):
+        """
+        Carry on writing the last segment, or start a new one when it is full
+        """
+        if self.writer is not None:
+            self.writer.close()
+        segments = self.index["segments"]
+        if segments and self.segment(segments[-1]["name"]).rows() < SEGMENT_ROWS:
+            name = segments[-1]["name"]
+        else:
+            name = "%06d" % len(segments)
+            os.makedirs(os.path.join(self.directory, name))
+            segments.append({"name": name, "first": int(when * 1000)})
+            write_json(self.index_path, self.index)
+        self.segments.pop(name, None)
+        self.writer = SegmentWriter(os.path.join(self.directory, name))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+class SegmentWriter(object):
+    """
+    Appends samples to the columns of a segment, first cutting off
+    anything left by a sample that was only partly written
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.meta = read_json(self.meta_path, {"columns": {}})
+        self.files = dict()
+        self.files["timestamp"] = open(os.path.join(directory, "timestamp"), "ab")
+        self.rows = self.files["timestamp"].tell() // 8
+        self.files["timestamp"].truncate(self.rows * 8)
+        for stat, info in self.meta["columns"].items():
+            self.open_column(stat, info)
+
+    def open_column(self, stat, info):
+        f_out = open(os.path.join(self.directory, info["file"]), "ab")
+        size = f_out.tell()
+        if size > self.rows * 8:
+            f_out.truncate(self.rows * 8)
+        elif size < self.rows * 8:
+            # A stat first seen now was missing from the samples before
+            (array(info["type"], [self.missing(info)]) * (self.rows - size // 8)).tofile(f_out)
+        self.files[stat] = f_out
+
+    def missing(self, info):
+        return float("nan") if info["type"] == "d" else 0
+
+    def append(self, when_ms, values):
+        for stat in values:
+            if stat not in self.meta["columns"]:
+                info = {"file": "c%04d" % len(self.meta["columns"]), "type": "d"}
+                self.meta["columns"][stat] = info
+                write_json(self.meta_path, self.meta)
+                self.open_column(stat, info)
+        for stat, info in self.meta["columns"].items():
+            array(info["type"], [values.get(stat, self.missing(info))]).tofile(self.files[stat])
+        for stat in self.meta["columns"]:
+            self.files[stat].flush()
+        array("q", [when_ms]).tofile(self.files["timestamp"])
+        self.files["timestamp"].flush()
+        self.rows += 1
+
+    def close(self):
+        for f_out in self.files.values():
+            f_out.close()
+
+def add_log(store, path):
+    """
+    Store the snapshots in a monitor-vwinfo.sh log newer than the newest
+    already stored. Returns the number added.
+    """
+    last = store.last_time()
+    matcher = vwinfo_pivot.FieldMatcher(vwinfo_pivot.FIELDS)
+    added = 0
+    with open(path, "rb") as f_in:
+        for timestamp, stats, offset in vwinfo_pivot.read_blocks(f_in):
+            when = time.mktime(time.strptime(timestamp, "%Y-%m-%d %H:%M:%S"))
+            if last is not None and when <= last:
+                continue
+            values = dict()
+            for stat, value in stats.items():
+                try:
+                    values[stat] = float(value)
+                except ValueError:
+                    pass
+            if not values:
+                continue
+            found = vwinfo_pivot.field_values(values, vwinfo_pivot.FIELDS, matcher)
+            for field in vwinfo_pivot.DERIVED:
+                values[field] = found[field]
+            store.append(when, values)
+            added += 1
+    store.close()
+    return added
+
+def parse_time(text):
+    return time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S" if ":" in text else "%Y-%m-%d"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store vwinfo stats in columns")
+    parser.add_argument("action", choices=["add", "show"])
+    parser.add_argument("store", help="directory of the store")
+    parser.add_argument("name", nargs="?",
+                        help="log to add, or stat to show")
+    parser.add_argument("--from", dest="start", type=parse_time,
+                        help="first time to show, as YYYY-MM-DD[ HH:MM:SS]")
+    parser.add_argument("--to", dest="end", type=parse_time,
+                        help="last time to show")
+    args = parser.parse_args(argv)
+
+    if args.action == "add":
+        if not args.name:
+            parser.error("add needs the log to add")
+        if not os.path.isdir(args.store):
+            os.makedirs(args.store)
+        store = Store(args.store)
+        print("Added %d snapshots" % add_log(store, args.name))
+        return 0
+
+    store = Store(args.store)
+    if not args.name:
+        for stat in store.stats():
+            print(stat)
+        return 0
+    times, values = store.read(args.name, args.start, args.end)
+    print("timestamp,%s" % args.name)
+    for when, value in zip(times, values):
+        if value != value:
+            # Not sampled then
+            continue
+        print("%s,%s" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when / 1000.0)),
+                         "%d" % value if value == int(value) else "%.2f" % value))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())